@@ -1,19 +1,186 @@
-from flask import Flask
+import asyncio
+import json
+import threading
+import uuid
+from concurrent.futures import Future
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+from llm.config import Config
+from llm.metrics import metrics
+from llm.process_tool_calls import tool_call_stats
+from llm.run import LLMRunner
+from llm.scheduler import RequestScheduler, SchedulerFull
 
 app = Flask(__name__)
 
+# flask views are synchronous, so all llm work runs on one long-lived event loop in a background thread
+# (the ollama client is bound to the loop it was first used on)
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True).start()
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+async def _create_scheduler() -> RequestScheduler:
+    # the scheduler's workers are tasks, so it has to be created on the loop
+    runner = LLMRunner()
+    if Config.WARM_UP_ENABLED:
+        # requests are served meanwhile, they open whatever isn't warm yet themselves
+        runner.warm_up_task = asyncio.create_task(runner.warm_up())
+    else:
+        runner.warmed_up = True
+    scheduler = RequestScheduler(runner)
+    metrics.collectors.append(lambda: _collect(scheduler))
+    return scheduler
+
+
+def _collect(scheduler: RequestScheduler):
+    """counters kept by the scheduler, runner, cache and prefetcher, as prometheus samples"""
+    runner = scheduler.runner
+    yield ("llm_scheduler_requests", "gauge", "requests waiting and in progress",
+           [({"state": key}, value) for key, value in scheduler.stats().items() if key in ("waiting", "active")])
+    yield ("llm_scheduler_completed_total", "counter", "requests served", [({}, scheduler.completed)])
+    yield ("llm_scheduler_rejected_total", "counter", "requests rejected with 429", [({}, scheduler.rejected)])
+    yield ("llm_requests_total", "counter", "requests by the path that served them",
+           [({"path": path}, count) for path, count in runner.path_counts.items()])
+    yield ("llm_first_pass_total", "counter", "first passes that parsed or failed to, and retries",
+           [({"outcome": key}, value) for key, value in tool_call_stats.items()])
+    if runner.response_cache is not None:
+        cache = runner.response_cache
+        yield ("llm_response_cache_total", "counter", "response cache lookups",
+               [({"result": kind}, count) for kind, count in cache.hits.items()] + [({"result": "miss"}, cache.misses)])
+    if runner.prefetcher is not None:
+        yield ("llm_prefetch_total", "counter", "speculative tool calls by outcome",
+               [({"outcome": key}, value) for key, value in runner.prefetcher.stats.items()])
+        yield ("llm_prefetch_saved_seconds_total", "counter", "tool time that overlapped the first pass on hits",
+               [({}, runner.prefetcher.saved_seconds)])
+
+
+def start() -> Future:
+    """create the scheduler (and start warming up) on the background loop without waiting for it"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = asyncio.run_coroutine_threadsafe(_create_scheduler(), _loop)
+    return _scheduler
+
+
+def get_scheduler() -> RequestScheduler:
+    return start().result()
+
+
+async def _shutdown(scheduler: RequestScheduler, timeout: float) -> None:
+    await scheduler.drain(timeout)
+    await scheduler.close()
+    await scheduler.runner.close()
+
+
+def shutdown(timeout: float = Config.SHUTDOWN_TIMEOUT) -> None:
+    """
+    graceful stop: new requests get 429, queued and running ones get up to timeout to finish, then buffered
+    conversation turns are flushed and connections closed
+    """
+    with _scheduler_lock:
+        scheduler = _scheduler
+    if scheduler is None:
+        return
+    asyncio.run_coroutine_threadsafe(_shutdown(scheduler.result(), timeout), _loop).result()
+
+
+def _overloaded(e: SchedulerFull):
+    return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+
+
+def iterate_async(agen):
+    """drive an async generator on the background loop from a synchronous generator"""
+    try:
+        while True:
+            try:
+                item = asyncio.run_coroutine_threadsafe(agen.__anext__(), _loop).result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), _loop).result()
+
 
 @app.route('/')
 def setup_check():  # put application's code here
+    """liveness: the process is up, nothing has to be loaded yet"""
     return 'Sever up and running'
 
-@app.route('/chat')
+@app.route('/ready')
+def ready():
+    """
+    readiness: 503 until the warm-up (chroma, embedding model, model preload, station index) has finished,
+    and while memory is not open (a failed warm-up is retried by the next request that needs it)
+    """
+    scheduler = start()
+    if not scheduler.done():
+        return jsonify({"ready": False, "warm_up": {}}), 503
+    runner = scheduler.result().runner
+    return jsonify({"ready": runner.ready, "warm_up": runner.readiness}), 200 if runner.ready else 503
+
+@app.route('/chat', methods=['GET', 'POST'])
 def chat():
-    """run chat functionalities here"""
+    """
+    run chat functionalities here
+    streams the answer as server-sent events ("data: {"token": ...}" per chunk, then an "event: done"),
+    pass stream=false to get a single json response instead.
+    requests are queued fairly across sessions; 429 with Retry-After when the queue is full.
+    a request without session_id starts a new session (anonymous clients don't share history, python namespace
+    or queue); its id is sent back ("session_id" in the json / the done event, and the X-Session-Id header)
+    to pass on the next turn
+    """
+    payload = request.get_json(silent=True) or {}
+    user_input = payload.get("message") or request.args.get("message")
+    if not user_input:
+        return jsonify({"error": "missing 'message'"}), 400
+
+    session_id = payload.get("session_id") or request.args.get("session_id") or uuid.uuid4().hex
+    stream = str(payload.get("stream", request.args.get("stream", "true"))).lower() != "false"
+    scheduler = get_scheduler()
+    try:
+        if not stream:
+            result = asyncio.run_coroutine_threadsafe(scheduler.submit(user_input, session_id), _loop).result()
+            return jsonify({"response": result, "session_id": session_id}), 200, {"X-Session-Id": session_id}
+        chunks = asyncio.run_coroutine_threadsafe(scheduler.submit_stream(user_input, session_id), _loop).result()
+    except SchedulerFull as e:
+        return _overloaded(e)
+
+    def events():
+        for chunk in iterate_async(chunks):
+            yield f"data: {json.dumps({'token': chunk})}\n\n"
+        yield f"event: done\ndata: {json.dumps({'session_id': session_id})}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-Id": session_id}
+    )
+
+@app.route('/status')
+def status():
+    """scheduler queue state, first-pass parse counters and speculative prefetch hit rate"""
+    scheduler = get_scheduler()
+    prefetcher = scheduler.runner.prefetcher
+    return jsonify({**scheduler.stats(), "ollama_slots": Config.OLLAMA_NUM_PARALLEL,
+                    "tool_calls": dict(tool_call_stats), "prefetch": prefetcher.to_dict() if prefetcher else None})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """stage, tool and model-server timings, token counts and request counters in the prometheus text format"""
+    get_scheduler()
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/upload')
 def upload():
     """upload and save files here"""
 
 if __name__ == '__main__':
-    app.run()
+    start()
+    try:
+        app.run(threaded=True)
+    finally:
+        shutdown()
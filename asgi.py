@@ -0,0 +1,62 @@
+"""
+production entry point: the flask app (app.py) behind ASGI, served by several uvicorn worker processes
+
+    uvicorn asgi:app --workers 4 --host 0.0.0.0 --port 5000
+    python asgi.py --workers 4 --port 5000
+
+each worker is a process with its own event loop, scheduler and model connections. set SHARED_STATE_PATH so
+they share recent turns, cached answers and the data scan, and CHROMA_HOST so they share one chroma server.
+the lifespan startup starts the warm-up, shutdown (SIGTERM/SIGINT) drains the worker's requests and flushes
+its buffered writes
+"""
+import argparse
+import asyncio
+
+import app as flask_app
+from llm.config import Config
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # a2wsgi is optional, uvicorn's own (deprecated) adapter works the same
+    from uvicorn.middleware.wsgi import WSGIMiddleware
+
+
+class LifespanApp:
+    """wsgi app as asgi, with the lifespan events mapped to app.start and app.shutdown"""
+
+    def __init__(self, wsgi_app, threads: int = Config.ASGI_THREADS):
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    @staticmethod
+    async def _lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                flask_app.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # the pipeline runs on app.py's own loop, wait for it off this one
+                await asyncio.to_thread(flask_app.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+app = LifespanApp(flask_app.app)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="serve the app with several worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    uvicorn.run("asgi:app", host=args.host, port=args.port, workers=args.workers,
+                timeout_graceful_shutdown=Config.SHUTDOWN_TIMEOUT + 5)
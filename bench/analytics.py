@@ -0,0 +1,163 @@
+"""
+benchmark: the built-in sea level analyses (functions/analyze_sea_level.py) vs the pandas code execute_python
+would otherwise run for the same question.
+
+two synthetic stations with --years of 6-minute readings (two tidal constituents, a trend, noise and one surge)
+are written to a temporary store. every analysis is timed end to end as a tool call (load included) next to
+its pandas equivalent on the same stored data, best of --repeat.
+
+    python -m bench.analytics --years 10
+"""
+import argparse
+import asyncio
+import itertools
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import functions.sea_level_store as sea_level_store
+import functions.station_index as station_index
+from functions import analytics, analyze_sea_level
+
+STATIONS = [
+    {"station_id": "9414290", "name": "San Francisco", "state": "CA", "latitude": 37.8063, "longitude": -122.4659},
+    {"station_id": "9414750", "name": "Alameda", "state": "CA", "latitude": 37.772, "longitude": -122.3003},
+]
+SPEEDS = {"M2": 28.9841042, "K1": 15.0410686}  # degrees per hour
+
+
+def synthetic_frame(years: float, seed: int = 0, offset: float = 0.0) -> pd.DataFrame:
+    """a station file's level column: tide, 3 mm/year trend, noise and a 3-hour surge"""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2015-01-01", periods=int(years * 365 * 240), freq="6min", tz="UTC", name="time")
+    hours = np.arange(len(times)) / 10.0
+    level = (0.6 * np.cos(np.radians(SPEEDS["M2"] * hours)) + 0.2 * np.cos(np.radians(SPEEDS["K1"] * hours))
+             + 0.003 * hours / 8766 + offset + rng.normal(0, 0.03, len(times)))
+    level[len(times) // 2:len(times) // 2 + 30] += 0.8
+    return pd.DataFrame({"level": level.astype(np.float32)}, index=times)
+
+
+def _load(station_id: str) -> pd.Series:
+    return sea_level_store.get_sea_level_store(analyze_sea_level._DATA_DIR).load(station_id, columns=["level"])["level"]
+
+
+def _tide_fit(series: pd.Series) -> pd.Series:
+    """least squares fit of the same constituents as the tool, on every reading, the way a generated script does it"""
+    hours = (series.index - series.index[0]).total_seconds() / 3600
+    columns = {"mean": np.ones(len(series)), "trend": hours}
+    for name in analytics.resolvable_constituents(series.index.tz_convert(None).to_numpy()):
+        speed = analytics.CONSTITUENTS[name][0]
+        columns[f"{name}_cos"] = np.cos(np.radians(speed * hours))
+        columns[f"{name}_sin"] = np.sin(np.radians(speed * hours))
+    design = pd.DataFrame(columns, index=series.index)
+    coefficients, *_ = np.linalg.lstsq(design.values, series.values, rcond=None)
+    return series - design @ coefficients
+
+
+# pandas equivalents, one per tool
+
+def pandas_statistics():
+    return _load("9414290").resample("MS").agg(["mean", "min", "max", "count"])
+
+
+def pandas_trend():
+    monthly = _load("9414290").resample("MS").mean().dropna()
+    years = (monthly.index - monthly.index[0]).days / 365.2425
+    # theil-sen: median of the pairwise slopes
+    return np.median([(monthly.iloc[j] - monthly.iloc[i]) / (years[j] - years[i])
+                      for i, j in itertools.combinations(range(len(monthly)), 2)])
+
+
+def pandas_tides():
+    return _tide_fit(_load("9414290")).std()
+
+
+def pandas_anomalies():
+    residual = _tide_fit(_load("9414290")).resample("h").mean()
+    median = residual.median()
+    scores = (residual - median) / (1.4826 * (residual - median).abs().median())
+    episodes, current = [], None
+    for hour, score in scores.items():
+        if abs(score) >= 3:
+            current = current or [hour, hour, score]
+            current[1], current[2] = hour, max(current[2], score, key=abs)
+        elif current:
+            episodes.append(current)
+            current = None
+    return sorted(episodes, key=lambda episode: -abs(episode[2]))[:5]
+
+
+def pandas_rolling():
+    return _load("9414290").resample("D").mean().rolling(30, min_periods=15).agg(["mean", "std", "min", "max"])
+
+
+def pandas_compare():
+    daily = pd.concat([_load(s["station_id"]).resample("D").mean() for s in STATIONS], axis=1, join="inner").dropna()
+    return daily.corr(), (daily.iloc[:, 1] - daily.iloc[:, 0]).mean()
+
+
+CASES = [
+    ("statistics (monthly)", analyze_sea_level.sea_level_statistics, {"location": "San Francisco"}, pandas_statistics),
+    ("trend (theil-sen)", analyze_sea_level.sea_level_trend, {"location": "San Francisco", "method": "theil_sen"},
+     pandas_trend),
+    ("tides", analyze_sea_level.sea_level_tides, {"location": "San Francisco"}, pandas_tides),
+    ("anomalies", analyze_sea_level.sea_level_anomalies, {"location": "San Francisco"}, pandas_anomalies),
+    ("rolling (30 days)", analyze_sea_level.sea_level_rolling_statistics, {"location": "San Francisco"},
+     pandas_rolling),
+    ("compare (daily)", analyze_sea_level.compare_sea_level_stations, {"locations": ["San Francisco", "Alameda"]},
+     pandas_compare),
+]
+
+
+def _timed(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(years: float, repeat: int) -> dict:
+    station_index._station_index = station_index.StationIndex(STATIONS)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        key = str(analyze_sea_level._DATA_DIR.absolute())
+        sea_level_store._stores[key] = store = sea_level_store.SeaLevelStore(Path(tmp))
+        try:
+            for seed, station in enumerate(STATIONS):
+                store.merge(station["station_id"], synthetic_frame(years, seed, 0.05 * seed))
+            results["readings"] = len(_load(STATIONS[0]["station_id"]))
+            for name, tool, arguments, baseline in CASES:
+                answer = asyncio.run(tool(**arguments))
+                if answer.startswith(("Error", "Unexpected error")):
+                    raise RuntimeError(f"{name}: {answer}")
+                results[name] = {
+                    "tool_s": _timed(lambda: asyncio.run(tool(**arguments)), repeat),
+                    "pandas_s": _timed(baseline, repeat),
+                    "answer_chars": len(answer),
+                }
+        finally:
+            sea_level_store._stores.pop(key, None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = run(args.years, args.repeat)
+    print(f"readings per station: {results.pop('readings')}")
+    print(f"{'analysis':<22} {'tool':>10} {'pandas':>10} {'speedup':>8} {'answer':>8}")
+    for name, result in results.items():
+        print(f"{name:<22} {result['tool_s'] * 1e3:8.1f}ms {result['pandas_s'] * 1e3:8.1f}ms "
+              f"{result['pandas_s'] / result['tool_s']:7.1f}x {result['answer_chars']:6d} ch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+benchmark: cold start and per-call overhead of the llm backends.
+
+cold start is backend construction plus preload (model load); per-call overhead is the latency of a one-token
+generation on a tiny prompt. backends that can't run here (no ollama daemon, no llama-cpp-python or GGUF)
+are reported as skipped.
+
+    python -m bench.backends --calls 20 [--model function_tuned]
+"""
+import argparse
+import asyncio
+import time
+
+from llm.backends import get_backend
+from llm.config import Config
+from bench.db_latency import percentiles
+
+
+async def run(name: str, model: str, calls: int) -> dict:
+    start = time.perf_counter()
+    backend = get_backend(name)
+    await backend.preload(model)
+    cold_start = time.perf_counter() - start
+
+    request = dict(model=model, messages=[{"role": "user", "content": "hi"}], tools=None, stream=False,
+                   options={"num_ctx": Config.CONTEXT_WINDOW, "num_predict": 1})
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await backend.chat(**request)
+        latencies.append(time.perf_counter() - start)
+    await backend.aclose()
+    return {"cold_start_ms": round(cold_start * 1e3, 1), **percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--model", default="function_tuned")
+    parser.add_argument("--backends", nargs="+", default=["fake", "ollama", "llama_cpp"])
+    args = parser.parse_args()
+
+    for name in args.backends:
+        try:
+            result = asyncio.run(run(name, args.model, args.calls))
+        except Exception as e:
+            print(f"{name:>10}: skipped ({type(e).__name__}: {str(e)[:80]})")
+            continue
+        print(f"{name:>10}: cold start {result['cold_start_ms']:9.1f} ms  per call p50 {result['p50_ms']:8.3f} ms  "
+              f"p99 {result['p99_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
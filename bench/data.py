@@ -0,0 +1,32 @@
+"""synthetic data directories for the benchmarks: many small sea level csvs, as save_sea_level_data used to write them"""
+import random
+from pathlib import Path
+from typing import Union
+
+FILES_PER_DIR = 1000  # spread over subdirectories, like data/ grows by station
+
+
+def make_data_dir(path: Union[str, Path], files: int, rows: int = 20, seed: int = 0) -> Path:
+    """write `files` csvs of `rows` 6-minute readings each under path; the same seed gives the same bytes"""
+    path = Path(path)
+    rng = random.Random(seed)
+    for i in range(files):
+        directory = path / f"station_{i // FILES_PER_DIR:04d}"
+        if i % FILES_PER_DIR == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        station_id = 9410000 + i
+        lines = ["t,v,s,f,q,station_id"]
+        lines += [f"2024-01-01 {(j * 6) // 60:02d}:{(j * 6) % 60:02d},{rng.uniform(-1, 1):.3f},0.003,\"0,0,0,0\",v,"
+                  f"{station_id}" for j in range(rows)]
+        (directory / f"sea_level_{station_id}_20240101.csv").write_text("\n".join(lines) + "\n")
+    return path
+
+
+def touch_files(path: Union[str, Path], count: int, seed: int = 1) -> int:
+    """rewrite `count` of the csvs under path with new content (a scan has to re-hash them)"""
+    files = sorted(Path(path).rglob("*.csv"))
+    rng = random.Random(seed)
+    for file in rng.sample(files, min(count, len(files))):
+        with open(file, "a") as f:
+            f.write(f"2024-01-02 00:00,{rng.uniform(-1, 1):.3f},0.003,\"0,0,0,0\",v,0\n")
+    return min(count, len(files))
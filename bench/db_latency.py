@@ -0,0 +1,112 @@
+"""
+benchmark: conversation store/query latency, per-turn chroma writes vs the buffered DatabaseManager.
+
+"legacy" replays what DatabaseManager did before write batching: an embedded add plus a retention delete on
+every store, and a freshly embedded query on every read.
+
+    python -m bench.db_latency --turns 300
+    python -m bench.db_latency --turns 300 --sessions 50   # short sessions, served from the recent-turn buffer
+    python -m bench.db_latency --fake-embeddings   # skip the onnx model, measures chroma overhead only
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import chromadb
+from chromadb.utils import embedding_functions
+
+from llm.config import Config
+
+
+class _HashEmbeddingFunction(embedding_functions.EmbeddingFunction):
+    """deterministic 384-d vectors, so the benchmark can run without downloading the embedding model"""
+
+    def __init__(self):
+        pass
+
+    def __call__(self, input):
+        return [[b / 255.0 for b in hashlib.sha512(text.encode()).digest() * 6] for text in input]
+
+
+def percentiles(samples) -> dict:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3
+    return {"p50_ms": round(pick(0.50), 3), "p95_ms": round(pick(0.95), 3), "p99_ms": round(pick(0.99), 3),
+            "mean_ms": round(statistics.mean(ordered) * 1e3, 3)}
+
+
+def _workload(turns: int, sessions: int, seed: int = 0):
+    rng = random.Random(seed)
+    questions = [f"plot sea level for station {i}" for i in range(20)]
+    return [(f"session-{i % sessions}", rng.choice(questions), f"answer {i}") for i in range(turns)]
+
+
+def run_legacy(path: str, workload, embedding_function) -> dict:
+    client = chromadb.PersistentClient(path=path)
+    collection = client.get_or_create_collection(name="legacy", embedding_function=embedding_function)
+    store, query = [], []
+    for _, user_input, answer in workload:
+        start = time.perf_counter()
+        collection.query(query_texts=[user_input], n_results=Config.CONVERSATION_HISTORY_LIMIT,
+                         where={"timestamp": {"$gte": (datetime.now() - timedelta(days=7)).timestamp()}})
+        query.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        collection.add(documents=[f"User: {user_input}, Assistant: {answer}"], ids=[str(uuid.uuid4())],
+                       metadatas=[{"timestamp": datetime.now().timestamp()}])
+        collection.delete(where={"timestamp": {"$lt": (datetime.now() - timedelta(days=7)).timestamp()}})
+        store.append(time.perf_counter() - start)
+    return {"store": percentiles(store), "query": percentiles(query)}
+
+
+async def run_buffered(path: str, workload, embedding_function) -> dict:
+    from llm.db_manager import DatabaseManager
+
+    Config.CHROMA_DB_PATH = path
+    db_manager = DatabaseManager()
+    if embedding_function is not None:
+        db_manager.embedding_cache.embedding_function = embedding_function
+    store, query = [], []
+    wall = time.perf_counter()
+    for session_id, user_input, answer in workload:
+        start = time.perf_counter()
+        await db_manager.get_recent_conversations(user_input, session_id)
+        query.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await db_manager.store_conversation(user_input, answer, session_id)
+        store.append(time.perf_counter() - start)
+    await db_manager.close()
+    return {"store": percentiles(store), "query": percentiles(query),
+            "total_s": round(time.perf_counter() - wall, 3),
+            "embedding_cache_hits": db_manager.embedding_cache.hits}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--sessions", type=int, default=1, help="spread the turns round-robin over this many sessions")
+    parser.add_argument("--fake-embeddings", action="store_true")
+    args = parser.parse_args()
+
+    workload = _workload(args.turns, args.sessions)
+    embedding_function = _HashEmbeddingFunction() if args.fake_embeddings else None
+    with tempfile.TemporaryDirectory() as legacy_path, tempfile.TemporaryDirectory() as buffered_path:
+        legacy = run_legacy(legacy_path, workload,
+                            embedding_function or embedding_functions.DefaultEmbeddingFunction())
+        buffered = asyncio.run(run_buffered(buffered_path, workload, embedding_function))
+
+    for name, result in (("before", legacy), ("after", buffered)):
+        print(f"{name:>7}: store p50 {result['store']['p50_ms']:8.3f} ms  p99 {result['store']['p99_ms']:8.3f} ms  |  "
+              f"query p50 {result['query']['p50_ms']:8.3f} ms  p99 {result['query']['p99_ms']:8.3f} ms")
+    print(f"embedding cache hits: {buffered['embedding_cache_hits']}")
+
+
+if __name__ == "__main__":
+    main()
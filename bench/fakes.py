@@ -0,0 +1,150 @@
+"""in-process stand-ins for the runner's collaborators, shared by the benchmarks"""
+import asyncio
+import json
+
+import pandas as pd
+
+
+class FakeDatabaseManager:
+    def __init__(self, keep_history: bool = False):
+        self.keep_history = keep_history
+        self.turns = []
+
+    async def get_recent_turns(self, query_text: str, session_id: str = "default") -> list:
+        return list(self.turns)
+
+    async def store_conversation(self, user_input: str, assistant_response: str, session_id: str = "default") -> None:
+        if self.keep_history:
+            self.turns.append(f"User: {user_input}, Assistant: {assistant_response}")
+
+
+class FakeFileTracker:
+    manifest = {}
+    listeners = []
+
+    def scan_csv_files(self) -> None:
+        pass
+
+
+class FakeOllamaClient:
+    """
+    stands in for ollama.AsyncClient: a server with `slots` parallel sequences and a fixed latency per call.
+    the first pass (last message from the user) calls execute_python (benchmarks stub out the tool itself), the second pass answers in chunks
+    """
+
+    def __init__(self, slots: int = 4, first_pass_latency: float = 0.05, second_pass_latency: float = 0.1,
+                 chunks: int = 10):
+        self.slots = slots
+        self.first_pass_latency = first_pass_latency
+        self.second_pass_latency = second_pass_latency
+        self.chunks = chunks
+        self._semaphore = None
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _busy(self, seconds: float) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.slots)
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            async with self._semaphore:
+                await asyncio.sleep(seconds)
+        finally:
+            self.in_flight -= 1
+
+    async def chat(self, model, messages, stream=False, **kwargs):
+        if messages[-1]["role"] == "user":
+            await self._busy(self.first_pass_latency)
+            call = {"function": {"name": "execute_python", "arguments": {"code": f"print({self.calls})"}}}
+            return {"message": {"role": "assistant", "content": "", "tool_calls": [call]}, "prompt_eval_count": 0}
+
+        answer = json.dumps({"message": "ok " * self.chunks})
+        if not stream:
+            await self._busy(self.second_pass_latency)
+            return {"message": {"role": "assistant", "content": answer}, "prompt_eval_count": 0}
+        return self._stream(answer)
+
+    async def _stream(self, answer: str):
+        step = max(1, len(answer) // self.chunks)
+        await self._busy(self.second_pass_latency)
+        for i in range(0, len(answer), step):
+            yield {"message": {"content": answer[i:i + step]}, "done": False}
+        yield {"message": {"content": ""}, "done": True, "prompt_eval_count": 0, "eval_count": self.chunks}
+
+
+class BatchingFakeOllamaClient:
+    """
+    first-pass stand-in for a server that batches: it runs one forward step at a time over up to `slots`
+    queued requests, and a step costs step_base + step_per_request * n. requests that arrive while a step is
+    running wait for the next one
+    """
+
+    def __init__(self, slots: int = 8, step_base: float = 0.03, step_per_request: float = 0.005):
+        self.slots = slots
+        self.step_base = step_base
+        self.step_per_request = step_per_request
+        self._queue = None
+        self._server = None
+        self.steps = 0
+
+    async def _serve(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.slots and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self.steps += 1
+            await asyncio.sleep(self.step_base + self.step_per_request * len(batch))
+            for future in batch:
+                if not future.done():
+                    future.set_result({"message": {"role": "assistant", "content": '{"message": "ok"}'}})
+
+    async def chat(self, **request):
+        if self._server is None:
+            self._queue = asyncio.Queue()
+            self._server = asyncio.create_task(self._serve())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(future)
+        return await future
+
+    async def aclose(self) -> None:
+        if self._server is not None:
+            self._server.cancel()
+
+
+class FakeNoaaClient:
+    """stands in for functions.noaa_client.NoaaClient: every fetch takes `latency` and returns a flat 6-minute series"""
+
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+        self.fetches = 0
+        self.cancelled = 0
+
+    async def fetch(self, station_id, begin, end, product="water_level", datum="MSL", interval=None):
+        self.fetches += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        times = pd.date_range(begin, end, freq="6min")
+        return [{"t": t, "v": "0.100", "s": "0.003", "f": "0,0,0,0", "q": "p"} for t in times.strftime("%Y-%m-%d %H:%M")]
+
+    async def aclose(self) -> None:
+        pass
+
+
+class FakeMetadataStore:
+    """the csv metadata half of DatabaseManager, recording how many entries a scan wrote or deleted"""
+
+    def __init__(self):
+        self.upserted = 0
+        self.deleted = 0
+
+    def upsert_csv_metadata(self, metadatas) -> None:
+        self.upserted += len(metadatas)
+
+    def delete_csv_metadata(self, file_paths) -> None:
+        self.deleted += len(file_paths)
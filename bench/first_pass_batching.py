@@ -0,0 +1,66 @@
+"""
+benchmark: throughput vs latency of first-pass calls with and without micro-batching (FirstPassBatcher).
+
+open-loop poisson arrivals at several rates against a mock server that batches in steps
+(step_base + step_per_request * n, at most --slots requests per step), once per batch wait setting.
+
+    python -m bench.first_pass_batching --requests 300
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from llm.chat_manager import ChatManager
+from llm.config import Config
+from llm.models.message import Message
+from bench.db_latency import percentiles
+from bench.fakes import BatchingFakeOllamaClient
+
+
+async def run(rate: float, max_wait: float, requests: int, slots: int, seed: int = 0) -> dict:
+    Config.OLLAMA_NUM_PARALLEL = slots
+    Config.FIRST_PASS_BATCHING = max_wait > 0
+    Config.FIRST_PASS_BATCH_WAIT = max_wait
+    Config.FIRST_PASS_BATCH_SIZE = slots
+    chat_manager = ChatManager("bench-model", "")
+    chat_manager.client = server = BatchingFakeOllamaClient(slots=slots)
+    rng = random.Random(seed)
+    latencies = []
+
+    async def call(i: int) -> None:
+        start = time.perf_counter()
+        await chat_manager.get_initial_response([Message(role="user", content=f"question {i}")], None)
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    wall = time.perf_counter()
+    for i in range(requests):
+        tasks.append(asyncio.create_task(call(i)))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - wall
+    await server.aclose()
+    return {"throughput_rps": round(requests / wall, 1), **percentiles(latencies),
+            "requests_per_step": round(requests / server.steps, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--rates", type=float, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--waits-ms", type=float, nargs="+", default=[0, 2, 5, 10, 20])
+    args = parser.parse_args()
+
+    print(f"{'rate':>6} {'wait':>7} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'req/step':>9}")
+    for rate in args.rates:
+        for wait_ms in args.waits_ms:
+            result = asyncio.run(run(rate, wait_ms / 1e3, args.requests, args.slots))
+            label = f"{wait_ms:g}ms" if wait_ms else "off"
+            print(f"{rate:6g} {label:>7} {result['throughput_rps']:7.1f} {result['p50_ms']:8.1f} "
+                  f"{result['p99_ms']:8.1f} {result['requests_per_step']:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+benchmark: startup cost, i.e. how long importing the server (and the console runner) takes and what dominates it.
+
+every measurement is a fresh interpreter (`python -X importtime`), reported as the median of --repeat runs,
+with the heaviest packages by cumulative import time. "construct" also times LLMRunner() after the imports,
+which must stay cheap now that chroma, the embedding model and the backend are opened lazily.
+
+    python -m bench.import_time
+    python -m bench.import_time --modules app --top 15
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+_CONSTRUCT = """
+import json, time
+start = time.perf_counter()
+from llm.run import LLMRunner
+imported = time.perf_counter()
+runner = LLMRunner()
+print(json.dumps({"import_s": imported - start, "construct_s": time.perf_counter() - imported}))
+"""
+
+
+def import_profile(module: str) -> Tuple[float, Dict[str, float]]:
+    """total seconds to import module in a fresh interpreter, and cumulative seconds per imported module"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        cumulative[name.strip()] = int(cumulative_us) / 1e6
+    return cumulative[module], cumulative
+
+
+def top_packages(profiles: List[Dict[str, float]], top: int) -> List[Tuple[str, float]]:
+    """heaviest top-level packages (the largest cumulative time under each root name), median over runs"""
+    per_package = defaultdict(list)
+    for cumulative in profiles:
+        roots = defaultdict(float)
+        for name, seconds in cumulative.items():
+            root = name.split(".")[0]
+            roots[root] = max(roots[root], seconds)
+        for root, seconds in roots.items():
+            per_package[root].append(seconds)
+    medians = {root: statistics.median(values + [0.0] * (len(profiles) - len(values)))
+               for root, values in per_package.items()}
+    return sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def construct_time(repeat: int) -> Dict[str, float]:
+    runs = [json.loads(subprocess.run([sys.executable, "-c", _CONSTRUCT], capture_output=True, text=True,
+                                      check=True).stdout.strip().splitlines()[-1]) for _ in range(repeat)]
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["app", "llm.run"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [import_profile(module) for _ in range(args.repeat)]
+        total = statistics.median(seconds for seconds, _ in runs)
+        print(f"import {module}: {total * 1e3:8.1f} ms (median of {args.repeat})")
+        for package, seconds in top_packages([profile for _, profile in runs], args.top):
+            if package != module.split(".")[0]:
+                print(f"    {package:<24} {seconds * 1e3:8.1f} ms")
+
+    construct = construct_time(args.repeat)
+    print(f"LLMRunner(): import {construct['import_s'] * 1e3:.1f} ms, construct {construct['construct_s'] * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
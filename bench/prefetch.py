@@ -0,0 +1,92 @@
+"""
+benchmark: request latency with and without speculative tool prefetch (SpeculativePrefetcher).
+
+sea level questions through the full runner with a fake model (fixed latency per pass), a synthetic station
+index and a fake NOAA api (fixed latency per fetch), so only the overlap of tool work with the first pass is
+measured. the mix has questions the guess gets right, questions where the model calls something else (the
+speculative fetch is cancelled), and questions about a period (no guess is made).
+
+    python -m bench.prefetch --rounds 10 --model-ms 300 --noaa-ms 200
+"""
+import argparse
+import asyncio
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import functions.noaa_client as noaa_client
+import functions.sea_level_store as sea_level_store
+import functions.station_index as station_index
+from llm.backends.fake_backend import FakeBackend
+from llm.chat_manager import ChatManager
+from llm.config import Config
+from llm.run import LLMRunner
+from bench.db_latency import percentiles
+from bench.fakes import FakeDatabaseManager, FakeFileTracker, FakeNoaaClient
+
+STATIONS = [
+    {"station_id": "9414290", "name": "San Francisco", "state": "CA", "latitude": 37.8063, "longitude": -122.4659},
+    {"station_id": "9410660", "name": "Los Angeles", "state": "CA", "latitude": 33.72, "longitude": -118.272},
+    {"station_id": "8443970", "name": "Boston", "state": "MA", "latitude": 42.3548, "longitude": -71.0534},
+    {"station_id": "9447130", "name": "Seattle", "state": "WA", "latitude": 47.6026, "longitude": -122.3393},
+]
+
+# (question, what the fake model calls for it)
+QUESTIONS = [
+    ("What is the sea level in San Francisco?", "save_sea_level_data", {"location": "San Francisco"}),
+    ("current water level at los angeles", "save_sea_level_data", {"location": "Los Angeles, CA"}),
+    ("tide gauge reading for 8443970", "save_sea_level_data", {"location": "8443970"}),
+    ("is the sea level in Seattle something to worry about", "general_chat", {}),
+    ("sea level in Boston since yesterday", "save_sea_level_data",
+     {"location": "Boston", "begin_date": (datetime.now(timezone.utc) - timedelta(days=2)).strftime("%Y-%m-%d")}),
+]
+
+
+async def run(prefetch: bool, rounds: int, model_latency: float, noaa_latency: float) -> dict:
+    Config.PREFETCH_ENABLED = prefetch
+    Config.RESPONSE_CACHE_ENABLED = False
+    Config.FAST_PATH_ENABLED = False
+    station_index._station_index = station_index.StationIndex(STATIONS)
+    noaa_client._noaa_client = noaa = FakeNoaaClient(noaa_latency)
+
+    rules = [(re.escape(question), tool, args) for question, tool, args in QUESTIONS]
+    backend = FakeBackend(rules, latency=model_latency)
+    runner = LLMRunner(FakeDatabaseManager(), ChatManager("bench-model", "", backend=backend), FakeFileTracker())
+    latencies = []
+    data_dir = Path(__file__).parent.parent / "data"
+    for _ in range(rounds):
+        for question, _, _ in QUESTIONS:
+            with tempfile.TemporaryDirectory() as tmp:
+                # an empty store every time, so every call has to fetch
+                sea_level_store._stores[str(data_dir.absolute())] = sea_level_store.SeaLevelStore(tmp)
+                start = time.perf_counter()
+                await runner.run(question)
+                latencies.append(time.perf_counter() - start)
+    sea_level_store._stores.pop(str(data_dir.absolute()), None)
+
+    result = {**percentiles(latencies), "noaa_fetches": noaa.fetches, "cancelled_fetches": noaa.cancelled}
+    if runner.prefetcher is not None:
+        result["prefetch"] = runner.prefetcher.to_dict()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--model-ms", type=float, default=300)
+    parser.add_argument("--noaa-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    for prefetch in (False, True):
+        result = asyncio.run(run(prefetch, args.rounds, args.model_ms / 1e3, args.noaa_ms / 1e3))
+        print(f"prefetch {'on ' if prefetch else 'off'}: mean {result['mean_ms']:7.1f} ms  p50 {result['p50_ms']:7.1f} ms  "
+              f"p99 {result['p99_ms']:7.1f} ms  noaa fetches {result['noaa_fetches']} "
+              f"(cancelled {result['cancelled_fetches']})")
+        if "prefetch" in result:
+            print(f"             {result['prefetch']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+regression benchmark: per-request prompt size must stay flat over many sequential runs.
+
+drives LLMRunner.run with an in-memory chat manager (every first pass asks for one tool) and a stub
+tool executor, and records the size of the second-pass prompt for each request (and checks the stub's result
+made it into that prompt, so a broken tool call can't pass as a flat prompt).
+with --with-history the fake database returns every previous turn, and the prompt must stay within
+PROMPT_TOKEN_BUDGET instead.
+
+    python -m bench.prompt_growth --runs 1000 [--with-history]
+"""
+import argparse
+import asyncio
+import sys
+
+import llm.process_tool_calls
+from llm.config import Config
+from llm.prompt_builder import estimate_tokens
+from llm.run import LLMRunner
+from bench.fakes import FakeDatabaseManager, FakeFileTracker
+
+
+class _RecordingChatManager:
+    def __init__(self):
+        self.prompt_sizes = []
+        self.prompt_tokens = []
+        self.missing_results = 0
+
+    async def get_initial_response(self, messages, tools, format="json"):
+        return {"message": {"content": "", "tool_calls": [
+            {"function": {"name": "execute_python", "arguments": {"code": f"print({len(self.prompt_sizes)})"}}}
+        ]}}
+
+    async def get_final_response(self, messages):
+        self.prompt_sizes.append(sum(len(m.content) for m in messages))
+        self.prompt_tokens.append(sum(estimate_tokens(m.content) for m in messages))
+        if not any(_RESULT in m.content for m in messages):
+            self.missing_results += 1
+        return {"message": {"content": '{"message": "ok"}'}}
+
+
+_RESULT = "result of execute_python"
+
+
+async def _fake_execute_tool(tool_name, tool_args, session_id=None):
+    return f"result of {tool_name} for {tool_args['code']:>12}"
+
+
+async def run(runs: int, with_history: bool = False) -> _RecordingChatManager:
+    llm.process_tool_calls.execute_tool = _fake_execute_tool
+    chat_manager = _RecordingChatManager()
+    runner = LLMRunner(db_manager=FakeDatabaseManager(with_history), chat_manager=chat_manager,
+                       file_tracker=FakeFileTracker())
+    for i in range(runs):
+        await runner.run(f"question {i:06d}")
+    return chat_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--with-history", action="store_true")
+    args = parser.parse_args()
+
+    chat_manager = asyncio.run(run(args.runs, args.with_history))
+    sizes, tokens = chat_manager.prompt_sizes, chat_manager.prompt_tokens
+    if chat_manager.missing_results:
+        print(f"FAIL: {chat_manager.missing_results} of {len(sizes)} second-pass prompts lack the tool result")
+        sys.exit(1)
+    print(f"runs: {len(sizes)}  first prompt: {sizes[0]} chars  last prompt: {sizes[-1]} chars  max: {max(sizes)} chars")
+    print(f"estimated tokens: first {tokens[0]}  last {tokens[-1]}  max {max(tokens)}  "
+          f"(budget {Config.PROMPT_TOKEN_BUDGET})")
+    if args.with_history:
+        # per-message rounding can add a token per message on top of the builder's own accounting
+        if max(tokens) > Config.PROMPT_TOKEN_BUDGET + 4:
+            print("FAIL: second-pass prompt exceeds the token budget")
+            sys.exit(1)
+        print("OK: prompt stays within the token budget")
+        return
+    if max(sizes) > sizes[0]:
+        print("FAIL: second-pass prompt grows with the number of previous requests")
+        sys.exit(1)
+    print("OK: prompt size is flat")
+
+
+if __name__ == "__main__":
+    main()
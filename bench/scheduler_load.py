@@ -0,0 +1,86 @@
+"""
+load test: RequestScheduler throughput and latency against a mock ollama with a fixed number of parallel slots.
+
+every client is its own session and sends its requests back to back (closed loop), retrying after a 429.
+the first sweep raises the number of scheduler workers, throughput should grow until the ollama slots are
+busy and then level off; the overload run shows rejections instead of an unbounded queue.
+
+    python -m bench.scheduler_load --slots 4 --clients 32 --requests 5
+"""
+import argparse
+import asyncio
+import time
+
+import llm.process_tool_calls
+from llm.chat_manager import ChatManager
+from llm.config import Config
+from llm.run import LLMRunner
+from llm.scheduler import RequestScheduler, SchedulerFull
+from bench.db_latency import percentiles
+from bench.fakes import FakeDatabaseManager, FakeFileTracker, FakeOllamaClient
+
+
+def _fake_execute_tool(tool_latency: float):
+    async def execute_tool(tool_name, tool_args, session_id=None):
+        await asyncio.sleep(tool_latency)
+        return f"result of {tool_name} for {tool_args['code']}"
+    return execute_tool
+
+
+async def run(workers: int, slots: int, clients: int, requests: int, tool_latency: float,
+              max_queue: int = Config.SCHEDULER_MAX_QUEUE, stream: bool = True) -> dict:
+    Config.OLLAMA_NUM_PARALLEL = slots
+    llm.process_tool_calls.execute_tool = _fake_execute_tool(tool_latency)
+    chat_manager = ChatManager("bench-model", "")
+    chat_manager.client = ollama = FakeOllamaClient(slots=slots)
+    runner = LLMRunner(db_manager=FakeDatabaseManager(), chat_manager=chat_manager, file_tracker=FakeFileTracker())
+    scheduler = RequestScheduler(runner, workers=workers, max_queue=max_queue,
+                                 max_per_session=Config.SCHEDULER_MAX_PER_SESSION)
+    latencies = []
+
+    async def client(index: int) -> None:
+        for i in range(requests):
+            start = time.perf_counter()
+            while True:
+                try:
+                    if stream:
+                        async for _ in await scheduler.submit_stream(f"client {index} question {i}", f"s{index}"):
+                            pass
+                    else:
+                        await scheduler.submit(f"client {index} question {i}", f"s{index}")
+                    break
+                except SchedulerFull:
+                    await asyncio.sleep(0.05)
+            latencies.append(time.perf_counter() - start)
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    wall = time.perf_counter() - wall
+    await scheduler.close()
+    return {"workers": workers, "throughput_rps": round(len(latencies) / wall, 1), **percentiles(latencies),
+            "rejected": scheduler.rejected, "ollama_max_in_flight": ollama.max_in_flight}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--slots", type=int, default=4, help="parallel slots of the mock ollama server")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=5, help="requests per client")
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # 50 ms first pass + 50 ms tool + 100 ms second pass, so one request alone takes ~200 ms
+    print(f"mock ollama: {args.slots} slots, {args.clients} clients x {args.requests} requests")
+    for workers in (1, 2, 4, 8, 16):
+        result = asyncio.run(run(workers, args.slots, args.clients, args.requests, args.tool_latency))
+        print(f"workers {workers:3d}: {result['throughput_rps']:6.1f} req/s  p50 {result['p50_ms']:8.1f} ms  "
+              f"p99 {result['p99_ms']:8.1f} ms  ollama in flight <= {result['ollama_max_in_flight']}")
+
+    overload = asyncio.run(run(Config.SCHEDULER_WORKERS, args.slots, args.clients * 8, 1, args.tool_latency,
+                               max_queue=args.clients))
+    print(f"overload ({args.clients * 8} clients, queue {args.clients}): {overload['rejected']} 429 responses (clients retry after 50 ms), "
+          f"{overload['throughput_rps']} req/s, p99 {overload['p99_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
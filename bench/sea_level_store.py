@@ -0,0 +1,78 @@
+"""
+benchmark: columnar station store vs the per-fetch csv files it replaces.
+
+writes the same synthetic 6-minute water level series both ways and compares file size and load time.
+
+    python -m bench.sea_level_store --years 5
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from functions.sea_level_store import SeaLevelStore
+
+
+def synthetic_rows(years: float, seed: int = 0) -> list:
+    """NOAA-shaped water_level rows: tide-like signal on a 6-minute grid"""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2015-01-01", periods=int(years * 365 * 240), freq="6min")
+    hours = np.arange(len(times)) / 10.0
+    level = 0.9 * np.sin(2 * np.pi * hours / 12.42) + 0.3 * np.sin(2 * np.pi * hours / 23.93) + rng.normal(0, 0.02, len(times))
+    return [
+        {"t": t, "v": f"{v:.3f}", "s": "0.003", "f": "0,0,0,0", "q": "v"}
+        for t, v in zip(times.strftime("%Y-%m-%d %H:%M"), level)
+    ]
+
+
+def _timed(func, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(years: float) -> dict:
+    rows = synthetic_rows(years)
+    results = {"rows": len(rows)}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # current layout: raw NOAA columns plus station info repeated on every row
+        csv_path = tmp / "sea_level_9414290_20240101_0000.csv"
+        df = pd.DataFrame(rows)
+        df["station_name"], df["station_id"], df["latitude"], df["longitude"] = "San Francisco", "9414290", 37.8063, -122.4659
+        df.to_csv(csv_path, index=False)
+        results["csv_bytes"] = csv_path.stat().st_size
+        results["csv_load_s"] = _timed(lambda: pd.read_csv(csv_path, parse_dates=["t"]))
+
+        for fmt in ("feather", "parquet"):
+            store = SeaLevelStore(tmp / fmt, fmt)
+            store.merge("9414290", rows)
+            results[f"{fmt}_bytes"] = store.path("9414290").stat().st_size
+            results[f"{fmt}_load_s"] = _timed(lambda: store.load("9414290"))
+            results[f"{fmt}_level_only_load_s"] = _timed(lambda: store.load("9414290", columns=["level"]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", type=float, default=5)
+    args = parser.parse_args()
+
+    results = run(args.years)
+    print(f"rows: {results['rows']}")
+    for fmt in ("csv", "feather", "parquet"):
+        line = f"{fmt:>8}: {results[f'{fmt}_bytes'] / 1e6:8.2f} MB  load {results[f'{fmt}_load_s'] * 1e3:8.1f} ms"
+        if f"{fmt}_level_only_load_s" in results:
+            line += f"  (level only {results[f'{fmt}_level_only_load_s'] * 1e3:.1f} ms)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+local http stand-ins for the external services, so the end-to-end benchmarks run offline and deterministically:
+a fake ollama server and a stub of the NOAA CO-OPS data and station metadata apis.
+both listen on an ephemeral 127.0.0.1 port and serve from daemon threads
+"""
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+# (pattern, tool, arguments or a function of the user input); the first matching rule is the first pass's call
+Rule = Tuple[str, str, Union[Dict[str, Any], Callable[[str], Dict[str, Any]]]]
+
+STATION_NAMES = ["San Francisco", "Los Angeles", "Seattle", "Boston", "The Battery", "Key West", "Honolulu",
+                 "Galveston", "Charleston", "Monterey", "San Diego", "Portland", "Miami Beach", "Atlantic City"]
+
+
+class _Server:
+    handler = BaseHTTPRequestHandler
+
+    def __init__(self):
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "_Server":
+        handler = type("Handler", (self.handler,), {"server_state": self})
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # small ndjson lines would otherwise wait for delayed acks
+    server_state: Any = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+class _OllamaHandler(_Handler):
+    def do_GET(self):
+        if self.path.startswith("/api/tags"):
+            self._send_json({"models": [{"name": "bench-model"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        state: FakeOllamaServer = self.server_state
+        request = self._read_json()
+        state.requests += 1
+        if self.path.startswith("/api/generate"):
+            # preload: an empty prompt only loads the model
+            self._send_json({"model": request.get("model"), "response": "", "done": True})
+            return
+        if not self.path.startswith("/api/chat"):
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        content, prompt_tokens = state.respond(request.get("messages") or [])
+        tokens = [content[i:i + 4] for i in range(0, len(content), 4)] or [""]
+        with state.slots:
+            prompt_seconds = prompt_tokens * state.prompt_token_latency
+            time.sleep(prompt_seconds)
+            done = {"model": request.get("model"), "done": True, "done_reason": "stop",
+                    "prompt_eval_count": prompt_tokens, "eval_count": len(tokens),
+                    "prompt_eval_duration": int(prompt_seconds * 1e9),
+                    "eval_duration": int(len(tokens) * state.token_latency * 1e9), "load_duration": 0}
+            if not request.get("stream", False):
+                time.sleep(len(tokens) * state.token_latency)
+                self._send_json({**done, "message": {"role": "assistant", "content": content}})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                time.sleep(state.token_latency)
+                self._chunk({"model": request.get("model"), "done": False,
+                             "message": {"role": "assistant", "content": token}})
+            self._chunk({**done, "message": {"role": "assistant", "content": ""}})
+            self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, payload: Dict[str, Any]) -> None:
+        line = (json.dumps(payload) + "\n").encode()
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(_Server):
+    """
+    deterministic ollama (/api/chat, /api/generate, /api/tags).
+    the first pass (last message from the user) calls the tool of the first matching rule, or answers when none
+    matches; later passes answer with answer_tokens tokens. a call takes prompt_tokens * prompt_token_latency
+    plus output_tokens * token_latency, and at most `slots` calls are served at once (OLLAMA_NUM_PARALLEL)
+    """
+
+    handler = _OllamaHandler
+
+    def __init__(self, rules: Optional[List[Rule]] = None, token_latency: float = 0.002,
+                 prompt_token_latency: float = 0.0, answer_tokens: int = 32, slots: int = 4):
+        super().__init__()
+        self.rules = [(re.compile(pattern, re.IGNORECASE), tool, args) for pattern, tool, args in rules or []]
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.answer_tokens = answer_tokens
+        self.slots = threading.Semaphore(slots)
+
+    def respond(self, messages: List[Dict[str, Any]]) -> Tuple[str, int]:
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        if messages and messages[-1].get("role") == "user":
+            user_input = messages[-1].get("content") or ""
+            for pattern, tool, args in self.rules:
+                if pattern.search(user_input):
+                    arguments = args(user_input) if callable(args) else args
+                    return json.dumps({"name": tool, "arguments": arguments}), prompt_tokens
+        answer = " ".join(["ok"] * self.answer_tokens)
+        return json.dumps({"message": answer}), prompt_tokens
+
+
+class _NoaaHandler(_Handler):
+    def do_GET(self):
+        state: StubNoaaServer = self.server_state
+        state.requests += 1
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        time.sleep(state.latency)
+        if url.path.endswith("stations.json"):
+            self._send_json({"count": len(state.stations), "stations": state.stations})
+            return
+
+        if query.get("station") not in state.station_ids:
+            self._send_json({"error": {"message": "No data was found. This product may not be offered at this station "
+                                                  "at the requested time."}})
+            return
+        begin = datetime.strptime(query["begin_date"], "%Y%m%d %H:%M")
+        end = datetime.strptime(query["end_date"], "%Y%m%d %H:%M")
+        rows, t = [], begin
+        while t <= end:
+            minutes = (t - datetime(2000, 1, 1)).total_seconds() / 60
+            rows.append({"t": t.strftime("%Y-%m-%d %H:%M"), "v": f"{(minutes % 745) / 745:.3f}", "s": "0.003",
+                         "f": "0,0,0,0", "q": "p"})
+            t += timedelta(minutes=6)
+        self._send_json({"metadata": {"id": query["station"]}, "data": rows})
+
+
+class StubNoaaServer(_Server):
+    """
+    NOAA CO-OPS stand-in: /api/prod/datagetter serves a deterministic 6-minute water level series for any
+    range, and /mdapi/prod/webapi/stations.json a synthetic station list. every request takes `latency`
+    """
+
+    handler = _NoaaHandler
+
+    def __init__(self, stations: int = len(STATION_NAMES), latency: float = 0.02):
+        super().__init__()
+        self.latency = latency
+        names = [STATION_NAMES[i] if i < len(STATION_NAMES) else f"{STATION_NAMES[i % len(STATION_NAMES)]} {i}"
+                 for i in range(stations)]
+        self.stations = [{"id": str(9410000 + i), "name": name, "state": "CA", "lat": 32.0 + i % 15,
+                          "lng": -120.0 + i % 40} for i, name in enumerate(names)]
+        self.station_ids = {s["id"] for s in self.stations}
+
+    @property
+    def data_url(self) -> str:
+        return f"{self.url}/api/prod/datagetter"
+
+    @property
+    def stations_url(self) -> str:
+        return f"{self.url}/mdapi/prod/webapi/stations.json"
@@ -0,0 +1,381 @@
+"""
+offline benchmark suite: the request pipeline end to end and its components in isolation, with json baselines.
+
+every scenario runs against local stand-ins only: a fake ollama server (bench.servers, fixed per-token
+latency), a stub NOAA api, a temporary chroma directory with hash embeddings and synthetic data directories
+(bench.data). scenarios report throughput and p50/p95/p99 latency, as the median of --repeat runs. --save writes the results as a baseline,
+--compare flags every latency that grew (or throughput that fell) by more than --threshold against one and
+exits with status 1, so the suite can gate a change.
+
+    python -m bench.suite                                     # all scenarios, print the table
+    python -m bench.suite --save bench/baseline.json          # record a baseline
+    python -m bench.suite --compare bench/baseline.json       # run again and flag regressions
+    python -m bench.suite --only file_scan --files 10 1000 100000
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+from llm.config import Config
+from bench.data import make_data_dir, touch_files
+from bench.db_latency import _HashEmbeddingFunction, percentiles
+from bench.fakes import FakeMetadataStore
+from bench.servers import FakeOllamaServer, StubNoaaServer
+
+# metrics compared against a baseline, and whether a larger value is worse
+# (p99 is reported but not compared, with a few dozen samples it is the single slowest call)
+COMPARED = {"p50_ms": True, "p95_ms": True, "throughput_rps": False}
+
+QUESTIONS = [
+    "hello, who are you?",
+    "what is the sea level in San Francisco",
+    "compute the mean of 1, 2 and 3 in python",
+    "current water level at Seattle",
+    "explain what a tide gauge measures",
+]
+RULES = [
+    (r"sea level|water level", "save_sea_level_data",
+     lambda text: {"location": text.rsplit(" in ", 1)[-1].rsplit(" at ", 1)[-1]}),
+    (r"python", "execute_python", {"code": "print(sum([1, 2, 3]) / 3)"}),
+]
+
+
+def summarize(latencies: List[float], wall: float) -> dict:
+    return {"n": len(latencies), "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+            **percentiles(latencies)}
+
+
+async def measure(call: Callable[[int], Awaitable], n: int, concurrency: int = 1, warmup: int = 0) -> dict:
+    """run call(i) n times, at most `concurrency` at once, after `warmup` untimed calls"""
+    for i in range(warmup):
+        await call(-1 - i)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - start)
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(n)))
+    return summarize(latencies, time.perf_counter() - wall)
+
+
+class Environment:
+    """the stand-in services and temporary directories, pointed to by Config for the duration of the run"""
+
+    def __init__(self, args):
+        self.args = args
+        self.tmp = tempfile.TemporaryDirectory(prefix="oceangpt-bench-")
+        self.root = Path(self.tmp.name)
+        self.ollama = FakeOllamaServer(RULES, token_latency=args.token_ms / 1e3, slots=Config.OLLAMA_NUM_PARALLEL)
+        self.noaa = StubNoaaServer(latency=args.noaa_ms / 1e3)
+
+    async def __aenter__(self):
+        import functions.noaa_client as noaa_client
+        import functions.sea_level_store as sea_level_store
+        from functions.station_index import get_station_index
+
+        self.ollama.start()
+        self.noaa.start()
+        Config.OLLAMA_HOST = self.ollama.url
+        Config.CHROMA_DB_PATH = str(self.root / "chroma")
+        Config.DATA_DIR = str(self.root / "data")
+        Config.FILE_MANIFEST_PATH = str(self.root / "data" / ".file_manifest.json")
+        Config.RESPONSE_CACHE_ENABLED = False  # every run should do the work
+        Config.STATION_METADATA_URL = self.noaa.stations_url
+        noaa_client._noaa_client = noaa_client.NoaaClient(base_url=self.noaa.data_url)
+        await get_station_index(refresh=True, cache_path=str(self.root / "station_cache.json"))
+        # save_sea_level_data writes to <repo>/data; keep its store in the temporary directory instead
+        repo_data = Path(sea_level_store.__file__).parent.parent / "data"
+        sea_level_store._stores[str(repo_data.absolute())] = sea_level_store.SeaLevelStore(self.root / "store")
+        make_data_dir(Config.DATA_DIR, 10)
+        return self
+
+    async def __aexit__(self, *exc):
+        import functions.noaa_client as noaa_client
+
+        await noaa_client.get_noaa_client().aclose()
+        self.ollama.stop()
+        self.noaa.stop()
+        self.tmp.cleanup()
+
+    def database_manager(self):
+        from llm.db_manager import DatabaseManager
+
+        db_manager = DatabaseManager()
+        db_manager.embedding_cache.embedding_function = _HashEmbeddingFunction()
+        # csv metadata is embedded by chroma itself, with a model it would download
+        db_manager.csv_metadata_collection = db_manager.client.get_or_create_collection(
+            name=f"{Config.CSV_METADATA_COLLECTION}_bench", embedding_function=_HashEmbeddingFunction()
+        )
+        return db_manager
+
+
+async def bench_pipeline(env: Environment) -> Dict[str, dict]:
+    """LLMRunner.run end to end: chroma history, file scan, both passes over http, real tools"""
+    from constants.llama_config import system
+    from llm.backends.ollama_backend import OllamaBackend
+    from llm.chat_manager import ChatManager
+    from llm.file_tracker import FileTracker
+    from llm.run import LLMRunner
+
+    db_manager = env.database_manager()
+    backend = OllamaBackend(host=env.ollama.url)
+    runner = LLMRunner(db_manager, ChatManager("bench-model", system, backend=backend),
+                       FileTracker(db_manager, Config.DATA_DIR, Config.FILE_MANIFEST_PATH))
+    run = lambda i: runner.run(QUESTIONS[i % len(QUESTIONS)], session_id=f"bench-{i % 8}")
+    results = {
+        "pipeline": await measure(run, env.args.requests, warmup=len(QUESTIONS)),
+        "pipeline_concurrent": await measure(run, env.args.requests, concurrency=env.args.concurrency),
+    }
+    await db_manager.close()
+    await backend.aclose()
+    return results
+
+
+async def bench_process_tool_calls(env: Environment) -> Dict[str, dict]:
+    """first-pass parse, argument check and a (trivial) tool call"""
+    from llm.process_tool_calls import parse_tool_calls, run_tools
+    from llm.tool_registry import get_tool_registry
+
+    tools = get_tool_registry().tools
+    response = {"message": {"role": "assistant", "content": json.dumps({"name": "general_chat", "arguments": {}})}}
+
+    async def parse_and_run(i: int):
+        calls, _ = parse_tool_calls(response, tools)
+        return await run_tools([(call.name, call.arguments) for call in calls], "bench")
+
+    return {"process_tool_calls": await measure(parse_and_run, env.args.iterations, warmup=10)}
+
+
+async def bench_extract_content(env: Environment) -> Dict[str, dict]:
+    from llm.extract_content import StreamingContentExtractor, extract_content
+
+    responses = [
+        {"message": {"content": json.dumps({"message": "The mean sea level rose 3 mm per year. " * 20})}},
+        {"message": {"content": "plain text answer " * 40}},
+        {"message": {"content": json.dumps({"content": "nested " * 50})}},
+    ]
+
+    async def extract(i: int) -> None:
+        extract_content(responses[i % len(responses)])
+
+    async def stream(i: int) -> None:
+        extractor = StreamingContentExtractor()
+        content = responses[0]["message"]["content"]
+        for j in range(0, len(content), 4):
+            extractor.feed(content[j:j + 4])
+        extractor.finish()
+
+    return {"extract_content": await measure(extract, env.args.iterations * 10),
+            "extract_content_stream": await measure(stream, env.args.iterations)}
+
+
+async def bench_file_scan(env: Environment) -> Dict[str, dict]:
+    """FileTracker.scan_csv_files over synthetic data directories: first scan, no-op rescan, rescan after edits"""
+    from llm.file_tracker import FileTracker
+
+    results = {}
+    for files in env.args.files:
+        with tempfile.TemporaryDirectory(prefix="oceangpt-scan-") as tmp:
+            data_dir = make_data_dir(Path(tmp) / "data", files)
+            tracker = FileTracker(FakeMetadataStore(), data_dir=str(data_dir),
+                                  manifest_path=str(Path(tmp) / "manifest.json"))
+            scan = lambda i: asyncio.to_thread(tracker.scan_csv_files)
+
+            async def cold(i: int) -> None:
+                tracker.manifest = {}
+                tracker.manifest_path.unlink(missing_ok=True)
+                await scan(i)
+
+            async def changed(i: int) -> None:
+                await asyncio.to_thread(touch_files, data_dir, max(1, files // 100), i)
+                await scan(i)
+
+            results[f"file_scan_cold_{files}"] = await measure(cold, 3)
+            results[f"file_scan_warm_{files}"] = await measure(scan, 10)
+            # includes rewriting the 1% of files
+            results[f"file_scan_1pct_changed_{files}"] = await measure(changed, 3)
+    return results
+
+
+async def bench_database(env: Environment) -> Dict[str, dict]:
+    """DatabaseManager store and history query (hash embeddings, so only chroma and the buffering are measured)"""
+    db_manager = env.database_manager()
+    sessions = 20
+    query = lambda i: db_manager.get_recent_turns(QUESTIONS[i % len(QUESTIONS)], f"db-{i % sessions}")
+    store = lambda i: db_manager.store_conversation(QUESTIONS[i % len(QUESTIONS)], f"answer {i}", f"db-{i % sessions}")
+    results = {"db_store": await measure(store, env.args.iterations),
+               "db_query": await measure(query, env.args.iterations)}
+    start = time.perf_counter()
+    await db_manager.close()
+    results["db_flush"] = summarize([time.perf_counter() - start], time.perf_counter() - start)
+    return results
+
+
+async def bench_execute_python(env: Environment) -> Dict[str, dict]:
+    from functions.execute_python import execute_python
+
+    code = "import numpy as np\nprint(np.arange(1000).mean())"
+    return {"execute_python": await measure(lambda i: execute_python(code, "bench"), env.args.requests, warmup=2)}
+
+
+async def bench_save_sea_level_data(env: Environment) -> Dict[str, dict]:
+    """the NOAA tool against the stub: a fresh station every call (fetch + append), then already stored ranges"""
+    from functions.save_sea_level_data import save_sea_level_data
+
+    stations = [s["id"] for s in env.noaa.stations]
+    fresh = lambda i: save_sea_level_data(stations[i % len(stations)], "2024-01-01", f"2024-01-{2 + i // len(stations):02d}")
+    stored = lambda i: save_sea_level_data(stations[i % len(stations)], "2024-01-01", "2024-01-02")
+    return {"save_sea_level_data_fetch": await measure(fresh, min(env.args.requests, 5 * len(stations))),
+            "save_sea_level_data_stored": await measure(stored, env.args.requests)}
+
+
+async def bench_sea_level_analyses(env: Environment) -> Dict[str, dict]:
+    """the built-in analyses on two stored stations with a year of 6-minute readings each"""
+    import functions.sea_level_store as sea_level_store
+    from functions import analyze_sea_level
+    from bench.analytics import synthetic_frame
+
+    stations = [s["id"] for s in env.noaa.stations[-2:]]  # stations the other scenarios don't write to
+    store = sea_level_store.get_sea_level_store(analyze_sea_level._DATA_DIR)
+    for seed, station in enumerate(stations):
+        store.merge(station, synthetic_frame(1, seed))
+    station = stations[0]
+    return {
+        "sea_level_statistics": await measure(lambda i: analyze_sea_level.sea_level_statistics(station),
+                                              env.args.requests),
+        "sea_level_tides": await measure(lambda i: analyze_sea_level.sea_level_tides(station), env.args.requests),
+        "sea_level_anomalies": await measure(lambda i: analyze_sea_level.sea_level_anomalies(station),
+                                             env.args.requests),
+        "compare_sea_level_stations": await measure(
+            lambda i: analyze_sea_level.compare_sea_level_stations(stations), env.args.requests
+        ),
+    }
+
+
+SCENARIOS: Dict[str, Callable[[Environment], Awaitable[Dict[str, dict]]]] = {
+    "pipeline": bench_pipeline,
+    "process_tool_calls": bench_process_tool_calls,
+    "extract_content": bench_extract_content,
+    "file_scan": bench_file_scan,
+    "database": bench_database,
+    "execute_python": bench_execute_python,
+    "save_sea_level_data": bench_save_sea_level_data,
+    "sea_level_analyses": bench_sea_level_analyses,
+}
+
+
+async def run(args) -> Dict[str, dict]:
+    results = {}
+    async with Environment(args) as env:
+        for name in args.only or SCENARIOS:
+            start = time.perf_counter()
+            try:
+                results.update(await SCENARIOS[name](env))
+            except Exception as e:
+                print(f"{name}: failed ({type(e).__name__}: {e})", file=sys.stderr)
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"{name}: done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return results
+
+
+def median_of(runs: List[Dict[str, dict]]) -> Dict[str, dict]:
+    """per scenario and metric, the median over repeated runs of the suite (a single slow run doesn't count)"""
+    merged = {}
+    for name, first in runs[0].items():
+        samples = [run[name] for run in runs if name in run and "error" not in run[name]]
+        if "error" in first or not samples:
+            merged[name] = first
+            continue
+        merged[name] = {metric: statistics.median(sample[metric] for sample in samples)
+                        if isinstance(value, (int, float)) else value for metric, value in first.items()}
+    return merged
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float, min_delta_ms: float) -> List[str]:
+    """scenario metrics that got worse than the baseline by more than threshold (and min_delta_ms for latencies)"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before or "error" in result or "error" in before:
+            continue
+        for metric, larger_is_worse in COMPARED.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            if not larger_is_worse and max(before.get("p50_ms", 0), result.get("p50_ms", 0)) < min_delta_ms:
+                continue  # throughput of sub-millisecond calls mostly measures noise
+            change = (new - old) / old
+            if larger_is_worse and change > threshold and new - old > min_delta_ms:
+                regressions.append(f"{name} {metric}: {old:g} -> {new:g} ({change:+.0%})")
+            elif not larger_is_worse and -change > threshold:
+                regressions.append(f"{name} {metric}: {old:g} -> {new:g} ({change:+.0%})")
+    return regressions
+
+
+def print_table(results: Dict[str, dict], baseline: Dict[str, dict]) -> None:
+    print(f"{'scenario':<34} {'n':>6} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'base p95':>10}")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<34} {result['error']}")
+            continue
+        base = baseline.get(name, {}).get("p95_ms")
+        print(f"{name:<34} {result['n']:>6} {result['throughput_rps'] or 0:>10.1f} {result['p50_ms']:>10.3f} "
+              f"{result['p95_ms']:>10.3f} {result['p99_ms']:>10.3f} {base if base is not None else '-':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=40, help="requests per end-to-end / tool scenario")
+    parser.add_argument("--iterations", type=int, default=500, help="calls per in-process component scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 1000, 10000], help="synthetic data dir sizes")
+    parser.add_argument("--token-ms", type=float, default=2.0, help="fake ollama latency per generated token")
+    parser.add_argument("--noaa-ms", type=float, default=20.0, help="stub NOAA latency per request")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of the suite, each metric is the median")
+    parser.add_argument("--save", help="write the results to this json baseline")
+    parser.add_argument("--compare", help="flag regressions against this json baseline")
+    parser.add_argument("--threshold", type=float, default=0.3, help="relative change that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore latency changes smaller than this")
+    args = parser.parse_args()
+
+    results = median_of([asyncio.run(run(args)) for _ in range(args.repeat)])
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({"created": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+                       "machine": platform.platform(), "settings": {k: v for k, v in vars(args).items()
+                                                                    if k not in ("save", "compare")},
+                       "results": results}, f, indent=2)
+        print(f"saved baseline to {args.save}")
+
+    if args.compare:
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
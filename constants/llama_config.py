@@ -1,5 +1,6 @@
 import os
 import json
+from functools import lru_cache
 
 script_dir = os.path.dirname(__file__)
 
@@ -7,16 +8,29 @@ script_dir = os.path.dirname(__file__)
 config_path = os.path.join(script_dir, "config.json")
 tools_path = os.path.join(script_dir, "tools.json")
 
-# load config variables here
-with open(config_path, "r") as f:
-    config = json.load(f)
 
-with open(tools_path, "r") as f:
-    tools = json.load(f)
+@lru_cache(maxsize=None)
+def _load(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+# variables are read on first access (module __getattr__), so importing this module does no file i/o
+def __getattr__(name):
+    # load config variables here
+    if name == "config":
+        return _load(config_path)
+    if name == "tools":
+        return _load(tools_path)
+    # assign variables here
+    if name == "model":
+        return _load(config_path)[0]["model"]
+    # tools are no longer part of the system prompt, llm.tool_registry picks the relevant ones per request
+    # (tools.json holds the hand-written descriptions layered over the generated schemas)
+    if name == "system":
+        return _load(config_path)[1]["system_prompt"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# assign variables here
-model = config[0]["model"]
-system = config[1]["system_prompt"] + f"Here are the tools you have available: {tools}"
 
 if __name__=="__main__":
-    print(system)
\ No newline at end of file
+    print(__getattr__("system"))
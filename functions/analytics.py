@@ -0,0 +1,297 @@
+"""
+vectorized sea level analytics on plain numpy arrays: times as datetime64[ns] (utc), levels as float64 metres.
+resampling, linear and robust trends, tidal harmonic analysis, rolling statistics and aligned multi-station
+joins, all without python-level loops over samples. the analyze_sea_level tools are built on these;
+this module exposes no tool itself
+"""
+from functools import reduce
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+NS_PER_HOUR = 3_600_000_000_000
+HOURS_PER_YEAR = 365.2425 * 24
+
+# fixed-width bins (hours) and calendar bins (numpy datetime units)
+FIXED_FREQUENCIES = {"hourly": 1, "daily": 24, "weekly": 168}
+CALENDAR_FREQUENCIES = {"monthly": "M", "yearly": "Y"}
+FREQUENCIES = tuple(FIXED_FREQUENCIES) + tuple(CALENDAR_FREQUENCIES)
+_WEEK_OFFSET_NS = 3 * 24 * NS_PER_HOUR  # 1970-01-01 was a thursday, weeks start on mondays
+
+# main tidal constituents: speed in degrees per hour, and the record length (days) needed to separate each
+# from its nearest neighbour in frequency (rayleigh criterion); shorter records fit only the ones that qualify
+CONSTITUENTS = {
+    "M2": (28.9841042, 0), "S2": (30.0, 15), "N2": (28.4397295, 28), "K2": (30.0821373, 183),
+    "K1": (15.0410686, 0), "O1": (13.9430356, 14), "P1": (14.9589314, 183), "Q1": (13.3986609, 28),
+    "M4": (57.9682084, 0), "MS4": (58.9841042, 15), "Sa": (0.0410686, 365), "Ssa": (0.0821373, 183),
+}
+
+
+class Bins(NamedTuple):
+    start: np.ndarray  # datetime64[ns] start of each non-empty bin
+    mean: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    count: np.ndarray
+
+
+class Trend(NamedTuple):
+    slope: float  # per year
+    intercept: float  # at the first sample
+    low: float  # 95% interval of the slope
+    high: float
+    n: int
+    method: str
+
+
+class Harmonics(NamedTuple):
+    names: List[str]
+    amplitude: np.ndarray
+    phase: np.ndarray  # degrees, relative to the reference time (no nodal corrections)
+    mean: float
+    trend: float  # per year, fitted alongside the tide
+    explained: float  # share of the variance the tide (and trend) explain
+    reference: np.datetime64
+
+
+def clean(times: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """drop missing levels and sort by time (stored data already is, this is a cheap check then)"""
+    times = np.asarray(times, dtype="datetime64[ns]")
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if not valid.all():
+        times, values = times[valid], values[valid]
+    if times.size > 1 and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+    return times, values
+
+
+def years_since(times: np.ndarray, origin: np.datetime64) -> np.ndarray:
+    return (times - origin).astype("timedelta64[ns]").astype(np.float64) / (NS_PER_HOUR * HOURS_PER_YEAR)
+
+
+def bin_keys(times: np.ndarray, frequency: str) -> np.ndarray:
+    """sortable int64 key of the bin each time falls in"""
+    if frequency in CALENDAR_FREQUENCIES:
+        return times.astype(f"datetime64[{CALENDAR_FREQUENCIES[frequency]}]").astype(np.int64)
+    if frequency in FIXED_FREQUENCIES:
+        width = FIXED_FREQUENCIES[frequency] * NS_PER_HOUR
+        offset = _WEEK_OFFSET_NS if frequency == "weekly" else 0
+        return (times.astype(np.int64) + offset) // width
+    raise ValueError(f"Unknown frequency {frequency!r}, use one of {', '.join(FREQUENCIES)}")
+
+
+def key_starts(keys: np.ndarray, frequency: str) -> np.ndarray:
+    """bin keys back to the datetime64[ns] their bins start at"""
+    if frequency in CALENDAR_FREQUENCIES:
+        return keys.astype(f"datetime64[{CALENDAR_FREQUENCIES[frequency]}]").astype("datetime64[ns]")
+    width = FIXED_FREQUENCIES[frequency] * NS_PER_HOUR
+    offset = _WEEK_OFFSET_NS if frequency == "weekly" else 0
+    return (keys * width - offset).astype("datetime64[ns]")
+
+
+def resample(times: np.ndarray, values: np.ndarray, frequency: str = "daily") -> Bins:
+    """
+    mean, min, max and sample count per bin: the bin edges are looked up in the sorted times (searchsorted),
+    so only the bins are converted between calendar units, not every reading, and reduceat sums between them
+    """
+    times, values = clean(times, values)
+    if not values.size:
+        empty = np.array([], dtype=np.float64)
+        return Bins(np.array([], dtype="datetime64[ns]"), empty, empty, empty, np.array([], dtype=np.int64))
+    first, last = bin_keys(times[[0, -1]], frequency)
+    keys = np.arange(first, last + 1)
+    edges = np.searchsorted(times, key_starts(keys, frequency))
+    present = np.diff(np.r_[edges, values.size]) > 0
+    keys, starts = keys[present], edges[present]
+    count = np.diff(np.r_[starts, values.size])
+    return Bins(
+        start=key_starts(keys, frequency),
+        mean=np.add.reduceat(values, starts) / count,
+        minimum=np.minimum.reduceat(values, starts),
+        maximum=np.maximum.reduceat(values, starts),
+        count=count,
+    )
+
+
+def fit_trend(times: np.ndarray, values: np.ndarray, method: str = "ols", max_points: int = 2000) -> Trend:
+    """
+    linear trend per year. "ols": least squares with a 95% interval from the slope's standard error.
+    "theil_sen": median of the pairwise slopes (robust to outliers and steps), on at most max_points evenly
+    spaced samples, with sen's rank-based 95% interval
+    """
+    times, values = clean(times, values)
+    n = values.size
+    if n < 3:
+        raise ValueError("At least 3 values are needed for a trend")
+    x = years_since(times, times[0])
+    if method == "ols":
+        x_mean, y_mean = x.mean(), values.mean()
+        sxx = np.sum((x - x_mean) ** 2)
+        if sxx == 0:
+            raise ValueError("All values are at the same time")
+        slope = float(np.sum((x - x_mean) * (values - y_mean)) / sxx)
+        intercept = float(y_mean - slope * x_mean)
+        residual = values - (intercept + slope * x)
+        stderr = float(np.sqrt(np.sum(residual ** 2) / (n - 2) / sxx))
+        return Trend(slope, intercept, slope - 1.96 * stderr, slope + 1.96 * stderr, n, method)
+    if method == "theil_sen":
+        if n > max_points:
+            pick = np.linspace(0, n - 1, max_points).astype(np.int64)
+            x, values = x[pick], values[pick]
+        i, j = np.triu_indices(x.size, 1)
+        dx = x[j] - x[i]
+        keep = dx > 0
+        slopes = np.sort((values[j] - values[i])[keep] / dx[keep])
+        if not slopes.size:
+            raise ValueError("All values are at the same time")
+        slope = float(np.median(slopes))
+        m = x.size
+        spread = 1.96 * np.sqrt(m * (m - 1) * (2 * m + 5) / 18)
+        low = slopes[max(int((slopes.size - spread) / 2), 0)]
+        high = slopes[min(int((slopes.size + spread) / 2), slopes.size - 1)]
+        return Trend(slope, float(np.median(values - slope * x)), float(low), float(high), n, method)
+    raise ValueError(f"Unknown trend method {method!r}, use 'ols' or 'theil_sen'")
+
+
+def resolvable_constituents(times: np.ndarray) -> List[str]:
+    """constituents the record is long enough to separate"""
+    days = (times[-1] - times[0]).astype("timedelta64[ns]").astype(np.float64) / (24 * NS_PER_HOUR)
+    return [name for name, (_, min_days) in CONSTITUENTS.items() if days >= min_days]
+
+
+def _design(hours: np.ndarray, speeds: np.ndarray) -> np.ndarray:
+    angles = np.radians(np.outer(hours, speeds))
+    return np.column_stack([np.ones_like(hours), hours / HOURS_PER_YEAR, np.cos(angles), np.sin(angles)])
+
+
+def harmonic_fit(times: np.ndarray, values: np.ndarray, constituents: Optional[Sequence[str]] = None,
+                 max_samples: int = 100_000) -> Harmonics:
+    """
+    least-squares fit of mean + linear trend + tidal constituents (by default every one the record length
+    resolves). records of more than max_samples readings are fitted on hourly means, as tidal analysis
+    usually is (the amplitudes are corrected for the averaging, which damps M2 by about 1%)
+    """
+    times, values = clean(times, values)
+    if values.size < 24:
+        raise ValueError("At least a day of readings is needed for a tidal fit")
+    names = list(constituents) if constituents is not None else resolvable_constituents(times)
+    fit_times, fit_values, averaged = times, values, False
+    if values.size > max_samples:
+        hourly = resample(times, values, "hourly")
+        if hourly.count.max() > 1:  # hourly data (or sparser) is fitted as it is
+            fit_times, fit_values = hourly.start + np.timedelta64(NS_PER_HOUR // 2, "ns"), hourly.mean
+            averaged = True
+
+    reference = fit_times[0] + (fit_times[-1] - fit_times[0]) // 2
+    speeds = np.array([CONSTITUENTS[name][0] for name in names])
+    hours = (fit_times - reference).astype("timedelta64[ns]").astype(np.float64) / NS_PER_HOUR
+    design = _design(hours, speeds)
+    # normal equations: a few dozen columns, so solving the small gram matrix beats factorizing the design
+    coefficients, *_ = np.linalg.lstsq(design.T @ design, design.T @ fit_values, rcond=None)
+    k = len(names)
+    cosines, sines = coefficients[2:2 + k], coefficients[2 + k:]
+    residual = fit_values - design @ coefficients
+    variance = np.var(fit_values)
+    # the hourly mean of a cosine is the cosine damped by sinc(cycles per hour)
+    damping = np.sinc(speeds / 360) if averaged else 1.0
+    return Harmonics(
+        names=names,
+        amplitude=np.hypot(cosines, sines) / damping,
+        phase=np.degrees(np.arctan2(sines, cosines)) % 360,
+        mean=float(coefficients[0]),
+        trend=float(coefficients[1]),
+        explained=float(1 - np.var(residual) / variance) if variance > 0 else 0.0,
+        reference=reference,
+    )
+
+
+def tide(times: np.ndarray, harmonics: Harmonics) -> np.ndarray:
+    """the fitted mean + trend + tide at the given times"""
+    times = np.asarray(times, dtype="datetime64[ns]")
+    hours = (times - harmonics.reference).astype("timedelta64[ns]").astype(np.float64) / NS_PER_HOUR
+    out = harmonics.mean + harmonics.trend * hours / HOURS_PER_YEAR
+    for name, amplitude, phase in zip(harmonics.names, harmonics.amplitude, harmonics.phase):
+        out += amplitude * np.cos(np.radians(CONSTITUENTS[name][0] * hours - phase))
+    return out
+
+
+def detide(times: np.ndarray, values: np.ndarray, harmonics: Optional[Harmonics] = None
+           ) -> Tuple[np.ndarray, np.ndarray, Harmonics]:
+    """(times, non-tidal residual, fit): the readings minus the fitted mean, trend and tide"""
+    times, values = clean(times, values)
+    if harmonics is None:
+        harmonics = harmonic_fit(times, values)
+    return times, values - tide(times, harmonics), harmonics
+
+
+def regular(bins: Bins, frequency: str) -> Tuple[np.ndarray, np.ndarray]:
+    """fixed-width bin means on a gapless grid, empty bins as nan (what rolling windows need)"""
+    if frequency not in FIXED_FREQUENCIES:
+        raise ValueError(f"Rolling statistics need a fixed-width frequency: {', '.join(FIXED_FREQUENCIES)}")
+    keys = bin_keys(bins.start, frequency)
+    if not keys.size:
+        return bins.start, bins.mean
+    grid = np.arange(keys[0], keys[-1] + 1)
+    values = np.full(grid.size, np.nan)
+    values[keys - keys[0]] = bins.mean
+    return key_starts(grid, frequency), values
+
+
+def rolling(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    trailing mean, std, min and max over `window` samples of a regular series (nan = missing); windows with
+    fewer than min_periods (default half the window) values are nan, as in pandas' rolling. sums come from
+    cumulative sums and extremes from a sliding window view, so nothing loops in python
+    """
+    min_periods = min_periods or max(window // 2, 1)
+    # leading partial windows are full windows over missing values
+    values = np.r_[np.full(window - 1, np.nan), np.asarray(values, dtype=np.float64)]
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+
+    def window_sum(x):
+        cumulative = np.r_[0.0, np.cumsum(x)]
+        return cumulative[window:] - cumulative[:-window]
+
+    count = window_sum(present.astype(np.float64))
+    total, squares = window_sum(filled), window_sum(filled ** 2)
+    enough = count >= min_periods
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(enough, total / count, np.nan)
+        variance = np.where(count > 1, (squares - total ** 2 / count) / (count - 1), np.nan)
+    view = np.lib.stride_tricks.sliding_window_view
+    return {
+        "mean": mean,
+        "std": np.where(enough, np.sqrt(np.clip(variance, 0, None)), np.nan),
+        "min": np.where(enough, view(np.where(present, values, np.inf), window).min(axis=1), np.nan),
+        "max": np.where(enough, view(np.where(present, values, -np.inf), window).max(axis=1), np.nan),
+    }
+
+
+def robust_zscores(values: np.ndarray) -> np.ndarray:
+    """distance from the median in units of the scaled median absolute deviation (a std that ignores outliers)"""
+    median = np.nanmedian(values)
+    mad = 1.4826 * np.nanmedian(np.abs(values - median))
+    return (values - median) / mad if mad > 0 else np.zeros_like(values)
+
+
+def events(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(first, last) index of every run of True in mask"""
+    edges = np.diff(np.r_[0, mask.astype(np.int8), 0])
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+
+def align(series: Sequence[Tuple[np.ndarray, np.ndarray]], frequency: str = "hourly") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    inner join of several stations on common bins: (bin starts, matrix of bin means with a column per
+    station), keeping only the bins every station has data in
+    """
+    if not series:
+        raise ValueError("No stations to align")
+    binned = [resample(times, values, frequency) for times, values in series]
+    keys = [bin_keys(b.start, frequency) for b in binned]
+    common = reduce(np.intersect1d, keys)
+    matrix = np.column_stack([b.mean[np.searchsorted(k, common)] for b, k in zip(binned, keys)])
+    return key_starts(common, frequency), matrix
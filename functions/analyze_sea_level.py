@@ -0,0 +1,346 @@
+"""
+built-in analyses of the stored sea level data (see sea_level_store), so common questions are answered by a
+function call instead of code generated for execute_python: statistics per period, trends, tides, anomalies,
+rolling statistics and station comparisons. every tool answers with a short text summary, the numbers come
+from the vectorized functions in analytics
+"""
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from llm.utils.logging_config import setup_logging
+
+try:
+    from functions import analytics
+    from functions.sea_level_store import get_sea_level_store
+    from functions.station_index import get_station_index
+except ImportError:
+    import analytics
+    from sea_level_store import get_sea_level_store
+    from station_index import get_station_index
+
+logger = setup_logging()
+
+__tools__ = ["sea_level_statistics", "sea_level_trend", "sea_level_tides", "sea_level_anomalies",
+             "sea_level_rolling_statistics", "compare_sea_level_stations"]
+
+_DATA_DIR = Path(__file__).parent.parent / "data"
+_MAX_ROWS = 24  # periods listed one by one, longer tables show their ends and extremes
+_MAX_EVENTS = 5
+_TIME_UNITS = {"hourly": "m", "daily": "D", "weekly": "D", "monthly": "M", "yearly": "Y"}
+
+
+class _NoData(Exception):
+    pass
+
+
+async def _station(location) -> Dict:
+    """a station from the index by id or (fuzzy) name, or a stored station by id when the index is unavailable"""
+    location = str(location)
+    try:
+        station = (await get_station_index()).find(location)
+    except Exception as e:
+        logger.warning(f"Station index unavailable, looking for stored data only: {e}")
+        station = None
+    if station is None:
+        store = get_sea_level_store(_DATA_DIR)
+        if location not in store.stations():
+            raise ValueError(f"Could not find station ID for location: {location}")
+        station = {"station_id": location, "name": store.station_info(location).get("name") or location}
+    return station
+
+
+def _load(station: Dict, begin_date=None, end_date=None) -> Tuple[np.ndarray, np.ndarray]:
+    """(times, levels) of a station's stored readings, optionally restricted to a period"""
+    try:
+        df = get_sea_level_store(_DATA_DIR).load(station["station_id"], begin_date, end_date, columns=["level"])
+    except FileNotFoundError:
+        raise _NoData(f"No stored sea level data for {_name(station)}, fetch it with save_sea_level_data first")
+    # the store's index is UTC; its unit depends on the pandas version
+    times = df.index.tz_convert(None).to_numpy().astype("datetime64[ns]")
+    times, values = analytics.clean(times, df["level"].to_numpy(np.float64))
+    if not values.size:
+        raise _NoData(f"No stored readings for {_name(station)} in that period, fetch it with save_sea_level_data")
+    return times, values
+
+
+def _name(station: Dict) -> str:
+    return f"{station['name']} ({station['station_id']})"
+
+
+def _time(value, unit: str = "m") -> str:
+    return np.datetime_as_string(value, unit=unit).replace("T", " ")
+
+
+def _file(station: Dict) -> str:
+    """the station's data file, named in every answer so cached answers are dropped when it changes"""
+    return get_sea_level_store(_DATA_DIR).path(station["station_id"]).name
+
+
+def _header(station: Dict, times: np.ndarray, readings: int) -> str:
+    return (f"Station {_name(station)}, {_time(times[0])} to {_time(times[-1])} UTC, {readings} readings "
+            f"from {_file(station)} (metres, MSL datum)")
+
+
+def _rows(bins: analytics.Bins, frequency: str) -> List[str]:
+    unit = _TIME_UNITS[frequency]
+    row = lambda i: (f"{_time(bins.start[i], unit)}: mean {bins.mean[i]:.3f}, min {bins.minimum[i]:.3f}, "
+                     f"max {bins.maximum[i]:.3f} ({bins.count[i]} readings)")
+    if bins.mean.size <= _MAX_ROWS:
+        return [row(i) for i in range(bins.mean.size)]
+    half = _MAX_ROWS // 4
+    highest, lowest = int(np.argmax(bins.mean)), int(np.argmin(bins.mean))
+    return ([row(i) for i in range(half)] + [f"... {bins.mean.size - 2 * half} more ..."]
+            + [row(i) for i in range(bins.mean.size - half, bins.mean.size)]
+            + [f"highest {frequency} mean: {row(highest)}", f"lowest {frequency} mean: {row(lowest)}"])
+
+
+async def _run(summary, *args) -> str:
+    """run a summary off the event loop (file reads and numpy), reporting failures as the tool's answer"""
+    try:
+        return await asyncio.to_thread(summary, *args)
+    except (_NoData, ValueError) as e:
+        logger.warning(f"Error: {str(e)}")
+        return f"Error: {str(e)}"
+    except Exception as e:
+        logger.exception(f"Unexpected error: {str(e)}")
+        return f"Unexpected error: {str(e)}"
+
+
+async def _resolve(*locations) -> List[Dict]:
+    return [await _station(location) for location in locations]
+
+
+def _statistics(station: Dict, begin_date, end_date, frequency: str) -> str:
+    times, values = _load(station, begin_date, end_date)
+    bins = analytics.resample(times, values, frequency)
+    low, high = int(np.argmin(values)), int(np.argmax(values))
+    return "\n".join([
+        _header(station, times, values.size),
+        f"overall: mean {values.mean():.3f}, std {values.std():.3f}, lowest {values[low]:.3f} at "
+        f"{_time(times[low])}, highest {values[high]:.3f} at {_time(times[high])}",
+        f"{frequency} means:",
+        *_rows(bins, frequency),
+    ])
+
+
+async def sea_level_statistics(location, begin_date=None, end_date=None, frequency="monthly") -> str:
+    """
+    Average, lowest and highest sea level of a station per month (or per hour, day, week or year), from the
+    data stored by save_sea_level_data. Use for questions about monthly means, averages or extremes over time.
+
+    Args:
+        location (str): Location name or station ID
+        begin_date (str): Start of the period (e.g. '2020-01-01'), defaults to the first stored reading
+        end_date (str): End of the period, defaults to the last stored reading
+        frequency (str): 'hourly', 'daily', 'weekly', 'monthly' or 'yearly'
+    """
+    try:
+        station, = await _resolve(location)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    return await _run(_statistics, station, begin_date, end_date, str(frequency).lower())
+
+
+def _trend(station: Dict, begin_date, end_date, method: str) -> str:
+    times, values = _load(station, begin_date, end_date)
+    # fit monthly means: tides and uneven sampling would otherwise dominate the readings' scatter
+    months = analytics.resample(times, values, "monthly")
+    frequency, bins = ("monthly", months) if months.mean.size >= 6 else \
+        ("daily", analytics.resample(times, values, "daily"))
+    trend = analytics.fit_trend(bins.start, bins.mean, method)
+    years = analytics.years_since(times[-1:], times[0])[0]
+    direction = "rising" if trend.slope > 0 else "falling"
+    label = "least squares" if method == "ols" else "Theil-Sen (robust)"
+    lines = [
+        _header(station, times, values.size),
+        f"trend: {direction} {abs(trend.slope) * 1000:.2f} mm/year (95% interval {trend.low * 1000:.2f} to "
+        f"{trend.high * 1000:.2f}), {label} fit on {trend.n} {frequency} means",
+        f"change over the period: {trend.slope * years * 100:+.1f} cm in {years:.1f} years",
+    ]
+    if years < 3:
+        lines.append("note: over less than a few years the trend mostly reflects seasonal and weather variation, "
+                     "not long-term sea level change")
+    return "\n".join(lines)
+
+
+async def sea_level_trend(location, begin_date=None, end_date=None, method="ols") -> str:
+    """
+    Long-term sea level trend of a station over the years: the rate of sea level rise or fall in mm per year,
+    with its uncertainty, from the data stored by save_sea_level_data.
+
+    Args:
+        location (str): Location name or station ID
+        begin_date (str): Start of the period (e.g. '2000-01-01'), defaults to the first stored reading
+        end_date (str): End of the period, defaults to the last stored reading
+        method (str): 'ols' (least squares) or 'theil_sen' (robust to outliers and jumps)
+    """
+    try:
+        station, = await _resolve(location)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    return await _run(_trend, station, begin_date, end_date, str(method).lower())
+
+
+def _tides(station: Dict, begin_date, end_date) -> str:
+    times, values = _load(station, begin_date, end_date)
+    harmonics = analytics.harmonic_fit(times, values)
+    amplitude = dict(zip(harmonics.names, harmonics.amplitude))
+    order = np.argsort(harmonics.amplitude)[::-1][:8]
+    semidiurnal = amplitude.get("M2", 0) + amplitude.get("S2", 0)
+    form = (amplitude.get("K1", 0) + amplitude.get("O1", 0)) / semidiurnal if semidiurnal else float("inf")
+    kind = ("semidiurnal" if form < 0.25 else "mixed, mainly semidiurnal" if form < 1.5
+            else "mixed, mainly diurnal" if form < 3 else "diurnal")
+    return "\n".join([
+        _header(station, times, values.size),
+        f"tide type: {kind} (form factor {form:.2f}); the fit explains {harmonics.explained:.1%} of the variance",
+        "constituents (amplitude, phase relative to "
+        f"{_time(harmonics.reference)} UTC): " + ", ".join(
+            f"{harmonics.names[i]} {harmonics.amplitude[i]:.3f} m {harmonics.phase[i]:.0f} deg" for i in order
+        ),
+    ])
+
+
+async def sea_level_tides(location, begin_date=None, end_date=None) -> str:
+    """
+    Tidal harmonic analysis of a station's stored data: amplitude and phase of the main tidal constituents
+    (M2, S2, K1, O1, ...), the tide type (diurnal or semidiurnal) and how much of the variation the tide explains.
+
+    Args:
+        location (str): Location name or station ID
+        begin_date (str): Start of the period (e.g. '2024-01-01'), defaults to the first stored reading
+        end_date (str): End of the period, defaults to the last stored reading
+    """
+    try:
+        station, = await _resolve(location)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    return await _run(_tides, station, begin_date, end_date)
+
+
+def _anomalies(station: Dict, begin_date, end_date, threshold: float) -> str:
+    times, values = _load(station, begin_date, end_date)
+    # detided hourly means: single noisy readings aren't episodes, and fitting an hour grid is ten times cheaper
+    hourly = analytics.resample(times, values, "hourly")
+    _, residual, _ = analytics.detide(hourly.start + np.timedelta64(30, "m"), hourly.mean)
+    # on a gapless grid, so that gaps (nan) end an episode
+    hours, residual = analytics.regular(hourly._replace(mean=residual), "hourly")
+    scores = analytics.robust_zscores(residual)
+    with np.errstate(invalid="ignore"):
+        firsts, lasts = analytics.events(np.abs(scores) >= threshold)
+    lines = [_header(station, times, values.size),
+             f"{firsts.size} anomalous episode(s) where the hourly mean water level was at least {threshold:g} "
+             f"robust standard deviations above or below the predicted tide (residual std {np.nanstd(residual):.3f})"]
+    if firsts.size:
+        # peak of each episode: its largest |score|
+        peaks = firsts + np.array([np.argmax(np.abs(scores[f:l + 1])) for f, l in zip(firsts, lasts)])
+        for k in np.argsort(np.abs(scores[peaks]))[::-1][:_MAX_EVENTS]:
+            peak = peaks[k]
+            lines.append(f"{_time(hours[firsts[k]])} to {_time(hours[lasts[k]])}: {residual[peak]:+.3f} m "
+                         f"{'above' if residual[peak] > 0 else 'below'} the tide in the hour from "
+                         f"{_time(hours[peak])} ({scores[peak]:+.1f} sigma, "
+                         f"{'surge' if residual[peak] > 0 else 'set-down'})")
+    return "\n".join(lines)
+
+
+async def sea_level_anomalies(location, begin_date=None, end_date=None, threshold=3.0) -> str:
+    """
+    Detect anomalies in a station's stored sea level: storm surges and unusually high or low water, found
+    after removing the predicted tide. Lists the largest episodes with their time and size.
+
+    Args:
+        location (str): Location name or station ID
+        begin_date (str): Start of the period (e.g. '2024-01-01'), defaults to the first stored reading
+        end_date (str): End of the period, defaults to the last stored reading
+        threshold (float): How unusual a reading must be, in robust standard deviations (default 3)
+    """
+    try:
+        station, = await _resolve(location)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    return await _run(_anomalies, station, begin_date, end_date, float(threshold))
+
+
+def _rolling(station: Dict, begin_date, end_date, window_days: float) -> str:
+    times, values = _load(station, begin_date, end_date)
+    frequency = "hourly" if window_days <= 7 else "daily"
+    step_hours = analytics.FIXED_FREQUENCIES[frequency]
+    window = max(int(round(window_days * 24 / step_hours)), 1)
+    grid, means = analytics.regular(analytics.resample(times, values, frequency), frequency)
+    stats = analytics.rolling(means, window)
+    if np.all(np.isnan(stats["mean"])):
+        raise _NoData(f"Not enough data for a {window_days:g}-day window")
+    unit = _TIME_UNITS[frequency]
+    at = lambda key, pick: (lambda i: f"{stats[key][i]:.3f} ending {_time(grid[i], unit)}")(pick(stats[key]))
+    last = int(np.flatnonzero(~np.isnan(stats["mean"]))[-1])
+    return "\n".join([
+        _header(station, times, values.size),
+        f"{window_days:g}-day rolling statistics of {frequency} means:",
+        f"latest: mean {stats['mean'][last]:.3f}, std {stats['std'][last]:.3f}, min {stats['min'][last]:.3f}, "
+        f"max {stats['max'][last]:.3f} (window ending {_time(grid[last], unit)})",
+        f"highest rolling mean {at('mean', np.nanargmax)}, lowest {at('mean', np.nanargmin)}",
+        f"most variable window: std {at('std', np.nanargmax)}; calmest: std {at('std', np.nanargmin)}",
+    ])
+
+
+async def sea_level_rolling_statistics(location, begin_date=None, end_date=None, window_days=30.0) -> str:
+    """
+    Rolling (moving) average and variability of a station's stored sea level over a window of days: the
+    latest values and when the moving average and spread were highest and lowest.
+
+    Args:
+        location (str): Location name or station ID
+        begin_date (str): Start of the period (e.g. '2024-01-01'), defaults to the first stored reading
+        end_date (str): End of the period, defaults to the last stored reading
+        window_days (float): Window length in days (default 30)
+    """
+    try:
+        station, = await _resolve(location)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    return await _run(_rolling, station, begin_date, end_date, float(window_days))
+
+
+def _compare(stations: List[Dict], begin_date, end_date, frequency: str) -> str:
+    series = [_load(station, begin_date, end_date) for station in stations]
+    bins, matrix = analytics.align(series, frequency)
+    if bins.size < 3:
+        raise _NoData("The stations have (almost) no stored data for a common period")
+    unit = _TIME_UNITS[frequency]
+    lines = [f"{len(stations)} stations, {bins.size} common {frequency} means from {_time(bins[0], unit)} to "
+             f"{_time(bins[-1], unit)} (metres, MSL datum):"]
+    for station, column in zip(stations, matrix.T):
+        trend = analytics.fit_trend(bins, column)
+        lines.append(f"{_name(station)} ({_file(station)}): mean {column.mean():.3f}, std {column.std():.3f}, min {column.min():.3f}, "
+                     f"max {column.max():.3f}, trend {trend.slope * 1000:+.1f} mm/year")
+    correlation = np.corrcoef(matrix.T)
+    for i, j in zip(*np.triu_indices(len(stations), 1)):
+        difference = matrix[:, j] - matrix[:, i]
+        lines.append(f"{stations[j]['name']} vs {stations[i]['name']}: correlation {correlation[i, j]:.2f}, "
+                     f"mean difference {difference.mean():+.3f}, rms difference {np.sqrt(np.mean(difference ** 2)):.3f}")
+    return "\n".join(lines)
+
+
+async def compare_sea_level_stations(locations: List[str], begin_date=None, end_date=None,
+                                     frequency="daily") -> str:
+    """
+    Compare the stored sea level of several stations over their common period: aligned means, variability,
+    trends, and how closely each pair of stations moves together (correlation and differences).
+
+    Args:
+        locations (list): Location names or station IDs, at least two
+        begin_date (str): Start of the period (e.g. '2024-01-01'), defaults to the first common reading
+        end_date (str): End of the period, defaults to the last common reading
+        frequency (str): Means compared per 'hourly', 'daily', 'weekly', 'monthly' or 'yearly' period
+    """
+    if isinstance(locations, str):
+        locations = [part.strip() for part in locations.split(",")]
+    if len(locations) < 2:
+        return "Error: compare needs at least two stations"
+    try:
+        stations = await _resolve(*locations)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    return await _run(_compare, stations, begin_date, end_date, str(frequency).lower())
@@ -1,65 +1,46 @@
 # functions/execute_python.py
 import asyncio
-from langchain_core.tools import Tool
-from langchain_experimental.utilities import PythonREPL
-import sys
-import io
-from contextlib import redirect_stdout, redirect_stderr
-import traceback
 
+try:
+    from functions.python_worker_pool import get_python_worker_pool
+except ImportError:
+    from python_worker_pool import get_python_worker_pool
 
-async def execute_python(code: str) -> str:
+
+async def execute_python(code: str, session_id: str = "default") -> str:
     """
-    Execute Python code asynchronously in a controlled environment using LangChain's PythonREPL.
+    Execute Python code asynchronously in a pre-warmed worker process (see python_worker_pool).
+    numpy, pandas and matplotlib are already imported, and variables persist between calls of the same session.
 
     Args:
         code (str): Python code to execute
+        session_id (str): Session whose worker (and variables) the code runs in
 
     Returns:
         str: Output of the code execution or error message
     """
-    # Create a Python REPL
-    python_repl = PythonREPL()
-
-    # Create string buffers for stdout and stderr
-    stdout_buffer = io.StringIO()
-    stderr_buffer = io.StringIO()
-
     try:
-        # Run the potentially blocking code execution in a thread pool
-        loop = asyncio.get_event_loop()
-        # Redirect stdout and stderr to our buffers and execute code
-        with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-            result = await loop.run_in_executor(
-                None,
-                lambda: python_repl.run(code)
-            )
-
-        # Get the output and errors
-        output = stdout_buffer.getvalue()
-        errors = stderr_buffer.getvalue()
+        # The worker round trip blocks, so it runs in a thread; output is captured inside the worker process
+        response = await asyncio.to_thread(get_python_worker_pool().run, code, session_id)
 
         # Combine all outputs
         full_output = ""
-        if output:
-            full_output += f"Output:\n{output}\n"
-        if errors:
-            full_output += f"Errors:\n{errors}\n"
-        if result:
-            full_output += f"Result:\n{result}"
+        if response["output"]:
+            full_output += f"Output:\n{response['output']}\n"
+        if response["errors"]:
+            full_output += f"Errors:\n{response['errors']}\n"
+        if response["error"]:
+            full_output += f"Error executing code:\n{response['error']}\n"
+        if response.get("notice"):
+            full_output += f"Note: {response['notice']}\n"
+        if response["result"]:
+            full_output += f"Result:\n{response['result']}"
 
         # If there's no output at all, provide a success message
         return full_output.strip() or "Code executed successfully with no output"
 
     except Exception as e:
-        # Get the full traceback
-        error_traceback = traceback.format_exc()
-        return f"Error executing code:\n{error_traceback}"
-
-    finally:
-        # Clean up the buffers
-        stdout_buffer.close()
-        stderr_buffer.close()
+        return f"Error executing code:\n{str(e)}"
 
 
 async def main():
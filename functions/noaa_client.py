@@ -0,0 +1,167 @@
+import asyncio
+import random
+import weakref
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from llm.config import Config
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+# longest range NOAA CO-OPS serves in one request, per product
+MAX_RANGE_DAYS = {
+    "water_level": 31,
+    "predictions": 365,
+    "hourly_height": 365,
+    "high_low": 365,
+    "daily_mean": 3650,
+    "monthly_mean": 73000,
+}
+
+DATE_FORMAT = "%Y%m%d %H:%M"
+
+
+class NoaaError(Exception):
+    """error payload returned by the NOAA api"""
+
+
+def split_range(begin: datetime, end: datetime, max_days: int) -> List[Tuple[datetime, datetime]]:
+    """split [begin, end] into consecutive windows no longer than max_days"""
+    step = timedelta(days=max_days)
+    chunks = []
+    start = begin
+    while start < end:
+        stop = min(start + step, end)
+        chunks.append((start, stop))
+        start = stop
+    return chunks
+
+
+class NoaaClient:
+    """
+    async client for the NOAA CO-OPS data api.
+    one keep-alive connection pool is shared by every request made on an event loop; long ranges are
+    split into NOAA-sized chunks that are fetched in parallel, and transient failures are retried with backoff
+    """
+
+    def __init__(self, base_url: str = Config.NOAA_BASE_URL, max_connections: int = Config.NOAA_MAX_CONNECTIONS,
+                 max_retries: int = Config.NOAA_MAX_RETRIES, backoff: float = Config.NOAA_BACKOFF,
+                 timeout: float = Config.NOAA_TIMEOUT):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # httpx clients are bound to the loop they were first used on
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            self._clients[loop] = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._clients[loop]
+
+    async def _get(self, params: Dict) -> Dict:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.get(self.base_url, params=params)
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+                error = httpx.HTTPStatusError(f"NOAA returned {response.status_code}",
+                                              request=response.request, response=response)
+            except httpx.TransportError as e:
+                error = e
+
+            if attempt == self.max_retries:
+                raise error
+            delay = self.backoff * 2 ** attempt * (1 + random.random())
+            logger.warning(f"NOAA request failed ({error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def _fetch_chunk(self, station_id: str, begin: datetime, end: datetime, product: str,
+                           datum: str, interval: Optional[str]) -> List[Dict]:
+        params = {
+            'station': station_id,
+            'product': product,
+            'begin_date': begin.strftime(DATE_FORMAT),
+            'end_date': end.strftime(DATE_FORMAT),
+            'datum': datum,
+            'units': 'metric',
+            'time_zone': 'gmt',
+            'format': 'json',
+            'application': Config.NOAA_APPLICATION,
+        }
+        if interval:
+            params['interval'] = interval
+
+        data = await self._get(params)
+        if 'error' in data:
+            message = data['error'].get('message', str(data['error']))
+            # a window without observations is not a failure of the whole range
+            if 'no data was found' in message.lower():
+                return []
+            raise NoaaError(message)
+        return data.get('data') or data.get('predictions') or []
+
+    async def fetch(self, station_id: str, begin: datetime, end: datetime, product: str = "water_level",
+                    datum: str = "MSL", interval: Optional[str] = None) -> List[Dict]:
+        """fetch one station over any range, splitting it into parallel NOAA-sized requests"""
+        chunks = split_range(begin, end, MAX_RANGE_DAYS.get(product, 31))
+        results = await asyncio.gather(*(
+            self._fetch_chunk(station_id, start, stop, product, datum, interval) for start, stop in chunks
+        ))
+
+        # adjacent windows share their boundary timestamp
+        rows, seen = [], set()
+        for chunk in results:
+            for row in chunk:
+                if row.get('t') not in seen:
+                    seen.add(row.get('t'))
+                    rows.append(row)
+        return rows
+
+    async def fetch_many(self, station_ids: Iterable[str], begin: datetime, end: datetime,
+                         product: str = "water_level", datum: str = "MSL",
+                         interval: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """
+        bulk fetch for many stations at once; stations that fail are logged and returned with no rows
+        so one bad station id doesn't fail the batch
+        """
+        station_ids = list(dict.fromkeys(station_ids))
+        results = await asyncio.gather(
+            *(self.fetch(station_id, begin, end, product, datum, interval) for station_id in station_ids),
+            return_exceptions=True
+        )
+
+        data = {}
+        for station_id, result in zip(station_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to fetch {product} for station {station_id}: {result}")
+                result = []
+            data[station_id] = result
+        return data
+
+    async def aclose(self) -> None:
+        for client in list(self._clients.values()):
+            await client.aclose()
+        self._clients.clear()
+
+
+_noaa_client = None
+
+
+def get_noaa_client() -> NoaaClient:
+    """shared client, so every tool call reuses the same connection pool"""
+    global _noaa_client
+    if _noaa_client is None:
+        _noaa_client = NoaaClient()
+    return _noaa_client
@@ -0,0 +1,243 @@
+import ast
+import io
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on windows, workers then run without cpu/memory limits
+    resource = None
+
+from llm.config import Config
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+# imported once per worker (and once in the forkserver, so new workers start warm)
+PRELOAD_MODULES = ["numpy", "pandas", "matplotlib", "matplotlib.pyplot"]
+
+
+class CpuTimeExceeded(Exception):
+    pass
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuTimeExceeded(f"CPU time limit of {Config.PYTHON_WORKER_CPU_SECONDS}s exceeded")
+
+
+def _preload(namespace: Dict) -> None:
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    for module in PRELOAD_MODULES:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    for alias, module in (("np", "numpy"), ("pd", "pandas"), ("plt", "matplotlib.pyplot")):
+        try:
+            namespace[alias] = __import__(module, fromlist=["_"])
+        except ImportError:
+            pass
+
+
+def _execute(code: str, namespace: Dict) -> Dict:
+    """run code REPL-style: stdout/stderr are captured, and a trailing expression's value is the result"""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    result = None
+    error = None
+    try:
+        tree = ast.parse(code, mode="exec")
+        last_expr = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            exec(compile(tree, "<llm>", "exec"), namespace)
+            if last_expr is not None:
+                value = eval(compile(ast.Expression(last_expr.value), "<llm>", "eval"), namespace)
+                if value is not None:
+                    result = repr(value)
+    except CpuTimeExceeded as e:
+        error = str(e)
+    except BaseException:
+        error = traceback.format_exc()
+    return {"output": stdout.getvalue(), "errors": stderr.getvalue(), "result": result, "error": error}
+
+
+def _worker_main(conn, cpu_seconds: Optional[float], memory_mb: Optional[int]) -> None:
+    namespace = {"__name__": "__main__"}
+    _preload(namespace)
+    if resource is not None:
+        if memory_mb:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 1024 * 1024, resource.RLIM_INFINITY))
+        if cpu_seconds:
+            signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    while True:
+        try:
+            command, payload = conn.recv()
+        except EOFError:
+            return
+        if command == "reset":
+            namespace = {"__name__": "__main__"}
+            _preload(namespace)
+            conn.send(None)
+            continue
+
+        if resource is not None and cpu_seconds:
+            used = resource.getrusage(resource.RUSAGE_SELF)
+            soft = int(used.ru_utime + used.ru_stime + cpu_seconds) + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+        conn.send(_execute(payload, namespace))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.context = context
+        self.busy = False  # running a call (guarded by the pool's condition)
+        self.session_id = None  # session the worker is assigned to
+        self.owner = None  # session whose variables are in the worker's namespace
+        self.last_used = time.monotonic()
+        self._start()
+
+    def _start(self) -> None:
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(child_conn, Config.PYTHON_WORKER_CPU_SECONDS, Config.PYTHON_WORKER_MEMORY_MB),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+
+    def recycle(self) -> None:
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self._start()
+        self.owner = self.session_id
+
+    def reset(self, session_id: str) -> None:
+        """hand the worker to another session with a clean namespace"""
+        try:
+            self.conn.send(("reset", None))
+            self.conn.recv()
+        except (EOFError, OSError):
+            self.recycle()
+        self.owner = session_id
+
+    def run(self, code: str, timeout: float) -> Dict:
+        self.last_used = time.monotonic()
+        try:
+            self.conn.send(("run", code))
+            if not self.conn.poll(timeout):
+                self.recycle()
+                return {"output": "", "errors": "", "result": None,
+                        "error": f"Execution timed out after {timeout}s, session state was reset"}
+            response = self.conn.recv()
+        except (EOFError, OSError):
+            # killed by the memory limit or crashed
+            self.recycle()
+            return {"output": "", "errors": "", "result": None,
+                    "error": "Worker process died (memory limit exceeded?), session state was reset"}
+
+        self.runs += 1
+        if self.runs >= Config.PYTHON_WORKER_MAX_RUNS or (response["error"] or "").startswith("CPU time limit"):
+            self.recycle()
+            response["notice"] = ("the python worker was restarted after this call, variables defined so far "
+                                  "are gone in the next one")
+        return response
+
+    def close(self) -> None:
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+class PythonWorkerPool:
+    """
+    pre-warmed python processes for execute_python.
+    each session is pinned to one worker, so variables and loaded DataFrames carry over between turns
+    (until the worker is recycled after PYTHON_WORKER_MAX_RUNS runs, a timeout or a limit violation).
+    a call waits (up to its timeout) for its session's worker rather than taking another session's busy one;
+    a session without a worker takes the least recently used idle one, whose session loses its variables.
+    the tool result says so whenever a session's variables were lost.
+    stdout/stderr are captured inside the worker, so overlapping calls can't mix their output
+    """
+
+    def __init__(self, size: int = Config.PYTHON_POOL_SIZE):
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(method)
+        if method == "forkserver":
+            context.set_forkserver_preload(PRELOAD_MODULES)
+        self._free = threading.Condition()
+        self._lost = set()  # sessions whose worker was handed to another session since their last call
+        self.workers: List[_Worker] = [_Worker(context) for _ in range(size)]
+
+    def _claim(self, session_id: str, deadline: float) -> Optional[_Worker]:
+        """the session's worker, marked busy, or None if it didn't come free before the deadline"""
+        with self._free:
+            while True:
+                worker = next((w for w in self.workers if w.session_id == session_id), None)
+                if worker is None:
+                    # prefer a worker no session uses, otherwise take over the least recently used idle one
+                    idle = [w for w in self.workers if not w.busy]
+                    if idle:
+                        worker = min(idle, key=lambda w: (w.session_id is not None, w.last_used))
+                        if worker.session_id is not None:
+                            self._lost.add(worker.session_id)
+                        worker.session_id = session_id
+                if worker is not None and not worker.busy:
+                    worker.busy = True
+                    worker.last_used = time.monotonic()
+                    return worker
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._free.wait(remaining)
+
+    def _release(self, worker: _Worker) -> None:
+        with self._free:
+            worker.busy = False
+            self._free.notify_all()
+
+    def run(self, code: str, session_id: str = "default", timeout: float = Config.PYTHON_WORKER_TIMEOUT) -> Dict:
+        """blocking; call from a thread. waits up to timeout for the session's worker, then up to timeout for the run"""
+        worker = self._claim(session_id, time.monotonic() + timeout)
+        if worker is None:
+            return {"output": "", "errors": "", "result": None,
+                    "error": f"All python workers stayed busy for {timeout}s, try again later"}
+        try:
+            with self._free:
+                lost = session_id in self._lost
+                self._lost.discard(session_id)
+            if worker.owner != session_id:
+                worker.reset(session_id)
+            response = worker.run(code, timeout)
+            if lost:
+                notice = "variables from this session's earlier python calls are gone, its worker was taken over"
+                response["notice"] = "; ".join(filter(None, [notice, response.get("notice")]))
+            return response
+        finally:
+            self._release(worker)
+
+    def close(self) -> None:
+        for worker in self.workers:
+            worker.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_python_worker_pool() -> PythonWorkerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PythonWorkerPool()
+    return _pool
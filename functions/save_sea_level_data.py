@@ -1,135 +1,178 @@
-import requests
-import pandas as pd
-from datetime import datetime, timedelta
+import asyncio
+import re
+import httpx
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from llm.config import Config
+from llm.utils.logging_config import setup_logging
 
 try:
-    from functions.find_station_id import find_station_id
-    from functions.get_station_lookup import get_station_lookup
+    from functions.noaa_client import NoaaError, get_noaa_client
+    from functions.sea_level_store import get_sea_level_store, to_utc
+    from functions.station_index import get_station_index, normalize
 except ImportError:
-    import find_station_id
-    import get_station_lookup
+    from noaa_client import NoaaError, get_noaa_client
+    from sea_level_store import get_sea_level_store, to_utc
+    from station_index import get_station_index, normalize
+
+logger = setup_logging()
+
+# what a question has to mention to be guessed as a plain "sea level at <place>" call (see guess_arguments)
+_SEA_LEVEL_WORDS = frozenset("sea level levels tide tides tidal water gauge".split())
+# 'may' and 'from' are too common to mean a period on their own ('may I', 'data from boston'), 'may' is only
+# a month next to a day (_MAY_DATE); a year is caught by _YEAR
+_PERIOD_WORDS = frozenset(
+    "since between until till ago yesterday week weeks month months year years jan feb mar apr jun jul "
+    "aug sep sept oct nov dec january february march april june july august september october november "
+    "december".split()
+)
+_FILLER_WORDS = frozenset(
+    "a an and at current currently data download fetch for get give how in is it me near now of please right "
+    "save show the today what what's whats near station".split()
+)
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+_MAY_DATE = re.compile(r"\bmay\s+\d{1,2}(?:st|nd|rd|th)?\b|\b\d{1,2}(?:st|nd|rd|th)?\s+(?:of\s+)?may\b", re.IGNORECASE)
+
+
+async def guess_arguments(user_input: str) -> Optional[Dict]:
+    """
+    speculative prefetch hook (see llm/prefetch.py): the call the model will most likely make for this input,
+    or None. only questions about the current sea level at a place qualify, a question about a period
+    gets explicit dates from the model that can't be guessed reliably
+    """
+    tokens = normalize(user_input)
+    if not _SEA_LEVEL_WORDS.intersection(tokens) or _PERIOD_WORDS.intersection(tokens) or _YEAR.search(user_input) \
+            or _MAY_DATE.search(user_input):
+        return None
+    station_index = await get_station_index()
+    station = station_index.mentioned(user_input, ignore=_SEA_LEVEL_WORDS | _FILLER_WORDS)
+    return {"location": station["station_id"]} if station else None
+
+
+async def call_key(arguments: Dict) -> Tuple:
+    """calls with the same key fetch and store the same data"""
+    station_index = await get_station_index()
+    location = str(arguments.get("location"))
+    station = station_index.find(location)
+    return station["station_id"] if station else location, arguments.get("begin_date"), arguments.get("end_date")
 
 
-def save_sea_level_data(location) -> str:
+def _fetched_coverage(gaps, results, now) -> List[Tuple]:
     """
-    Fetch sea level data for a given location and save it as a CSV file
-    in the '../data' directory. If a file for the same station exists and
-    is less than 30 days old, skip the download.
+    the parts of the fetched gaps that now count as stored. a gap that returned nothing isn't covered (it is
+    asked for again next time), and one ending near now only up to its last reading: NOAA publishes with a
+    lag, and what it hasn't published yet must not be marked as fetched
+    """
+    covered = []
+    recent = now - timedelta(hours=Config.SEA_LEVEL_PUBLISH_LAG_HOURS)
+    for (gap_start, gap_end), rows in zip(gaps, results):
+        times = [row['t'] for row in rows if row.get('t')]
+        if not times:
+            continue
+        if gap_end >= recent:
+            gap_end = min(gap_end, to_utc(max(times)))
+        if gap_end > gap_start:
+            covered.append((gap_start, gap_end))
+    return covered
+
+
+def _record_fetch(store, station_id: str, covered, station_row: Dict) -> None:
+    """mark the fetched ranges as covered and store the station's information once"""
+    for covered_start, covered_end in covered:
+        store.add_coverage(station_id, covered_start, covered_end)
+    store.update_station_info(station_id, name=station_row['name'], state=station_row.get('state'),
+                              latitude=station_row['latitude'], longitude=station_row['longitude'])
+
+
+async def save_sea_level_data(location, begin_date=None, end_date=None) -> str:
+    """
+    Fetch sea level data for a given location and merge it into the station's
+    columnar file in the '../data' directory (see sea_level_store). Only the
+    parts of the requested period that are not stored yet are downloaded.
 
     Args:
         location (str): Location name or station ID
+        begin_date (str): Start of the period (e.g. '2024-01-01'), defaults to 24 hours before end_date
+        end_date (str): End of the period, defaults to now
     """
     location = str(location)
-    print(location)
+    logger.info(f"Saving sea level data for {location}")
     # Create data directory if it doesn't exist
     data_dir = Path(__file__).parent.parent / 'data'
     data_dir.mkdir(exist_ok=True)
 
-    # Get station information
-    station_info = get_station_lookup()
-    if station_info.empty:
-        return "Failed to fetch station information"
-
-    # If input is not a station ID, try to find matching station
-    if not location.isdigit() or len(location) != 7:
-        station_id = find_station_id(location, station_info)
-        if not station_id:
-            print(f"Could not find station ID for location: {location}")
-            print("Available stations near search term:")
-            # Print nearby or similar named stations
-            similar_stations = station_info[
-                station_info['name'].str.lower().str.contains(location.lower(), na=False)
-            ]
-            if not similar_stations.empty:
-                return similar_stations[['name', 'state', 'station_id']].head()
-    else:
-        station_id = location
-
-    # Check for existing files for this station
-    existing_files = list(data_dir.glob(f"sea_level_{station_id}_*.csv"))
-
-    if existing_files:
-        # Get the most recent file
-        most_recent_file = max(existing_files, key=lambda x: x.stat().st_mtime)
-        file_age = datetime.now() - datetime.fromtimestamp(most_recent_file.stat().st_mtime)
-
-        # If file is less than 30 days old, skip download
-        if file_age.days < 30:
-            print(f"Using existing file: {most_recent_file}")
-            print(f"File age: {file_age.days} days")
-            return f"Using existing file f{most_recent_file}"
+    # Get station information (cached and indexed, see station_index)
+    try:
+        station_index = await get_station_index()
+    except Exception as e:
+        return f"Failed to fetch station information: {str(e)}"
+
+    # Resolve a station ID or (fuzzy) location name to a station
+    station_row = station_index.find(location)
+    if station_row is None:
+        if location.isdigit() and len(location) == 7:
+            station_row = {'station_id': location, 'name': location, 'latitude': None, 'longitude': None}
         else:
-            print(f"Existing file is {file_age.days} days old. Downloading new data...")
-
-    # Set up dates for last 24 hours
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=1)
-
-    # Format dates for API
-    start_date = start_date.strftime('%Y%m%d %H:%M')
-    end_date = end_date.strftime('%Y%m%d %H:%M')
-
-    # Build API URL with parameters
-    base_url = "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter"
-    params = {
-        'station': station_id,
-        'product': 'water_level',
-        'begin_date': start_date,
-        'end_date': end_date,
-        'datum': 'MSL',  # Using Mean Sea Level datum
-        'units': 'metric',
-        'time_zone': 'gmt',
-        'format': 'json',
-        'application': 'PythonSeaLevelFetcher'
-    }
+            logger.warning(f"Could not find station ID for location: {location}")
+            return f"Could not find station ID for location: {location}"
+    station_id = station_row['station_id']
 
     try:
-        # Get data from API
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        # Check for API errors
-        if 'error' in data:
-            raise ValueError(f"API Error: {data['error']['message']}")
-
-        # Convert to DataFrame
-        df = pd.DataFrame(data['data'])
-
-        # Add station information
-        station_row = station_info[station_info['station_id'] == station_id].iloc[0]
-        df['station_name'] = station_row['name']
-        df['station_id'] = station_id
-        df['latitude'] = station_row['latitude']
-        df['longitude'] = station_row['longitude']
-
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M')
-        filename = f"sea_level_{station_id}_{timestamp}.csv"
-        filepath = data_dir / filename
-
-        # Save to CSV
-        df.to_csv(filepath, index=False)
-        print(f"Data saved to: {filepath}")
-        print(f"Station: {station_row['name']} ({station_id})")
+        # Requested period in UTC (NOAA is queried in GMT), last 24 hours by default
+        now = to_utc(datetime.now(timezone.utc))
+        end = min(to_utc(end_date), now) if end_date else now
+        start = to_utc(begin_date) if begin_date else end - timedelta(days=1)
+        if start >= end:
+            raise ValueError("begin_date must be before end_date")
+
+        # Only fetch the parts of the period that aren't stored yet
+        store = get_sea_level_store(data_dir)
+        gaps = store.missing(station_id, start, end, min_gap=timedelta(minutes=Config.SEA_LEVEL_MIN_GAP_MINUTES))
+        if not gaps:
+            logger.info(f"Using existing data: {store.path(station_id)}")
+            return (f"Using existing data: {store.path(station_id)}\n Station {station_row['name']} ({station_id}), "
+                    f"{start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M} UTC")
+
+        # Get data from API (Mean Sea Level datum, pooled connection shared with other tool calls)
+        client = get_noaa_client()
+        results = await asyncio.gather(*(
+            client.fetch(station_id, gap_start, gap_end, product='water_level', datum='MSL') for gap_start, gap_end in gaps
+        ))
+        rows = [row for result in results for row in result]
+        if not rows and not store.path(station_id).exists():
+            raise ValueError(f"No data returned for station {station_id}")
+
+        # Merge into the station's file (typed columns, de-duplicated by timestamp);
+        # station information is stored once per station instead of on every row
+        added = await asyncio.to_thread(store.merge, station_id, rows)
+        # the store's writes take its lock, which (with shared state) can wait on another process: off the loop
+        await asyncio.to_thread(_record_fetch, store, station_id, _fetched_coverage(gaps, results, now), station_row)
+        filepath = store.path(station_id)
+        if Config.SEA_LEVEL_EXPORT_CSV:
+            filepath = await asyncio.to_thread(store.export_csv, station_id)
+        logger.info(f"Data saved to: {filepath} ({added} new rows), station {station_row['name']} ({station_id})")
 
         return f"Data saved to: {filepath}\n Station {station_row['name']} ({station_id})]"
 
-    except requests.RequestException as e:
-        print(f"Failed to fetch data: {str(e)}")
+    except httpx.HTTPError as e:
+        logger.warning(f"Failed to fetch data: {str(e)}")
         return f"Failed to fetch data: {str(e)}"
+    except NoaaError as e:
+        logger.warning(f"API Error: {str(e)}")
+        return f"Error: API Error: {str(e)}"
     except ValueError as e:
-        print(f"Error: {str(e)}")
+        logger.warning(f"Error: {str(e)}")
         return f"Error: {str(e)}"
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        logger.exception(f"Unexpected error: {str(e)}")
         return f"Unexpected error: {str(e)}"
 
 
 if __name__ == "__main__":
     # Example usage:
     # By station ID
-    save_sea_level_data('9414290')
+    asyncio.run(save_sea_level_data('9414290'))
     # By location name
-    save_sea_level_data('Los Angeles')
\ No newline at end of file
+    asyncio.run(save_sea_level_data('Los Angeles'))
\ No newline at end of file
@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from llm.config import Config
+from llm.shared_state import get_shared_state
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+# NOAA water_level fields -> stored columns
+_COLUMNS = {"t": "time", "v": "level", "s": "sigma", "f": "flags", "q": "quality"}
+
+
+def to_utc(value) -> pd.Timestamp:
+    """naive datetimes are taken to be utc (NOAA is queried with time_zone=gmt)"""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def merge_intervals(intervals: Iterable[Tuple[pd.Timestamp, pd.Timestamp]]) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(start: pd.Timestamp, end: pd.Timestamp,
+                       covered: Iterable[Tuple[pd.Timestamp, pd.Timestamp]]) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """parts of [start, end] not inside any covered interval"""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in merge_intervals(covered):
+        if covered_end <= cursor or covered_start >= end:
+            continue
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def rows_to_frame(rows: Iterable[Dict]) -> pd.DataFrame:
+    """NOAA json rows -> typed frame: utc datetime index, float32 level/sigma, categorical flags/quality"""
+    df = pd.DataFrame(list(rows)).rename(columns=_COLUMNS)
+    if df.empty:
+        return pd.DataFrame(
+            {"level": pd.Series(dtype="float32"), "sigma": pd.Series(dtype="float32")},
+            index=pd.DatetimeIndex([], tz="UTC", name="time")
+        )
+
+    df["time"] = pd.to_datetime(df["time"], utc=True)
+    for column in ("level", "sigma"):
+        if column in df:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype("float32")
+    for column in ("flags", "quality"):
+        if column in df:
+            df[column] = df[column].astype("category")
+    return df.set_index("time").sort_index()
+
+
+class SeaLevelStore:
+    """
+    per-station columnar storage for sea level observations.
+    each station lives in one feather (arrow ipc, memory-mappable) or parquet file; station name and
+    coordinates are kept once in a sidecar json instead of on every row
+    """
+
+    def __init__(self, data_dir: Union[str, Path] = Config.DATA_DIR, fmt: str = Config.SEA_LEVEL_STORE_FORMAT):
+        if fmt not in ("feather", "parquet"):
+            raise ValueError(f"Unsupported store format: {fmt}")
+        self.data_dir = Path(data_dir)
+        self.fmt = fmt
+        self.meta_path = self.data_dir / "sea_level_stations.json"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """the write lock, held across worker processes too when they share state (read-modify-write of files)"""
+        shared = get_shared_state()
+        with self._lock:
+            if shared is None:
+                yield
+            else:
+                with shared.lock(f"sea_level_store:{self.data_dir.absolute()}"):
+                    yield
+
+    def path(self, station_id: str) -> Path:
+        return self.data_dir / f"sea_level_{station_id}.{self.fmt}"
+
+    def _read_meta(self) -> Dict[str, Dict]:
+        """
+        the sidecar. a corrupt one is logged, kept aside as .corrupt and rebuilt from the station files, so the
+        next write doesn't replace every station's metadata with only its own
+        """
+        try:
+            with open(self.meta_path, "r") as f:
+                return json.load(f)
+        except OSError:
+            return {}
+        except json.JSONDecodeError as e:
+            logger.error(f"Corrupt station metadata {self.meta_path} ({e}), rebuilding it from the station files")
+            shutil.copyfile(self.meta_path, self.meta_path.with_name(self.meta_path.name + ".corrupt"))
+            return self._rebuild_meta()
+
+    def _rebuild_meta(self) -> Dict[str, Dict]:
+        """
+        coverage from the readings in each station file: every run of readings without a gap of
+        SEA_LEVEL_MIN_GAP_MINUTES or more counts as fetched (stretches NOAA had no data for are fetched again).
+        names and coordinates come back with the station's next fetch
+        """
+        min_gap = pd.Timedelta(minutes=Config.SEA_LEVEL_MIN_GAP_MINUTES)
+        meta = {}
+        for station_id in self.stations():
+            times = self._read(self.path(station_id), columns=["level"], memory_map=False).index
+            if times.empty:
+                continue
+            breaks = (times[1:] - times[:-1]) >= min_gap
+            starts = [times[0], *times[1:][breaks]]
+            ends = [*times[:-1][breaks], times[-1]]
+            meta[station_id] = {"coverage": [[s.isoformat(), e.isoformat()] for s, e in zip(starts, ends) if e > s]}
+        return meta
+
+    def _write_meta(self, meta: Dict[str, Dict]) -> None:
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    def station_info(self, station_id: str) -> Dict:
+        return self._read_meta().get(str(station_id), {})
+
+    def update_station_info(self, station_id: str, **info) -> None:
+        with self._locked():
+            meta = self._read_meta()
+            meta.setdefault(str(station_id), {}).update(info)
+            self._write_meta(meta)
+
+    def coverage(self, station_id: str) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """time ranges already fetched for a station (including ranges where NOAA had no observations)"""
+        return [(to_utc(start), to_utc(end)) for start, end in self.station_info(station_id).get("coverage", [])]
+
+    def add_coverage(self, station_id: str, start, end) -> None:
+        with self._locked():
+            meta = self._read_meta()
+            info = meta.setdefault(str(station_id), {})
+            intervals = [(to_utc(s), to_utc(e)) for s, e in info.get("coverage", [])] + [(to_utc(start), to_utc(end))]
+            info["coverage"] = [[s.isoformat(), e.isoformat()] for s, e in merge_intervals(intervals)]
+            self._write_meta(meta)
+
+    def missing(self, station_id: str, start, end, min_gap: pd.Timedelta = pd.Timedelta(0)) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """
+        sub-ranges of [start, end] that still have to be fetched.
+        gaps shorter than min_gap are ignored, so asking for "up to now" right after a fetch is a no-op
+        """
+        start, end = to_utc(start), to_utc(end)
+        covered = self.coverage(station_id) if self.path(station_id).exists() else []
+        return [(s, e) for s, e in subtract_intervals(start, end, covered) if e - s >= min_gap]
+
+    def stations(self) -> List[str]:
+        suffix = f".{self.fmt}"
+        return sorted(p.name[len("sea_level_"):-len(suffix)] for p in self.data_dir.glob(f"sea_level_*{suffix}"))
+
+    def _read(self, path: Path, columns: Optional[List[str]] = None, memory_map: bool = True) -> pd.DataFrame:
+        columns = ["time", *columns] if columns else None
+        if self.fmt == "feather":
+            import pyarrow.feather as feather
+            df = feather.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+        else:
+            df = pd.read_parquet(path, columns=columns, memory_map=memory_map)
+        return df.set_index("time")
+
+    def _write(self, df: pd.DataFrame, path: Path) -> None:
+        tmp_path = path.with_name(path.name + ".tmp")
+        frame = df.reset_index()
+        if self.fmt == "feather":
+            frame.to_feather(tmp_path)
+        else:
+            frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def merge(self, station_id: str, data: Union[pd.DataFrame, Iterable[Dict]]) -> int:
+        """
+        merge new observations into the station file, de-duplicated by timestamp; returns rows added.
+        the file is read and rewritten whole (a single sorted file is what load memory-maps), so a merge costs
+        the size of the station's history, not of the new rows: fetch in as few calls as possible
+        """
+        new = data if isinstance(data, pd.DataFrame) else rows_to_frame(data)
+        if new.empty:
+            return 0
+
+        path = self.path(station_id)
+        with self._locked():
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+            if path.exists():
+                existing = self._read(path, memory_map=False)
+                before = len(existing)
+                merged = pd.concat([existing, new])
+                # concat of categoricals with different categories falls back to object
+                for column in ("flags", "quality"):
+                    if column in merged:
+                        merged[column] = merged[column].astype("category")
+            else:
+                before = 0
+                merged = new
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+            self._write(merged, path)
+        return len(merged) - before
+
+    def load(self, station_id: str, start=None, end=None, columns: Optional[List[str]] = None,
+             memory_map: bool = True) -> pd.DataFrame:
+        """load a station's observations, optionally restricted to [start, end] and a subset of columns"""
+        path = self.path(station_id)
+        if not path.exists():
+            raise FileNotFoundError(f"No stored sea level data for station {station_id}")
+        df = self._read(path, columns, memory_map)
+        if start is not None or end is not None:
+            df = df.loc[to_utc(start) if start is not None else None:to_utc(end) if end is not None else None]
+        return df
+
+    def export_csv(self, station_id: str, path: Optional[Union[str, Path]] = None) -> Path:
+        """flat csv in the original layout (station name and coordinates on every row)"""
+        df = self.load(station_id).reset_index()
+        info = self.station_info(station_id)
+        df["station_name"] = info.get("name")
+        df["station_id"] = station_id
+        df["latitude"] = info.get("latitude")
+        df["longitude"] = info.get("longitude")
+        path = Path(path) if path else self.data_dir / f"sea_level_{station_id}.csv"
+        df.to_csv(path, index=False)
+        return path
+
+
+_stores = {}
+
+
+def get_sea_level_store(data_dir: Union[str, Path] = Config.DATA_DIR) -> SeaLevelStore:
+    """one store (and write lock) per data directory"""
+    key = str(Path(data_dir).absolute())
+    if key not in _stores:
+        _stores[key] = SeaLevelStore(data_dir)
+    return _stores[key]
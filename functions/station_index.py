@@ -0,0 +1,271 @@
+import difflib
+import json
+import math
+import os
+import re
+import time
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from llm.config import Config
+from llm.utils.logging_config import setup_logging
+
+try:
+    from functions.noaa_client import get_noaa_client
+except ImportError:
+    from noaa_client import get_noaa_client
+
+logger = setup_logging()
+
+_TOKEN_SPLIT = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> List[str]:
+    """lowercase alphanumeric tokens, so 'San Francisco, CA' and 'san francisco ca' match"""
+    return [token for token in _TOKEN_SPLIT.split(str(text).lower()) if token]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+class StationIndex:
+    """
+    in-memory indexes over NOAA station metadata:
+    exact station id lookup, a token index over normalized name + state for fuzzy name matching,
+    and a 1-degree lat/lon grid for nearest-station queries
+    """
+
+    def __init__(self, stations: List[Dict], loaded_at: Optional[float] = None):
+        self.stations = stations
+        self.loaded_at = loaded_at or time.time()
+        self.by_id = {s["station_id"]: s for s in stations}
+        self.by_name = {}
+        self.tokens = defaultdict(set)
+        self.grid = defaultdict(list)
+
+        for station in stations:
+            name_tokens = normalize(station["name"])
+            self.by_name.setdefault(" ".join(name_tokens), station)
+            self.by_name.setdefault(" ".join(name_tokens + normalize(station.get("state") or "")), station)
+            for token in name_tokens + normalize(station.get("state") or ""):
+                self.tokens[token].add(station["station_id"])
+            if station.get("latitude") is not None and station.get("longitude") is not None:
+                self.grid[self._cell(station["latitude"], station["longitude"])].append(station)
+
+        self._vocabulary = list(self.tokens)
+        self._close_tokens = lru_cache(maxsize=4096)(self._close_tokens)
+
+    @staticmethod
+    def _cell(latitude: float, longitude: float):
+        return math.floor(latitude), math.floor(longitude)
+
+    def _close_tokens(self, token: str) -> List[str]:
+        """vocabulary tokens within a typo of the given one (cached, the vocabulary only has a few thousand words)"""
+        if token in self.tokens:
+            return [token]
+        prefixed = [t for t in self._vocabulary if len(token) >= 3 and t.startswith(token)]
+        return prefixed or difflib.get_close_matches(token, self._vocabulary, n=3, cutoff=0.8)
+
+    def get(self, station_id: str) -> Optional[Dict]:
+        return self.by_id.get(str(station_id))
+
+    def _scores(self, tokens: List[str]) -> Dict[str, float]:
+        """
+        per station, the share of the query's idf-weighted tokens its name/state match (a query token that
+        matches nothing counts as a rare word, so unknown words lower the share)
+        """
+        scores, total = defaultdict(float), 0.0
+        for token in tokens:
+            weights = defaultdict(float)
+            for match in self._close_tokens(token):
+                ids = self.tokens[match]
+                weight = 1.0 / math.log(2 + len(ids))
+                for station_id in ids:
+                    weights[station_id] = max(weights[station_id], weight)
+            total += max(weights.values(), default=1.0 / math.log(3))
+            for station_id, weight in weights.items():
+                scores[station_id] += weight
+        return {station_id: score / total for station_id, score in scores.items()}
+
+    def _ranked(self, tokens: List[str]) -> List[str]:
+        scores = self._scores(tokens)
+        return sorted(scores, key=lambda sid: (-scores[sid], len(self.by_id[sid]["name"]), sid))
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """rank stations by how many (idf-weighted) query tokens their name/state match"""
+        return [self.by_id[sid] for sid in self._ranked(normalize(query))[:limit]]
+
+    def _best_match(self, tokens: List[str], min_score: float) -> Optional[Dict]:
+        """
+        the best fuzzy match if it covers at least min_score of the query and matches the station's name:
+        a state alone ('california') or one common word doesn't single out a station
+        """
+        scores = self._scores(tokens)
+        for station_id in self._ranked(tokens)[:1]:
+            station = self.by_id[station_id]
+            name = set(normalize(station["name"]))
+            if scores[station_id] >= min_score and any(name.intersection(self._close_tokens(t)) for t in tokens):
+                return station
+        return None
+
+    def find(self, location: str) -> Optional[Dict]:
+        """resolve a station id or a (possibly misspelled) place name to a single station, None if nothing fits"""
+        location = str(location).strip()
+        if location in self.by_id:
+            return self.by_id[location]
+        exact = self.by_name.get(" ".join(normalize(location)))
+        if exact:
+            return exact
+        return self._best_match(normalize(location), Config.STATION_MIN_MATCH_SCORE)
+
+    def mentioned(self, text: str, ignore: frozenset = frozenset(), max_words: int = 4) -> Optional[Dict]:
+        """
+        the station a free-text question is about: a station id in it, else the longest run of words that is a
+        station name, else the best fuzzy match of the words left after dropping the ignored ones (if it
+        matches a station's name, not just its state)
+        """
+        tokens = normalize(text)
+        for token in tokens:
+            if token in self.by_id:
+                return self.by_id[token]
+        for n in range(min(max_words, len(tokens)), 0, -1):
+            for i in range(len(tokens) - n + 1):
+                words = tokens[i:i + n]
+                if ignore.issuperset(words):
+                    continue
+                station = self.by_name.get(" ".join(words))
+                if station:
+                    return station
+        words = [token for token in tokens if token not in ignore and not token.isdigit()]
+        return self._best_match(words, 0.0) if words else None
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1) -> List[Dict]:
+        """
+        k nearest stations, searching grid rings outwards from the query cell until no cell further out can
+        hold a station closer than the k-th found. once the rings have passed as many cells as the grid holds
+        stations in (a sparse neighbourhood, or near a pole where the bound barely grows) all stations are
+        sorted instead
+        """
+        lat_cell, lon_cell = self._cell(latitude, longitude)
+        distances, seen = {}, set()
+        for radius in range(181):
+            for cell in self._ring(lat_cell, lon_cell, radius):
+                if cell not in seen:
+                    seen.add(cell)
+                    for station in self.grid.get(cell, ()):
+                        distances[station["station_id"]] = haversine_km(
+                            latitude, longitude, station["latitude"], station["longitude"])
+            if len(distances) >= k and sorted(distances.values())[k - 1] <= self._ring_bound_km(latitude, radius):
+                break
+            if len(seen) >= len(self.grid):
+                distances = {
+                    station["station_id"]: haversine_km(latitude, longitude, station["latitude"], station["longitude"])
+                    for cell in self.grid.values() for station in cell
+                }
+                break
+
+        return [self.by_id[sid] for sid in sorted(distances, key=distances.get)[:k]]
+
+    @staticmethod
+    def _ring(lat_cell: int, lon_cell: int, radius: int):
+        """cells on the square ring of the given radius around a cell (longitude wraps at 180, latitude doesn't)"""
+        for dlat in range(-radius, radius + 1):
+            if not -90 <= lat_cell + dlat < 90:
+                continue
+            step = 1 if abs(dlat) == radius else 2 * radius
+            for dlon in range(-radius, radius + 1, step):
+                yield lat_cell + dlat, (lon_cell + dlon + 180) % 360 - 180
+
+    @staticmethod
+    def _ring_bound_km(latitude: float, radius: int) -> float:
+        """
+        lower bound on the distance from the point to any cell outside the rings up to radius: at least radius
+        degrees of latitude away, or radius degrees of longitude, whose nearest point is on that meridian
+        (shorter than radius * 111 km away from the equator)
+        """
+        degrees = math.radians(min(radius, 90))
+        return 6371.0 * min(math.radians(radius), math.asin(math.cos(math.radians(latitude)) * math.sin(degrees)))
+
+    def as_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.stations, columns=["station_id", "name", "state", "latitude", "longitude"])
+
+
+def _parse_stations(payload: Dict) -> List[Dict]:
+    return [
+        {
+            "station_id": str(s["id"]),
+            "name": s.get("name") or "",
+            "state": s.get("state") or "",
+            "latitude": float(s["lat"]) if s.get("lat") is not None else None,
+            "longitude": float(s["lng"]) if s.get("lng") is not None else None,
+        }
+        for s in payload.get("stations", [])
+    ]
+
+
+def _read_cache(cache_path: Path) -> Optional[Dict]:
+    try:
+        with open(cache_path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_cache(cache_path: Path, stations: List[Dict], fetched_at: float) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # per process, worker processes refreshing at the same time each replace the cache whole
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"fetched_at": fetched_at, "stations": stations}, f)
+    os.replace(tmp_path, cache_path)
+
+
+_station_index = None
+_refresh_retry_at = 0.0
+
+
+async def get_station_index(refresh: bool = False, cache_path: str = Config.STATION_CACHE_PATH,
+                            ttl: float = Config.STATION_CACHE_TTL) -> StationIndex:
+    """
+    station index backed by an in-memory copy and an on-disk cache, each valid for ttl seconds.
+    NOAA is only contacted when both are stale (or refresh=True); a stale disk copy is still used if that fails,
+    keeping its own age, and the refresh is tried again after STATION_REFRESH_RETRY seconds
+    """
+    global _station_index, _refresh_retry_at
+    now = time.time()
+    if not refresh and _station_index is not None and (now - _station_index.loaded_at < ttl or now < _refresh_retry_at):
+        return _station_index
+
+    cache_path = Path(cache_path)
+    cached = _read_cache(cache_path)
+    if not refresh and cached and now - cached.get("fetched_at", 0) < ttl:
+        _station_index = StationIndex(cached["stations"], cached["fetched_at"])
+        return _station_index
+
+    try:
+        response = await get_noaa_client().client.get(Config.STATION_METADATA_URL, params={"type": "waterlevels"})
+        response.raise_for_status()
+        stations = _parse_stations(response.json())
+        _write_cache(cache_path, stations, now)
+        _station_index = StationIndex(stations, now)
+        logger.info(f"Refreshed station metadata ({len(stations)} stations)")
+    except Exception as e:
+        if not cached:
+            raise
+        _refresh_retry_at = now + Config.STATION_REFRESH_RETRY
+        logger.warning(f"Failed to refresh station metadata, using the cached copy (retrying in "
+                       f"{Config.STATION_REFRESH_RETRY}s): {e}")
+        if _station_index is None or _station_index.loaded_at != cached.get("fetched_at"):
+            _station_index = StationIndex(cached["stations"], cached.get("fetched_at"))
+    return _station_index
+
+
+async def refresh_station_index() -> StationIndex:
+    return await get_station_index(refresh=True)
@@ -0,0 +1,17 @@
+"""model backends behind ChatManager, chosen with Config.LLM_BACKEND"""
+from llm.backends.base import Backend
+from llm.config import Config
+
+
+def get_backend(name: str = Config.LLM_BACKEND) -> Backend:
+    # imported on demand so the optional dependencies of the other backends are never needed
+    if name == "ollama":
+        from llm.backends.ollama_backend import OllamaBackend
+        return OllamaBackend()
+    if name == "llama_cpp":
+        from llm.backends.llama_cpp_backend import LlamaCppBackend
+        return LlamaCppBackend()
+    if name == "fake":
+        from llm.backends.fake_backend import FakeBackend
+        return FakeBackend()
+    raise ValueError(f"Unknown LLM_BACKEND: {name}")
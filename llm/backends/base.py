@@ -0,0 +1,28 @@
+import abc
+from typing import Any, AsyncIterator, Dict, List, Union
+
+
+class Backend(abc.ABC):
+    """
+    what ChatManager needs from a model server: ollama's chat call shape.
+    chat takes the keyword arguments of ollama.AsyncClient.chat and returns a response that can be
+    indexed like ollama's (response['message']['content'], ['message']['tool_calls'], .get('prompt_eval_count')),
+    or, with stream=True, an async iterator of such chunks whose last one has done=True
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def chat(self, **request) -> Union[Dict[str, Any], AsyncIterator[Dict[str, Any]]]:
+        """one chat call; every backend implements it"""
+
+    async def preload(self, model: str) -> None:
+        """load the model ahead of the first request (no-op where there is nothing to load)"""
+
+    async def aclose(self) -> None:
+        pass
+
+
+def clean_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """drop unset optional fields (Message.name) that strict chat apis reject"""
+    return [{key: value for key, value in message.items() if value is not None} for message in messages]
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm.backends.base import Backend
+
+
+class FakeBackend(Backend):
+    """
+    deterministic in-process backend for tests and benchmarks, no model involved.
+    the first pass (ChatManager always passes a tools argument there, possibly None) calls the tool of the first
+    rule whose pattern matches the user input, general_chat otherwise; the second pass answers with the tool
+    results it was given. latency is added per call
+    """
+
+    name = "fake"
+
+    def __init__(self, rules: Optional[List[Tuple[str, str, Dict[str, Any]]]] = None, latency: float = 0.0):
+        self.rules = [(re.compile(pattern, re.IGNORECASE), tool, args) for pattern, tool, args in rules or []]
+        self.latency = latency
+        self.calls = 0
+
+    def _respond(self, messages: List[Dict[str, Any]], first_pass: bool) -> Dict[str, Any]:
+        if first_pass:
+            tool, args = "general_chat", {}
+            user_input = next(m["content"] for m in reversed(messages) if m["role"] == "user")
+            for pattern, rule_tool, rule_args in self.rules:
+                if pattern.search(user_input):
+                    tool, args = rule_tool, rule_args
+                    break
+            message = {"role": "assistant", "content": "", "tool_calls": [
+                {"function": {"name": tool, "arguments": args}}
+            ]}
+        else:
+            results = [m["content"] for m in messages if m["role"] == "function"]
+            message = {"role": "assistant", "content": json.dumps({"message": "; ".join(results) or "ok"})}
+        prompt = sum(len(m["content"]) for m in messages) // 4
+        return {"message": message, "done": True, "prompt_eval_count": prompt,
+                "eval_count": len(message["content"]) // 4}
+
+    async def chat(self, **request):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = self._respond(request["messages"], first_pass="tools" in request)
+        if request.get("stream"):
+            return self._stream(response)
+        return response
+
+    @staticmethod
+    async def _stream(response: Dict[str, Any]):
+        content = response["message"]["content"]
+        for i in range(0, len(content), 8):
+            yield {"message": {"content": content[i:i + 8]}, "done": False}
+        yield {**response, "message": {"content": ""}}
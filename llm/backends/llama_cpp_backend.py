@@ -0,0 +1,119 @@
+import asyncio
+import threading
+from typing import Any, Dict
+
+try:
+    from llama_cpp import Llama
+except ImportError:  # llama-cpp-python is optional, only needed for LLM_BACKEND = "llama_cpp"
+    Llama = None
+
+from llm.backends.base import Backend, clean_messages
+from llm.config import Config
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+_DONE = object()
+
+
+class LlamaCppBackend(Backend):
+    """
+    the function_tuned GGUF in-process on CPU through llama-cpp-python, no http hop and no daemon.
+    the model is loaded once (preload, or on first use) and shared; llama.cpp contexts aren't thread-safe, so
+    calls run one at a time in a worker thread. responses are converted to ollama's shape
+    """
+
+    name = "llama_cpp"
+
+    def __init__(self, model_path: str = Config.LLAMA_CPP_MODEL_PATH, n_ctx: int = Config.CONTEXT_WINDOW,
+                 n_threads: int = Config.LLAMA_CPP_THREADS):
+        if Llama is None:
+            raise ImportError("LLM_BACKEND 'llama_cpp' needs llama-cpp-python (pip install llama-cpp-python)")
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self._llama = None
+        self._lock = threading.Lock()
+
+    def _model(self) -> "Llama":
+        if self._llama is None:
+            self._llama = Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_threads=self.n_threads,
+                                verbose=False)
+            logger.info(f"Loaded {self.model_path} into llama.cpp")
+        return self._llama
+
+    @staticmethod
+    def _completion_args(request: Dict[str, Any]) -> Dict[str, Any]:
+        args = {"messages": clean_messages(request["messages"])}
+        if request.get("format") == "json":
+            args["response_format"] = {"type": "json_object"}
+        elif isinstance(request.get("format"), dict):
+            args["response_format"] = {"type": "json_object", "schema": request["format"]}
+        if request.get("tools"):
+            args["tools"] = request["tools"]
+        options = request.get("options") or {}
+        if "num_predict" in options:
+            args["max_tokens"] = options["num_predict"]
+        if "temperature" in options:
+            args["temperature"] = options["temperature"]
+        return args
+
+    @staticmethod
+    def _to_ollama(completion: Dict[str, Any]) -> Dict[str, Any]:
+        choice = completion["choices"][0]["message"]
+        message = {"role": "assistant", "content": choice.get("content") or ""}
+        if choice.get("tool_calls"):
+            message["tool_calls"] = [{"function": call["function"]} for call in choice["tool_calls"]]
+        usage = completion.get("usage") or {}
+        return {"message": message, "done": True, "prompt_eval_count": usage.get("prompt_tokens"),
+                "eval_count": usage.get("completion_tokens")}
+
+    def _complete(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            return self._to_ollama(self._model().create_chat_completion(**args))
+
+    async def chat(self, **request):
+        args = self._completion_args(request)
+        if request.get("stream"):
+            return self._stream(args)
+        return await asyncio.to_thread(self._complete, args)
+
+    async def _stream(self, args: Dict[str, Any]):
+        """
+        tokens are generated in a worker thread and handed over through a queue. when the consumer stops early
+        (client went away, or an error) the thread stops at the next token, and the lock is free again once
+        the stream is closed
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                with self._lock:
+                    for chunk in self._model().create_chat_completion(stream=True, **args):
+                        if stop.is_set():
+                            break
+                        content = chunk["choices"][0]["delta"].get("content")
+                        if content:
+                            loop.call_soon_threadsafe(queue.put_nowait, content)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield {"message": {"content": item}, "done": False}
+        finally:
+            stop.set()
+            await producer
+        yield {"message": {"content": ""}, "done": True}
+
+    async def preload(self, model: str) -> None:
+        await asyncio.to_thread(self._model)
@@ -0,0 +1,52 @@
+import asyncio
+import weakref
+
+import httpx
+import ollama
+
+from llm.backends.base import Backend
+from llm.config import Config
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+
+class OllamaBackend(Backend):
+    """
+    ollama over http with an explicitly tuned client: a keep-alive connection pool sized for the parallel
+    slots, bounded timeouts, and keep_alive on every call so the model stays resident between requests
+    """
+
+    name = "ollama"
+
+    def __init__(self, host: str = Config.OLLAMA_HOST, keep_alive: str = Config.OLLAMA_KEEP_ALIVE,
+                 timeout: float = Config.OLLAMA_TIMEOUT, max_connections: int = Config.OLLAMA_MAX_CONNECTIONS):
+        self.host = host
+        self.keep_alive = keep_alive
+        self.timeout = httpx.Timeout(timeout, connect=Config.OLLAMA_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                   keepalive_expiry=300)
+        # the underlying httpx client is bound to the loop it was first used on
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> ollama.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            self._clients[loop] = ollama.AsyncClient(host=self.host, timeout=self.timeout, limits=self.limits)
+        return self._clients[loop]
+
+    async def chat(self, **request):
+        request.setdefault("keep_alive", self.keep_alive)
+        return await self.client.chat(**request)
+
+    async def preload(self, model: str) -> None:
+        # an empty prompt only loads the model into memory
+        await self.client.generate(model=model, prompt="", keep_alive=self.keep_alive,
+                                   options={"num_ctx": Config.CONTEXT_WINDOW})
+        logger.info(f"Preloaded {model} (keep_alive={self.keep_alive})")
+
+    async def aclose(self) -> None:
+        for client in list(self._clients.values()):
+            await client.close()
+        self._clients.clear()
@@ -1,38 +1,134 @@
-from typing import List, Dict, Any
-import ollama
+import asyncio
+import time
+import weakref
+from typing import List, Dict, Any, AsyncIterator, Optional
 
+from llm.backends import Backend, get_backend
+from llm.config import Config
+from llm.first_pass_batcher import FirstPassBatcher
 from llm.models.message import Message, ToolResponse
+from llm.scheduler import model_slots
+from llm.tool_registry import ANSWER_SCHEMA
+from llm.tracing import record_llm_usage, span
 from llm.utils.logging_config import setup_logging
 
 logger = setup_logging()
 
 class ChatManager:
-    def __init__(self, model_name: str, system_prompt:str):
+    def __init__(self, model_name: str, system_prompt:str, backend: Optional[Backend] = None):
         self.model_name = model_name
         self.system_prompt = system_prompt
-        self.client = ollama.AsyncClient()
+        # created on first use, importing a backend's client library (ollama, llama_cpp) is slow
+        self._client = backend
+        # the same num_ctx on every call, a different value makes ollama reload the model
+        self.options = {"num_ctx": Config.CONTEXT_WINDOW}
+        self._batchers = weakref.WeakKeyDictionary()
 
-    async def get_initial_response(self, messages: List[Message], tools: List[Dict]) -> Any:
+    @property
+    def client(self) -> Backend:
+        if self._client is None:
+            self._client = get_backend()
+        return self._client
+
+    @client.setter
+    def client(self, backend: Backend) -> None:
+        self._client = backend
+
+    async def close(self) -> None:
+        """close the backend's connections, if it was ever created"""
+        if self._client is not None:
+            await self._client.aclose()
+
+    @property
+    def batcher(self) -> FirstPassBatcher:
+        """first-pass micro-batcher of the running loop"""
+        loop = asyncio.get_running_loop()
+        if loop not in self._batchers:
+            self._batchers[loop] = FirstPassBatcher(self._chat, getattr(self.client, "chat_batch", None))
+        return self._batchers[loop]
+
+    async def preload(self) -> None:
+        """load the model now so the first request doesn't pay for it"""
         try:
-            return await self.client.chat(
-                model=self.model_name,
-                messages=[m.__dict__ for m in messages],
-                format="json",
-                tools=tools,
-                stream=False
-            )
+            await self.client.preload(self.model_name)
+        except Exception as e:
+            logger.warning(f"Could not preload {self.model_name}: {e}")
+
+    async def _chat(self, request: Dict) -> Any:
+        async with model_slots(self.model_name):
+            return await self.client.chat(**request)
+
+    @property
+    def answer_format(self):
+        return ANSWER_SCHEMA if Config.TOOL_CALL_CONSTRAINED else "json"
+
+    async def get_initial_response(self, messages: List[Message], tools: Optional[List[Dict]],
+                                   format: Any = "json") -> Any:
+        """format: "json" or a json schema the output is constrained to (see tool_registry.tool_call_schema)"""
+        request = dict(
+            model=self.model_name,
+            messages=[m.__dict__ for m in messages],
+            format=format,
+            tools=tools,
+            options=self.options,
+            stream=False
+        )
+        try:
+            with span("first_pass") as attributes:
+                if Config.FIRST_PASS_BATCHING:
+                    response = await self.batcher.submit(request)
+                else:
+                    response = await self._chat(request)
+                record_llm_usage("first", response, attributes)
+            return response
         except Exception as e:
             logger.error(f"Failed to get initial response: {e}")
             raise
 
     async def get_final_response(self, messages: List[Message]) -> str:
         try:
-            return await self.client.chat(
-                model=self.model_name,
-                messages=[m.__dict__ for m in messages],
-                format="json",
-                stream=False
-            )
+            with span("second_pass") as attributes:
+                async with model_slots(self.model_name):
+                    response = await self.client.chat(
+                        model=self.model_name,
+                        messages=[m.__dict__ for m in messages],
+                        format=self.answer_format,
+                        options=self.options,
+                        stream=False
+                    )
+                record_llm_usage("second", response, attributes)
+            return response
         except Exception as e:
             logger.error(f"Failed to get final response: {e}")
             raise
+
+    async def stream_final_response(self, messages: List[Message], usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        same call as get_final_response, but yields content chunks as the model generates them.
+        the token counts of the final chunk (prompt_eval_count, eval_count) are copied into usage if given.
+        the span includes the time the consumer takes between chunks
+        """
+        try:
+            with span("second_pass", stream=True) as attributes:
+                start = time.perf_counter()
+                # the slot is held until generation ends, that's how long ollama is busy with it
+                async with model_slots(self.model_name):
+                    stream = await self.client.chat(
+                        model=self.model_name,
+                        messages=[m.__dict__ for m in messages],
+                        format=self.answer_format,
+                        options=self.options,
+                        stream=True
+                    )
+                    async for chunk in stream:
+                        content = chunk['message']['content']
+                        if content:
+                            attributes.setdefault("first_token_ms", round((time.perf_counter() - start) * 1e3, 3))
+                            yield content
+                        if chunk.get('done'):
+                            record_llm_usage("second", chunk, attributes)
+                            if usage is not None:
+                                usage.update({key: chunk.get(key) for key in ("prompt_eval_count", "eval_count")})
+        except Exception as e:
+            logger.error(f"Failed to stream final response: {e}")
+            raise
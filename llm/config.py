@@ -5,4 +5,124 @@ class Config:
     CONVERSATION_COLLECTION = "conversation_history"
     CSV_METADATA_COLLECTION = "csv_metadata"
     CONVERSATION_HISTORY_DAYS = 7
-    CONVERSATION_HISTORY_LIMIT = 7
\ No newline at end of file
+    CONVERSATION_HISTORY_LIMIT = 7
+
+    # file tracking
+    FILE_MANIFEST_PATH = "../data/.file_manifest.json"
+    FILE_SCAN_MODE = "request"  # "request" scans on every run, "background" watches DATA_DIR instead
+    FILE_SCAN_INTERVAL = 5  # seconds between polls when watchdog is not installed
+
+    # output
+    STREAM_CONSOLE_OUTPUT = True  # print second-pass tokens as they arrive in the console app
+
+    # single-pass fast path: return the first-pass answer when no real tool ran
+    FAST_PATH_ENABLED = True
+    FAST_PATH_SKIP_TOOLS = ("general_chat", "say_hello")
+
+    # tool execution
+    MAX_CONCURRENT_TOOLS = 4  # tool calls from one response that may run at the same time
+    TOOL_TIMEOUT = 60  # seconds
+    TOOL_TIMEOUTS = {"execute_python": 120}  # per-tool overrides of TOOL_TIMEOUT
+
+    # NOAA CO-OPS api
+    NOAA_BASE_URL = "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter"
+    NOAA_APPLICATION = "PythonSeaLevelFetcher"
+    NOAA_MAX_CONNECTIONS = 10  # keep-alive pool shared by all NOAA requests
+    NOAA_MAX_RETRIES = 3
+    NOAA_BACKOFF = 0.5  # seconds, doubled on every retry
+    NOAA_TIMEOUT = 30  # seconds
+
+    # station metadata
+    STATION_METADATA_URL = "https://api.tidesandcurrents.noaa.gov/mdapi/prod/webapi/stations.json"
+    STATION_CACHE_PATH = "../data/.station_cache.json"
+    STATION_CACHE_TTL = 7 * 24 * 3600  # seconds
+    STATION_REFRESH_RETRY = 300  # seconds before a failed refresh is tried again (the stale copy is used meanwhile)
+    STATION_MIN_MATCH_SCORE = 0.5  # share of a place name's (idf-weighted) words a fuzzy match has to cover
+
+    # sea level storage
+    SEA_LEVEL_STORE_FORMAT = "feather"  # "feather" (memory-mappable) or "parquet"
+    SEA_LEVEL_EXPORT_CSV = False  # also write a flat csv copy next to the columnar file
+    TRACKED_FILE_EXTENSIONS = (".csv", ".feather", ".parquet")
+    SEA_LEVEL_MIN_GAP_MINUTES = 30  # uncovered stretches shorter than this are not worth a NOAA request
+    SEA_LEVEL_PUBLISH_LAG_HOURS = 24  # fetches ending this close to now count as stored up to their last reading
+
+    # execute_python worker pool
+    PYTHON_POOL_SIZE = 2
+    PYTHON_WORKER_MAX_RUNS = 50  # recycle a worker (fresh process) after this many runs
+    PYTHON_WORKER_TIMEOUT = 60  # wall-clock seconds per run
+    PYTHON_WORKER_CPU_SECONDS = 30  # cpu seconds per run (posix only)
+    PYTHON_WORKER_MEMORY_MB = 2048  # address space limit per worker (posix only), None to disable
+
+    # conversation memory
+    CONVERSATION_FLUSH_SIZE = 16  # buffered turns that trigger an immediate batched write
+    CONVERSATION_FLUSH_INTERVAL = 2.0  # seconds a turn may wait in the write buffer
+    CONVERSATION_MAX_PENDING = 1024  # buffered turns kept while writes fail, the oldest are dropped beyond it
+    CONVERSATION_PRUNE_INTERVAL = 3600  # seconds between retention prunes
+    EMBEDDING_CACHE_SIZE = 4096
+    RECENT_TURNS = 6  # latest turns per session served from memory without a vector search
+    MAX_CACHED_SESSIONS = 10000  # sessions whose recent turns are kept in memory (LRU)
+
+    # prompt assembly
+    CONTEXT_WINDOW = 8192  # num_ctx sent with every call; kept constant so ollama never reloads the model
+    PROMPT_TOKEN_BUDGET = 6144  # prompt tokens per pass, the rest of the context is left for the response
+    HISTORY_TOKEN_SHARE = 0.5  # share of the budget (after system prompt and question) history may use
+    CHARS_PER_TOKEN = 4  # bytes per token used by the token estimate
+
+    # tool selection
+    TOOL_TOP_K = 3  # tools picked by the keyword ranker for the first pass
+    TOOL_ALWAYS_INCLUDE = ("general_chat", "execute_python")  # offered on every first pass
+    TOOL_SCHEMA_MODE = "prompt"  # "prompt": selected tools go in a system message, "native": ollama's tools parameter
+    TOOL_CALL_CONSTRAINED = True  # constrain output to the tool call / answer json schema (ollama format)
+    TOOL_CALL_MAX_RETRIES = 1  # first-pass retries when the output still doesn't parse
+
+    # response cache
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_SIZE = 512  # cached answers (LRU)
+    RESPONSE_CACHE_TTL = 3600  # seconds
+    RESPONSE_CACHE_SEMANTIC = False  # also serve answers to inputs that embed close to a cached one
+    RESPONSE_CACHE_SIMILARITY = 0.95  # cosine similarity needed for a semantic hit
+
+    # request scheduling (server mode)
+    OLLAMA_NUM_PARALLEL = 4  # in-flight calls per model, match the ollama server's OLLAMA_NUM_PARALLEL
+    SCHEDULER_WORKERS = 8  # requests in progress at once, so tool calls overlap other requests' llm calls
+    SCHEDULER_MAX_QUEUE = 64  # waiting requests before new ones are rejected (HTTP 429)
+    SCHEDULER_MAX_PER_SESSION = 4  # waiting requests per session
+
+    # first-pass micro-batching
+    FIRST_PASS_BATCHING = False
+    FIRST_PASS_BATCH_WAIT = 0.005  # seconds the first call of a batch waits for company
+    FIRST_PASS_BATCH_SIZE = 8  # a batch this large is sent right away
+
+    # speculative tool prefetch (a guessed call runs alongside the first pass, cancelled if the model disagrees)
+    PREFETCH_ENABLED = False
+    PREFETCH_TOOLS = ("save_sea_level_data",)  # tools whose module defines guess_arguments and call_key
+
+    # llm backend
+    LLM_BACKEND = "ollama"  # "ollama", "llama_cpp" (in-process, cpu) or "fake" (deterministic, for tests)
+    OLLAMA_HOST = None  # None: $OLLAMA_HOST or http://localhost:11434
+    OLLAMA_KEEP_ALIVE = "30m"  # how long ollama keeps the model loaded after a call
+    OLLAMA_TIMEOUT = 300  # seconds to wait for a response
+    OLLAMA_CONNECT_TIMEOUT = 5
+    OLLAMA_MAX_CONNECTIONS = 16  # keep-alive pool, at least OLLAMA_NUM_PARALLEL
+    PRELOAD_MODEL = True  # load the model at startup instead of on the first request
+    LLAMA_CPP_MODEL_PATH = "../models/function_tuned.gguf"
+    LLAMA_CPP_THREADS = None  # None: llama.cpp picks the number of physical cores
+
+    # logging, tracing and metrics
+    LOG_LEVEL = "INFO"  # DEBUG also logs the raw first-pass, tool and second-pass outputs
+    TRACE_FILE = None  # e.g. "../traces.jsonl": one json line with the stage spans of every request
+    METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)  # seconds
+
+    # startup (chroma, the embedding model and the backend are opened lazily; warm-up does it in the background)
+    WARM_UP_ENABLED = True  # server mode: warm up right after startup, /ready answers 503 until it is done
+    WARM_UP_STATION_INDEX = True  # also load the NOAA station index (disk cache, or fetched when stale)
+
+    # multi-process serving (asgi.py: uvicorn asgi:app --workers N)
+    SHARED_STATE_PATH = None  # e.g. "../data/.shared_state.sqlite3": workers share recent turns, cached answers, scans
+    SHARED_STATE_TIMEOUT = 10  # seconds a write waits for the sqlite lock
+    SHARED_LOCK_TTL = 120  # seconds a cross-process lock is held at most, should its holder die
+    FILE_SCAN_LEASE_TTL = 600  # seconds one worker may hold the data directory scan
+    CHROMA_HOST = None  # a chroma server (`chroma run --path CHROMA_DB_PATH`) shared by the workers, None: embedded
+    CHROMA_PORT = 8000
+    ASGI_THREADS = 64  # threads per worker running flask views, each open stream holds one
+    SHUTDOWN_TIMEOUT = 30  # seconds to let queued and running requests finish before buffered writes are flushed
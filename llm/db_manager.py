@@ -1,43 +1,237 @@
 """database operations live here"""
+import asyncio
+import hashlib
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-import chromadb
+from functools import cached_property
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Tuple
 from llm.config import Config
+from llm.shared_state import get_shared_state
+from llm.utils.embedding_cache import EmbeddingCache
 from llm.utils.logging_config import setup_logging
 
 logger = setup_logging()
 
 
+def csv_metadata_id(file_path: str) -> str:
+    """deterministic chroma id for a file so repeated scans upsert instead of duplicating"""
+    return hashlib.sha1(file_path.encode("utf-8")).hexdigest()
+
+
+class _DefaultEmbeddingFunction:
+    """chroma's default (onnx MiniLM) embedding function, imported and loaded on the first call"""
+
+    def __init__(self):
+        self._function = None
+        self._lock = threading.Lock()
+
+    def __call__(self, input: List[str]):
+        if self._function is None:
+            with self._lock:
+                if self._function is None:
+                    from chromadb.utils import embedding_functions
+                    self._function = embedding_functions.DefaultEmbeddingFunction()
+        return self._function(input)
+
+
 class DatabaseManager:
+    """
+    conversation memory and csv metadata in chroma.
+    conversations are namespaced per session (session_id metadata); each session's latest turns are kept in an
+    in-memory ring buffer so most turns need no vector search at all.
+    conversation writes are buffered and flushed in batches off the event loop (a batch that fails to write goes
+    back into the buffer for the next flush), and retention pruning runs at most every CONVERSATION_PRUNE_INTERVAL.
+    embeddings go through an LRU cache; queries (the user's input) and writes (the whole turn) embed different
+    texts, so it saves repeated questions and retried batches, not the write of a turn that was just queried.
+    chroma (client, collections and embedding model) is only imported and opened on first use, or by warm_up.
+    with SHARED_STATE_PATH set the recent turns live in the shared sqlite state instead, so every worker process
+    sees every session's latest turns; with CHROMA_HOST set all of them talk to one chroma server
+    """
+
     def __init__(self):
-        self.client = chromadb.PersistentClient(path=Config.CHROMA_DB_PATH)
-        self.conversation_collection = self.client.get_or_create_collection(
-            name=Config.CONVERSATION_COLLECTION
-        )
-        self.csv_metadata_collection = self.client.get_or_create_collection(
-            name=Config.CSV_METADATA_COLLECTION
-        )
+        self.embedding_cache = EmbeddingCache(_DefaultEmbeddingFunction(), max_size=Config.EMBEDDING_CACHE_SIZE)
+        self._open_lock = threading.Lock()
+        self.shared = get_shared_state()
+        self._recent = OrderedDict()
+        self._has_older = {}
+        self._pending = []
+        self._flushing = []  # batches being written (a size-triggered and a timed flush can overlap)
+        self._flush_timer = None
+        self._flush_tasks = set()
+        self._last_prune = 0.0
+
+    @cached_property
+    def client(self):
+        with self._open_lock:
+            import chromadb
+            if Config.CHROMA_HOST:
+                return chromadb.HttpClient(host=Config.CHROMA_HOST, port=Config.CHROMA_PORT)
+            if self.shared is not None:
+                logger.warning("Embedded chroma isn't safe to share between processes, set CHROMA_HOST when "
+                               "running several workers")
+            return chromadb.PersistentClient(path=Config.CHROMA_DB_PATH)
+
+    @cached_property
+    def conversation_collection(self):
+        return self.client.get_or_create_collection(name=Config.CONVERSATION_COLLECTION)
+
+    @cached_property
+    def csv_metadata_collection(self):
+        return self.client.get_or_create_collection(name=Config.CSV_METADATA_COLLECTION)
+
+    @property
+    def is_open(self) -> bool:
+        """whether the conversation collection has been opened (by warm_up or a request)"""
+        return "conversation_collection" in self.__dict__
+
+    def warm_up(self) -> None:
+        """open chroma and both collections and load the embedding model (blocking, run it in a thread)"""
+        # touching the cached properties opens them
+        self.conversation_collection
+        self.csv_metadata_collection
+        self.embedding_cache.embedding_function(["warm up"])
 
-    def get_recent_conversations(self, query_text: str) -> str:
-        results = self.conversation_collection.query(
-            query_texts=[query_text],
+    def _session_turns(self, session_id: str) -> Deque[Tuple[float, str]]:
+        """ring buffer of the session's last RECENT_TURNS turns (LRU over sessions)"""
+        turns = self._recent.get(session_id)
+        if turns is None:
+            turns = self._recent[session_id] = deque(maxlen=Config.RECENT_TURNS)
+            # a session we haven't seen since startup may have history in chroma
+            self._has_older[session_id] = True
+            while len(self._recent) > Config.MAX_CACHED_SESSIONS:
+                evicted, _ = self._recent.popitem(last=False)
+                self._has_older.pop(evicted, None)
+        self._recent.move_to_end(session_id)
+        return turns
+
+    async def _load_turns(self, session_id: str) -> Tuple[List[Tuple[float, str]], bool]:
+        """the session's recent turns (oldest first) and whether chroma may hold older ones"""
+        if self.shared is not None:
+            return await asyncio.to_thread(self.shared.session_turns, session_id)
+        turns = self._session_turns(session_id)
+        return list(turns), self._has_older[session_id]
+
+    async def _set_has_older(self, session_id: str, has_older: bool) -> None:
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.set_has_older, session_id, has_older)
+        elif session_id in self._has_older:
+            self._has_older[session_id] = has_older
+
+    async def get_recent_conversations(self, query_text: str, session_id: str = "default") -> str:
+        """get_recent_turns joined into one block of text"""
+        return "\n".join(await self.get_recent_turns(query_text, session_id))
+
+    async def get_recent_turns(self, query_text: str, session_id: str = "default") -> List[str]:
+        """
+        the session's last turns straight from memory, plus (only when the session has turns beyond the ring
+        buffer) the most similar older turns from a vector search restricted to that session; oldest first
+        """
+        cutoff = (datetime.now() - timedelta(days=Config.CONVERSATION_HISTORY_DAYS)).timestamp()
+        turns, has_older = await self._load_turns(session_id)
+        recent = [document for timestamp, document in turns if timestamp >= cutoff]
+        if not has_older:
+            return recent
+
+        older_than = turns[0][0] if turns else datetime.now().timestamp()
+        query_embedding = (await asyncio.to_thread(self.embedding_cache.embed, [query_text]))[0]
+        results = await asyncio.to_thread(
+            self.conversation_collection.query,
+            query_embeddings=[query_embedding],
             n_results=Config.CONVERSATION_HISTORY_LIMIT,
-            where={
-                "timestamp": {"$gte": (datetime.now() - timedelta(days=Config.CONVERSATION_HISTORY_DAYS)).timestamp()}}
+            where={"$and": [
+                {"session_id": session_id},
+                {"timestamp": {"$gte": cutoff}},
+                {"timestamp": {"$lt": older_than}},
+            ]}
         )
-        return "\n".join(results['documents'][0] if results['documents'] and results['documents'][0] else "")
+        older = results['documents'][0] if results['documents'] and results['documents'][0] else []
+        if not older and not self._buffered(session_id, older_than):
+            # nothing older than the ring buffer, later turns can skip the vector search until the ring overflows.
+            # turns still buffered for the write aren't in chroma yet, the flag stays until they are
+            await self._set_has_older(session_id, False)
+        return older + recent
+
+    async def store_conversation(self, user_input: str, assistant_response: str, session_id: str = "default") -> None:
+        """queue a turn for the next batched write; flushed when the batch is full or after CONVERSATION_FLUSH_INTERVAL"""
+        document = f"User: {user_input}, Assistant: {assistant_response}"
+        timestamp = datetime.now().timestamp()
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.append_turn, session_id, timestamp, document, Config.RECENT_TURNS)
+        else:
+            turns = self._session_turns(session_id)
+            if len(turns) == turns.maxlen:
+                self._has_older[session_id] = True
+            turns.append((timestamp, document))
+
+        self._pending.append((document, str(uuid.uuid4()), {"timestamp": timestamp, "session_id": session_id}))
+        if len(self._pending) >= Config.CONVERSATION_FLUSH_SIZE:
+            self._track(asyncio.create_task(self.flush()))
+        elif self._flush_timer is None or self._flush_timer.done():
+            self._flush_timer = self._track(asyncio.create_task(self._flush_later()))
+
+    def _buffered(self, session_id: str, older_than: float) -> bool:
+        """whether turns of the session from before older_than are waiting for (or in) a write"""
+        return any(metadata["session_id"] == session_id and metadata["timestamp"] < older_than
+                   for batch in [self._pending, *self._flushing] for _, _, metadata in batch)
 
-    def store_conversation(self, user_input: str, assistant_response: str) -> None:
+    def _track(self, task: asyncio.Task) -> asyncio.Task:
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        return task
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(Config.CONVERSATION_FLUSH_INTERVAL)
+        # the flush is its own tracked task, so cancelling this timer in close() can't lose a batch mid-write
+        await asyncio.shield(self._track(asyncio.create_task(self.flush())))
+
+    async def flush(self) -> None:
+        """write all buffered turns in one add, and prune old entries if it is time to"""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self._flushing.append(batch)
         try:
-            self.conversation_collection.add(
-                documents=[f"User: {user_input}, Assistant: {assistant_response}"],
-                ids=[str(uuid.uuid4())],
-                metadatas=[{"timestamp": datetime.now().timestamp()}]
+            documents, ids, metadatas = (list(column) for column in zip(*batch))
+            embeddings = await asyncio.to_thread(self.embedding_cache.embed, documents)
+            await asyncio.to_thread(
+                self.conversation_collection.add,
+                documents=documents,
+                embeddings=embeddings,
+                ids=ids,
+                metadatas=metadatas
             )
-            self.delete_old_entries()
         except Exception as e:
-            logger.error(f"Failed to store conversation: {e}")
+            # back in front of the turns queued meanwhile, for the next flush
+            self._pending = batch + self._pending
+            dropped = len(self._pending) - Config.CONVERSATION_MAX_PENDING
+            if dropped > 0:
+                del self._pending[:dropped]
+            logger.error(f"Failed to store {len(batch)} conversation turn(s), retrying with the next flush"
+                         f"{f' ({dropped} dropped)' if dropped > 0 else ''}: {e}")
+            # a timer of its own, the running one may be the one waiting for this flush
+            self._flush_timer = self._track(asyncio.create_task(self._flush_later()))
+        finally:
+            self._flushing.remove(batch)
+
+        if time.monotonic() - self._last_prune >= Config.CONVERSATION_PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            try:
+                await asyncio.to_thread(self.delete_old_entries)
+            except Exception as e:
+                logger.error(f"Failed to prune old conversations: {e}")
+
+    async def close(self) -> None:
+        """flush everything still buffered (call on shutdown)"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush()
+        # retries of failed flushes, there is no later one to run them in
+        for task in list(self._flush_tasks):
+            task.cancel()
 
     def update_csv_metadata(self, metadata: Dict[str, Any]) -> None:
         try:
@@ -68,9 +262,29 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error updating CSV metadata: {e}")
 
+    def upsert_csv_metadata(self, metadatas: List[Dict[str, Any]]) -> None:
+        """write metadata for many files in a single batched upsert, keyed by file path"""
+        if not metadatas:
+            return
+        self.csv_metadata_collection.upsert(
+            ids=[csv_metadata_id(m["file_path"]) for m in metadatas],
+            documents=[f"CSV File: {m['file_name']}" for m in metadatas],
+            metadatas=metadatas
+        )
+        logger.info(f"Upserted metadata for {len(metadatas)} CSV file(s)")
+
+    def delete_csv_metadata(self, file_paths: List[str]) -> None:
+        """remove metadata for files that no longer exist (also clears legacy uuid-keyed entries)"""
+        if not file_paths:
+            return
+        self.csv_metadata_collection.delete(where={"file_path": {"$in": list(file_paths)}})
+        logger.info(f"Removed metadata for {len(file_paths)} CSV file(s)")
+
     def delete_old_entries(self):
         """delete old entries from conversation"""
-        seven_days_ago = (datetime.now() - timedelta(days=7)).timestamp()
+        cutoff = (datetime.now() - timedelta(days=Config.CONVERSATION_HISTORY_DAYS)).timestamp()
         self.conversation_collection.delete(
-            where={"timestamp": {"$lt": seven_days_ago}}
+            where={"timestamp": {"$lt": cutoff}}
         )
+        if self.shared is not None:
+            self.shared.prune_turns(cutoff)
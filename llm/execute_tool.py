@@ -0,0 +1,47 @@
+import asyncio
+import importlib
+import inspect
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from llm.tool_registry import get_tool_registry
+except ImportError:
+    from tool_registry import get_tool_registry
+
+_tool_functions: Dict[str, Callable] = {}
+
+
+def get_tool_function(tool_name: str) -> Callable:
+    """
+    resolve a tool name to its function: functions/<tool_name>.py, or the module that lists it in __tools__.
+    modules are imported on first use so one broken tool can't take the others down
+    """
+    if tool_name not in _tool_functions:
+        try:
+            module = importlib.import_module(f"functions.{get_tool_registry().module_for(tool_name)}")
+            _tool_functions[tool_name] = getattr(module, tool_name)
+        except (ImportError, AttributeError) as e:
+            raise ValueError(f"Unknown tool: {tool_name}") from e
+    return _tool_functions[tool_name]
+
+
+def is_session_scoped(tool_name: str) -> bool:
+    """whether the tool takes a session_id, i.e. its result can depend on the session's earlier calls"""
+    try:
+        return "session_id" in inspect.signature(get_tool_function(tool_name)).parameters
+    except ValueError:
+        return False
+
+
+async def execute_tool(tool_name: str, tool_args: Dict[str, Any], session_id: Optional[str] = None) -> Any:
+    """
+    run a tool with the given arguments.
+    async tools are awaited on the loop; sync tools run in a worker thread so they don't stall other
+    sessions sharing the loop. tools that take a session_id (e.g. execute_python) get the caller's session
+    """
+    func = get_tool_function(tool_name)
+    if is_session_scoped(tool_name):
+        tool_args = {**tool_args, "session_id": session_id or "default"}
+    if inspect.iscoroutinefunction(func):
+        return await func(**tool_args)
+    return await asyncio.to_thread(func, **tool_args)
@@ -1,4 +1,5 @@
 import json
+import re
 from json import JSONDecodeError
 
 def extract_content(final_response):
@@ -16,4 +17,82 @@ def extract_content(final_response):
         pass
 
     # Fallback to the original response if no 'message' or 'content' is found
-    return final_response
\ No newline at end of file
+    return final_response
+
+_VALUE_START = re.compile(r'"(message|content)"\s*:\s*"')
+
+
+class StreamingContentExtractor:
+    """
+    incremental counterpart of extract_content for streamed JSON-mode output.
+    feed() takes raw chunks such as '{"mess' / 'age": "Hel' / 'lo"}' and returns the newly decoded
+    part of the "message" (or "content") string value, so tokens can be forwarded as they arrive.
+    plain (non-JSON) output is passed through unchanged.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.text = ""
+        self._plain = None
+        self._pos = None
+        self._done = False
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        if self._plain is None:
+            if not self.buffer.strip():
+                return ""
+            self._plain = not self.buffer.lstrip().startswith("{")
+            if self._plain:
+                return self._emit(self.buffer)
+        if self._plain:
+            return self._emit(chunk)
+        if self._done:
+            return ""
+
+        if self._pos is None:
+            match = _VALUE_START.search(self.buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        # advance over complete characters/escapes only, so a chunk boundary never splits an escape
+        i = safe = self._pos
+        while i < len(self.buffer):
+            c = self.buffer[i]
+            if c == '"':
+                self._done = True
+                break
+            if c == "\\":
+                if i + 1 >= len(self.buffer):
+                    break
+                if self.buffer[i + 1] == "u":
+                    if i + 6 > len(self.buffer):
+                        break
+                    # keep surrogate pairs together
+                    if 0xD800 <= int(self.buffer[i + 2:i + 6], 16) < 0xDC00:
+                        if i + 12 > len(self.buffer):
+                            break
+                        i += 6
+                    i += 6
+                else:
+                    i += 2
+            else:
+                i += 1
+            safe = i
+
+        raw, self._pos = self.buffer[self._pos:safe], safe
+        return self._emit(json.loads(f'"{raw}"')) if raw else ""
+
+    def finish(self) -> str:
+        """flush at end of stream; falls back to extract_content when no string value was streamed"""
+        if self._plain or self.text:
+            return ""
+        content = extract_content({"message": {"content": self.buffer}})
+        if content is None:
+            return ""
+        return self._emit(content if isinstance(content, str) else json.dumps(content))
+
+    def _emit(self, text: str) -> str:
+        self.text += text
+        return text
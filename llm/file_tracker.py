@@ -1,24 +1,201 @@
-import glob
+import json
+import os
+import threading
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple
 
 from llm.config import Config
-from llm.utils.file_utils import get_file_metadata
+from llm.shared_state import get_shared_state
+from llm.utils.file_utils import calculate_file_hash, get_file_metadata, get_file_signature
 from llm.utils.logging_config import setup_logging
 
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional, background mode falls back to polling
+    FileSystemEventHandler = object
+    Observer = None
+
 logger = setup_logging()
 
+
+class _DataDirEventHandler(FileSystemEventHandler):
+    """marks the tracker dirty whenever a tracked data file under the data directory changes"""
+
+    def __init__(self, dirty: threading.Event):
+        self.dirty = dirty
+
+    def on_any_event(self, event):
+        paths = [getattr(event, "src_path", ""), getattr(event, "dest_path", "")]
+        if any(str(p).endswith(Config.TRACKED_FILE_EXTENSIONS) for p in paths):
+            self.dirty.set()
+
+
 class FileTracker:
-    def __init__(self, db_manager):
+    """
+    keeps csv_metadata in sync with the data directory.
+    a local manifest maps each path to its (size, mtime, inode) signature and hash, so a scan only
+    stats files and re-hashes the ones whose signature changed; chroma only sees the changes.
+    with SHARED_STATE_PATH set, worker processes take turns through a lease: one scans, the others skip, and
+    the next to scan starts from the manifest the last one wrote, so a file is hashed and upserted only once
+    """
+
+    def __init__(self, db_manager, data_dir: str = Config.DATA_DIR,
+                 manifest_path: str = Config.FILE_MANIFEST_PATH):
         self.db_manager = db_manager
+        self.data_dir = Path(data_dir)
+        self.manifest_path = Path(manifest_path)
+        self.shared = get_shared_state()
+        self._scan_lease = f"file_scan:{self.data_dir.absolute()}"
+        self._manifest_mtime = None
+        self.manifest = self._load_manifest()
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        # called with the paths that changed or disappeared in a scan (e.g. to invalidate cached answers)
+        self.listeners: List[Callable[[List[str]], None]] = []
 
-    def scan_csv_files(self) -> None:
+    def _manifest_mtime_ns(self) -> Optional[int]:
+        try:
+            return self.manifest_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        self._manifest_mtime = self._manifest_mtime_ns()
         try:
-            csv_files = glob.glob(str(Config.DATA_DIR / "**/*.csv"), recursive=True)
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable file manifest {self.manifest_path}: {e}")
+            return {}
+
+    def _save_manifest(self) -> None:
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = self._manifest_mtime_ns()
+
+    def _iter_csv_files(self):
+        """walk the data directory with scandir, yielding (path, stat) without a second stat call"""
+        stack = [self.data_dir]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.name.endswith(Config.TRACKED_FILE_EXTENSIONS) and entry.is_file():
+                        yield Path(entry.path).absolute(), entry.stat()
+
+    def _diff(self) -> Tuple[Dict[str, Dict], List[Dict], List[str]]:
+        """compare the data directory against the manifest, hashing only files whose stat changed"""
+        manifest = {}
+        changed = []
+        for file_path, file_stat in self._iter_csv_files():
+            key = str(file_path)
+            signature = get_file_signature(file_stat)
+            previous = self.manifest.get(key)
+
+            if previous and all(previous.get(k) == v for k, v in signature.items()):
+                manifest[key] = previous
+                continue
+
+            file_hash = calculate_file_hash(file_path)
+            manifest[key] = {**signature, "file_hash": file_hash}
+            if not previous or previous.get("file_hash") != file_hash:
+                changed.append(get_file_metadata(file_path, file_stat, file_hash))
+
+        deleted = [path for path in self.manifest if path not in manifest]
+        return manifest, changed, deleted
+
+    def scan_csv_files(self) -> None:
+        with self._lock:
+            try:
+                if self.shared is None:
+                    self._scan()
+                    return
+                if not self.shared.acquire(self._scan_lease, Config.FILE_SCAN_LEASE_TTL):
+                    return  # another worker is scanning the same directory right now
+                try:
+                    if self._manifest_mtime_ns() != self._manifest_mtime:
+                        # another worker scanned since: only what changed after that is left to do
+                        self.manifest = self._load_manifest()
+                    self._scan()
+                finally:
+                    self.shared.release(self._scan_lease)
+            except Exception as e:
+                logger.error(f"Error while scanning CSV files: {e}")
+
+    def _scan(self) -> None:
+        fresh_manifest = not self.manifest_path.exists()
+        manifest, changed, deleted = self._diff()
+
+        if fresh_manifest and changed:
+            # first run against an existing collection: drop entries written before the manifest existed
+            self.db_manager.delete_csv_metadata([m["file_path"] for m in changed])
+        self.db_manager.delete_csv_metadata(deleted)
+        self.db_manager.upsert_csv_metadata(changed)
+
+        if changed or deleted or manifest != self.manifest or fresh_manifest:
+            self.manifest = manifest
+            self._save_manifest()
+
+        if changed or deleted:
+            paths = [m["file_path"] for m in changed] + deleted
+            for listener in self.listeners:
+                listener(paths)
+
+    def start_watching(self) -> None:
+        """
+        keep metadata in sync from a background thread so the request path never scans.
+        uses watchdog (inotify on linux) when installed, otherwise polls every FILE_SCAN_INTERVAL seconds.
+        """
+        if self._thread is not None:
+            return
+
+        self.scan_csv_files()
+        self._stop.clear()
+
+        if Observer is not None:
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+            self._observer = Observer()
+            self._observer.schedule(_DataDirEventHandler(self._dirty), str(self.data_dir), recursive=True)
+            self._observer.start()
+
+        self._thread = threading.Thread(target=self._watch_loop, name="file-tracker", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.data_dir} for CSV changes ({'watchdog' if self._observer else 'polling'})")
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        self._dirty.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
 
-            for file_path in csv_files:
-                metadata = get_file_metadata(Path(file_path))
-                self.db_manager.update_csv_metadata(metadata)
+    def _watch_loop(self) -> None:
+        while not self._stop.is_set():
+            if self._observer is not None:
+                self._dirty.wait()
+                # let bursts of events (e.g. a file being written in chunks) settle before scanning
+                self._stop.wait(0.5)
+                self._dirty.clear()
+            elif self._stop.wait(Config.FILE_SCAN_INTERVAL):
+                break
 
-        except Exception as e:
-            logger.error(f"Error while scanning CSV files: {e}")
+            if not self._stop.is_set():
+                self.scan_csv_files()
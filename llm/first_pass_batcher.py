@@ -0,0 +1,77 @@
+import asyncio
+import json
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from llm.config import Config
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+
+class FirstPassBatcher:
+    """
+    collects first-pass (tool detection) calls for up to FIRST_PASS_BATCH_WAIT seconds or FIRST_PASS_BATCH_SIZE
+    calls and sends them together: through send_batch when the backend has a batched endpoint, otherwise all at
+    once through send, so they land in the server's parallel slots in the same scheduling step.
+    identical requests within a batch (same messages and tools) are sent once and share the response
+    """
+
+    def __init__(self, send: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 send_batch: Optional[Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]]] = None,
+                 max_wait: float = Config.FIRST_PASS_BATCH_WAIT, max_size: int = Config.FIRST_PASS_BATCH_SIZE):
+        self.send = send
+        self.send_batch = send_batch
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self._pending = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batch_sizes = Counter()
+        self.coalesced = 0
+
+    async def submit(self, request: Dict[str, Any]) -> Any:
+        """request: the keyword arguments of the chat call"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((json.dumps(request, sort_keys=True, default=str), request, future))
+        if len(self._pending) >= self.max_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch) -> None:
+        unique: Dict[str, Dict[str, Any]] = {}
+        for key, request, _ in batch:
+            unique.setdefault(key, request)
+        self.batch_sizes[len(batch)] += 1
+        self.coalesced += len(batch) - len(unique)
+
+        keys = list(unique)
+        try:
+            if self.send_batch is not None:
+                responses = await self.send_batch([unique[key] for key in keys])
+            else:
+                responses = await asyncio.gather(*(self.send(unique[key]) for key in keys), return_exceptions=True)
+        except Exception as e:
+            responses = [e] * len(keys)
+
+        results = dict(zip(keys, responses))
+        for key, _, future in batch:
+            if future.done():  # caller gave up (cancelled)
+                continue
+            if isinstance(results[key], BaseException):
+                future.set_exception(results[key])
+            else:
+                future.set_result(results[key])
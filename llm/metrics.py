@@ -0,0 +1,89 @@
+import bisect
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from llm.config import Config
+
+# a collector returns (name, type, help, [(labels, value)]) for values that live elsewhere (queue depth, caches)
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+def _labels(labels: Dict[str, str], extra: str = "") -> str:
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    parts = [f'{key}="{escape(value)}"' for key, value in sorted(labels.items())]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    """
+    counters and histograms with labels, rendered in the prometheus text format for /metrics.
+    kept in-process and hand-rendered, there's no prometheus_client in the requirements
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = Config.METRICS_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = defaultdict(lambda: defaultdict(float))
+        # per label set: bucket counts, sum, count
+        self._histograms: Dict[str, Dict[Tuple, List]] = defaultdict(dict)
+        self.collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> None:
+        self._help[name] = ("counter", help)
+
+    def histogram(self, name: str, help: str) -> None:
+        self._help[name] = ("histogram", help)
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        with self._lock:
+            self._counters[name][tuple(sorted(labels.items()))] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name].setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in self._counters.items():
+                kind, help = self._help.get(name, ("counter", name))
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(dict(key))} {value:g}" for key, value in series.items()]
+            for name, series in self._histograms.items():
+                _, help = self._help.get(name, ("histogram", name))
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+                for key, (counts, total, count) in series.items():
+                    labels, cumulative = dict(key), 0
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        cumulative += bucket_count
+                        le = 'le="%g"' % bound
+                        lines.append(f"{name}_bucket{_labels(labels, le)} {cumulative}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{name}_bucket{_labels(labels, le)} {count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+        for collector in self.collectors:
+            for name, kind, help, samples in collector():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(labels)} {value:g}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.histogram("llm_stage_seconds", "time spent in each stage of a request")
+metrics.histogram("llm_request_seconds", "end to end request time, by the path that served it")
+metrics.histogram("llm_tool_seconds", "tool call time, by tool and outcome")
+metrics.histogram("llm_prompt_eval_seconds", "prompt processing time reported by the model server, per pass")
+metrics.histogram("llm_eval_seconds", "generation time reported by the model server, per pass")
+metrics.counter("llm_prompt_tokens_total", "prompt tokens evaluated by the model server, per pass")
+metrics.counter("llm_eval_tokens_total", "tokens generated by the model server, per pass")
@@ -0,0 +1,28 @@
+from dataclasses import dataclass, asdict, field
+from typing import List, Optional
+
+
+@dataclass
+class PromptStats:
+    budget: int
+    system_tokens: int = 0
+    history_tokens: int = 0
+    user_tokens: int = 0
+    tool_tokens: int = 0
+    history_turns: int = 0
+    dropped_turns: int = 0
+    truncated_tool_results: int = 0
+    # tool schemas only go to the first pass, so they aren't part of total_tokens
+    tool_schema_tokens: int = 0
+    selected_tools: List[str] = field(default_factory=list)
+    first_pass_attempts: int = 0
+    # counts reported by ollama for each pass (prompt_eval_count)
+    first_pass_prompt_tokens: Optional[int] = None
+    second_pass_prompt_tokens: Optional[int] = None
+
+    @property
+    def total_tokens(self) -> int:
+        return self.system_tokens + self.history_tokens + self.user_tokens + self.tool_tokens
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "total_tokens": self.total_tokens}
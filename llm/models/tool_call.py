@@ -0,0 +1,12 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+
+@dataclass(frozen=True)
+class ToolCall:
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+
+
+class ToolCallParseError(ValueError):
+    """first-pass output that isn't a valid tool call or answer for the offered tools"""
@@ -0,0 +1,32 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class Span:
+    name: str
+    start: float  # seconds since the start of the trace
+    duration: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "start_ms": round(self.start * 1e3, 3),
+                "duration_ms": round(self.duration * 1e3, 3), **self.attributes}
+
+
+@dataclass
+class Trace:
+    """the stages of one request, in the order they finished"""
+    trace_id: str
+    session_id: str
+    started_at: float  # unix time
+    start: float  # perf_counter at the start
+    spans: List[Span] = field(default_factory=list)
+    path: Optional[str] = None  # cache, fast_path or two_pass
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {"trace_id": self.trace_id, "session_id": self.session_id, "started_at": self.started_at,
+                "path": self.path, "duration_ms": round((self.duration or 0.0) * 1e3, 3), "error": self.error,
+                "spans": [span.to_dict() for span in self.spans]}
@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from llm.models.message import Message
+from llm.models.prompt_stats import PromptStats
+
+
+@dataclass
+class PreparedTurn:
+    """everything the first pass produced for one request"""
+    messages: List[Message]  # messages for the second pass
+    stats: PromptStats
+    fast_answer: Optional[str] = None  # set when the first pass's answer can be returned directly
+    tool_calls: str = ""  # the first pass's raw tool calls, used to find the data files the answer depends on
+    tool_errors: bool = False
+    cacheable: bool = True  # built on no history and no session-scoped tool, so any session may reuse the answer
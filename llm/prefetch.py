@@ -0,0 +1,137 @@
+import asyncio
+import importlib
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from llm.config import Config
+from llm.models.message import ToolResponse
+from llm.models.tool_call import ToolCall
+from llm.utils.logging_config import setup_logging
+
+try:
+    from llm.process_tool_calls import run_tool
+    from llm.tracing import span
+except ImportError:
+    from process_tool_calls import run_tool
+    from tracing import span
+
+logger = setup_logging()
+
+
+@dataclass
+class Speculation:
+    tool_name: str
+    session_id: Optional[str]
+    semaphore: asyncio.Semaphore  # the request's tool slots, shared with its real calls
+    guess: asyncio.Task  # the guessed arguments (or None), starts run when there is a guess
+    run: Optional[asyncio.Task] = None
+    run_started: Optional[float] = None
+    run_finished: Optional[float] = None
+    claimed: bool = False
+
+
+class SpeculativePrefetcher:
+    """
+    starts a likely tool call while the first pass is still generating.
+    a tool listed in PREFETCH_TOOLS opts in with two module-level hooks next to the tool function:
+    guess_arguments(user_input) returns the call the model will most likely make (or None), and
+    call_key(arguments) says which calls are the same work. when the model's call has the guessed key, its
+    result is taken from the speculative run; otherwise the run is cancelled.
+    counts guesses, hits and misses, and the seconds of tool time that overlapped the first pass on hits
+    """
+
+    def __init__(self, tool_registry, tools=Config.PREFETCH_TOOLS):
+        self.tool_registry = tool_registry
+        self.tools = tools
+        self.stats = Counter()
+        self.saved_seconds = 0.0
+
+    def _module(self, tool_name: str):
+        return importlib.import_module(f"functions.{self.tool_registry.module_for(tool_name)}")
+
+    def start(self, user_input: str, selected_tools: List[Dict[str, Any]], session_id: Optional[str] = None,
+              semaphore: Optional[asyncio.Semaphore] = None) -> Optional[Speculation]:
+        """
+        speculate on the first prefetchable tool the first pass is offered, None if there is none.
+        the run takes a slot of semaphore (the request's tool calls' one), so it counts against MAX_CONCURRENT_TOOLS
+        """
+        offered = {tool["function"]["name"] for tool in selected_tools}
+        tool_name = next((name for name in self.tools if name in offered), None)
+        if tool_name is None:
+            return None
+        semaphore = semaphore or asyncio.Semaphore(Config.MAX_CONCURRENT_TOOLS)
+        speculation = Speculation(tool_name, session_id, semaphore, guess=None)
+        speculation.guess = asyncio.create_task(self._guess(speculation, user_input))
+        return speculation
+
+    async def _guess(self, speculation: Speculation, user_input: str) -> Optional[Dict[str, Any]]:
+        try:
+            arguments = await self._module(speculation.tool_name).guess_arguments(user_input)
+        except Exception as e:
+            logger.warning(f"Speculative guess for {speculation.tool_name} failed: {e}")
+            return None
+        if arguments is not None:
+            speculation.run_started = time.perf_counter()
+            speculation.run = asyncio.create_task(self._run(speculation, arguments))
+        return arguments
+
+    @staticmethod
+    async def _run(speculation: Speculation, arguments: Dict[str, Any]) -> ToolResponse:
+        try:
+            with span("prefetch", tool=speculation.tool_name):
+                return await run_tool(speculation.tool_name, arguments, speculation.semaphore, speculation.session_id)
+        finally:
+            speculation.run_finished = time.perf_counter()
+
+    async def claim(self, speculation: Speculation, calls: List[ToolCall]) -> Dict[int, ToolResponse]:
+        """
+        {index of the matching call: its speculative result}; called right after the first pass.
+        an unmatched speculation is cancelled before the real calls run, so the two never write the same data
+        """
+        first_pass_done = time.perf_counter()
+        guessed = await speculation.guess
+        if guessed is None:
+            self.stats["no_guess"] += 1
+            return {}
+        self.stats["guesses"] += 1
+
+        module = self._module(speculation.tool_name)
+        try:
+            expected = await module.call_key(guessed)
+            for index, call in enumerate(calls):
+                if call.name == speculation.tool_name and await module.call_key(call.arguments) == expected:
+                    response = await speculation.run
+                    speculation.claimed = True
+                    duration = speculation.run_finished - speculation.run_started
+                    saved = max(0.0, min(duration, first_pass_done - speculation.run_started))
+                    self.stats["hits"] += 1
+                    self.saved_seconds += saved
+                    logger.info(f"Speculative {speculation.tool_name} call hit, saved {saved:.3f}s")
+                    return {index: response}
+        except Exception as e:
+            logger.warning(f"Could not match the speculative {speculation.tool_name} call: {e}")
+
+        self.stats["misses"] += 1
+        await self.cancel(speculation)
+        return {}
+
+    @staticmethod
+    async def cancel(speculation: Speculation) -> None:
+        """stop speculative work whose result wasn't used (no-op once claimed)"""
+        if speculation.claimed:
+            return
+        tasks = [task for task in (speculation.guess, speculation.run) if task is not None and not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # the guess may have started the run just before it was cancelled
+        if speculation.run is not None and not speculation.run.done():
+            speculation.run.cancel()
+            await asyncio.gather(speculation.run, return_exceptions=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        guesses = self.stats["guesses"]
+        return {**self.stats, "hit_rate": self.stats["hits"] / guesses if guesses else None,
+                "saved_seconds": round(self.saved_seconds, 3)}
@@ -1,62 +1,138 @@
+import asyncio
 import json
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
 
 try:
+    from llm.config import Config
     from llm.execute_tool import execute_tool
+    from llm.metrics import metrics
+    from llm.models.message import ToolResponse
+    from llm.models.tool_call import ToolCall, ToolCallParseError
+    from llm.tracing import span
+    from llm.utils.logging_config import setup_logging
 except ImportError:
+    from config import Config
     from execute_tool import execute_tool
+    from metrics import metrics
+    from models.message import ToolResponse
+    from models.tool_call import ToolCall, ToolCallParseError
+    from tracing import span
+    from utils.logging_config import setup_logging
 
-tool_responses = []
-async def process_tool_calls(response):
+logger = setup_logging()
+
+# first passes that parsed, ones that didn't, and retries since startup: parsed / (parsed + parse_failures) is the
+# parse success rate, and every failure is a wasted generation
+tool_call_stats = Counter()
+
+_JSON_TYPES = {"string": str, "integer": int, "number": (int, float), "boolean": bool, "array": list, "object": dict}
+
+
+async def run_tool(tool_name: str, tool_args: Dict[str, Any], semaphore: asyncio.Semaphore,
+                   session_id: Optional[str] = None) -> ToolResponse:
     """
-    process tool calls coming from the llm response
-    this function was created so that even an untrained llm which has the ability to execute function calls would be accommodated in this application
+    run a single tool under the concurrency cap and its own timeout.
+    on timeout the tool's task is cancelled; a sync tool running in a worker thread can't be interrupted,
+    but its result is discarded and the request no longer waits for it
     """
-    # Process tool calls
-    try:
-        if isinstance(response, dict):
-            # Check for tool_calls format
-            if 'message' in response and 'tool_calls' in response['message']:
-                for tool_call in response['message']['tool_calls']:
-                    try:
-                        tool_name = tool_call['function']['name']
-                        tool_args = json.loads(tool_call['function']['arguments'])
-                        tool_response = await execute_tool(tool_name, tool_args)
-                        tool_responses.append({
-                            "tool_name": tool_name,
-                            "result": tool_response
-                        })
-                    except Exception as e:
-                        print(f"Error executing tool {tool_name}: {str(e)}")
-                        tool_responses.append({
-                            "tool_name": tool_name,
-                            "error": str(e)
-                        })
-
-            # Check for direct function call in message content
-            elif 'message' in response and 'content' in response['message']:
+    timeout = Config.TOOL_TIMEOUTS.get(tool_name, Config.TOOL_TIMEOUT)
+    async with semaphore:
+        with span("tool", tool=tool_name) as attributes:
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(execute_tool(tool_name, tool_args, session_id), timeout=timeout)
+                response = ToolResponse(tool_name=tool_name, result=result)
+                attributes["status"] = "ok"
+            except asyncio.TimeoutError:
+                logger.warning(f"Tool {tool_name} timed out after {timeout}s")
+                response = ToolResponse(tool_name=tool_name, error=f"Timed out after {timeout}s")
+                attributes["status"] = "timeout"
+            except asyncio.CancelledError:
+                attributes["status"] = "cancelled"
+                raise
+            except Exception as e:
+                logger.error(f"Error executing tool {tool_name}: {str(e)}")
+                response = ToolResponse(tool_name=tool_name, error=str(e))
+                attributes["status"] = "error"
+            finally:
+                metrics.observe("llm_tool_seconds", time.perf_counter() - start, tool=tool_name,
+                                status=attributes.get("status", "error"))
+        return response
+
+
+async def run_tools(calls: List[Tuple[str, Dict[str, Any]]], session_id: Optional[str] = None,
+                    semaphore: Optional[asyncio.Semaphore] = None) -> List[ToolResponse]:
+    """
+    run independent tool calls concurrently, returning their results in the original order.
+    semaphore caps them at MAX_CONCURRENT_TOOLS (a new one unless the request's own is passed)
+    """
+    semaphore = semaphore or asyncio.Semaphore(Config.MAX_CONCURRENT_TOOLS)
+    return list(await asyncio.gather(*(run_tool(name, args, semaphore, session_id) for name, args in calls)))
+
+
+def _check_arguments(name: str, arguments: Any, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    if not isinstance(arguments, dict):
+        raise ToolCallParseError(f"arguments of {name} must be an object, got {type(arguments).__name__}")
+    properties = parameters.get("properties", {})
+    missing = [key for key in parameters.get("required", []) if key not in arguments]
+    if missing:
+        raise ToolCallParseError(f"{name} is missing required argument(s) {missing}")
+    for key, value in arguments.items():
+        if key not in properties:
+            raise ToolCallParseError(f"{name} has no argument {key!r}")
+        expected = _JSON_TYPES.get(properties[key].get("type"))
+        if expected is not None and value is not None and not isinstance(value, expected):
+            raise ToolCallParseError(f"argument {key!r} of {name} should be {properties[key]['type']}")
+    return arguments
+
+
+def parse_tool_calls(response, tools: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[ToolCall], Optional[str]]:
+    """
+    one strict parse of the first pass: native tool_calls, or JSON content that is either a single call
+    {"name", "arguments"} or an answer {"message"}. returns (calls, answer); with tools given, calls are checked
+    against their parameter schemas. anything else raises ToolCallParseError instead of being dropped
+    """
+    message = response['message']
+    schemas = {tool["function"]["name"]: tool["function"].get("parameters") or {} for tool in tools or []}
+
+    raw_calls = []
+    if message.get('tool_calls'):
+        for tool_call in message['tool_calls']:
+            arguments = tool_call['function']['arguments']
+            if isinstance(arguments, str):
                 try:
-                    # Try to parse the content as JSON
-                    content = json.loads(response['message']['content'])
-                    if isinstance(content, dict) and 'name' in content and 'arguments' in content:
-                        tool_name = content['name']
-                        # Handle both string and dict arguments
-                        if isinstance(content['arguments'], str):
-                            tool_args = json.loads(content['arguments'].replace("'", '"'))
-                        else:
-                            tool_args = content['arguments']
-
-                        tool_response = await execute_tool(tool_name, tool_args)
-                        tool_responses.append({
-                            "tool_name": tool_name,
-                            "result": tool_response
-                        })
-                except json.JSONDecodeError:
-                    # Content is not JSON, treat as regular response
-                    pass
-                except Exception as e:
-                    print(f"Error processing tool call: {str(e)}")
-
-    except Exception as e:
-        print(f"Error processing response: {str(e)}")
-
-    return tool_responses
+                    arguments = json.loads(arguments)
+                except json.JSONDecodeError as e:
+                    raise ToolCallParseError(f"arguments of {tool_call['function']['name']} aren't JSON: {e}")
+            raw_calls.append((tool_call['function']['name'], arguments))
+        answer = None
+    else:
+        content = message.get('content') or ""
+        try:
+            payload = json.loads(content)
+        except json.JSONDecodeError:
+            # plain text is an answer (e.g. a backend without JSON mode), but not when it looks like a broken call
+            if content.lstrip().startswith("{"):
+                raise ToolCallParseError(f"malformed JSON in first pass: {content[:200]!r}")
+            return [], content
+        if not isinstance(payload, dict):
+            raise ToolCallParseError(f"first pass returned a JSON {type(payload).__name__}, expected an object")
+        if "name" in payload:
+            raw_calls.append((payload["name"], payload.get("arguments", {})))
+            answer = None
+        elif isinstance(payload.get("message", payload.get("content")), str):
+            answer = payload.get("message", payload.get("content"))
+        else:
+            raise ToolCallParseError(f"first pass is neither a tool call nor an answer: {content[:200]!r}")
+
+    calls = []
+    for name, arguments in raw_calls:
+        if tools is not None:
+            if name not in schemas:
+                raise ToolCallParseError(f"unknown tool {name!r}")
+            arguments = _check_arguments(name, arguments, schemas[name])
+        calls.append(ToolCall(name=name, arguments=arguments))
+    return calls, answer
+
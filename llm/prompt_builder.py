@@ -0,0 +1,107 @@
+import math
+from typing import Any, Dict, List, Tuple
+
+from llm.config import Config
+from llm.models.message import Message, ToolResponse
+from llm.models.prompt_stats import PromptStats
+from llm.tool_registry import tools_prompt
+
+HISTORY_HEADER = "Recent conversation history:\n"
+TRUNCATED_MARKER = "\n[truncated]"
+
+
+def estimate_tokens(text: str) -> int:
+    """cheap token estimate (llama tokenizers average ~4 bytes per token on english text)"""
+    return math.ceil(len(text.encode("utf-8")) / Config.CHARS_PER_TOKEN)
+
+
+class PromptBuilder:
+    """
+    assembles the messages for both passes within PROMPT_TOKEN_BUDGET.
+    the system message is built once and reused as the same object for every request, so the prompt prefix
+    stays byte-identical and ollama can reuse its kv cache for it; the history follows it, so both passes of a
+    request share the system + history prefix, and what differs between the passes (the tools, the tool
+    results) comes after that.
+    history gets at most HISTORY_TOKEN_SHARE of the budget and is trimmed oldest-first, and dropped turns are folded into a one-line summary of their questions
+    """
+
+    def __init__(self, system_prompt: str, budget: int = Config.PROMPT_TOKEN_BUDGET):
+        self.system_message = Message(role="system", content=system_prompt)
+        self.system_tokens = estimate_tokens(system_prompt)
+        self.budget = budget
+
+    def build(self, user_input: str, history: List[str]) -> Tuple[List[Message], PromptStats]:
+        stats = PromptStats(budget=self.budget, system_tokens=self.system_tokens,
+                            user_tokens=estimate_tokens(user_input))
+        # history may take HISTORY_TOKEN_SHARE of what's left, the rest is kept for the tool results
+        available = int((self.budget - stats.system_tokens - stats.user_tokens) * Config.HISTORY_TOKEN_SHARE)
+        available -= estimate_tokens(HISTORY_HEADER)
+
+        # newest turns first, keep as many as fit
+        kept = []
+        used = 0
+        for turn in reversed(history):
+            cost = estimate_tokens(turn) + 1
+            if used + cost > available:
+                break
+            kept.append(turn)
+            used += cost
+        kept.reverse()
+        dropped = history[:len(history) - len(kept)]
+
+        lines = kept
+        if dropped:
+            summary = self._summarize(dropped, available - used)
+            if summary:
+                lines = [summary] + kept
+        history_text = HISTORY_HEADER + "\n".join(lines)
+
+        stats.history_turns = len(kept)
+        stats.dropped_turns = len(dropped)
+        stats.history_tokens = estimate_tokens(history_text)
+        messages = [
+            self.system_message,
+            Message(role="system", content=history_text),
+            Message(role="user", content=user_input)
+        ]
+        return messages, stats
+
+    def first_pass_messages(self, messages: List[Message], stats: PromptStats,
+                            tools: List[Dict[str, Any]]) -> List[Message]:
+        """
+        the messages for the first pass: in "prompt" mode the selected tools go after the system message and the
+        history, just before the question, so the first and second pass share the system + history prefix (the
+        second pass reuses its kv cache) and the second pass doesn't pay for the tools
+        """
+        stats.selected_tools = [tool["function"]["name"] for tool in tools]
+        if Config.TOOL_SCHEMA_MODE != "prompt":
+            return messages
+        tools_message = Message(role="system", content=tools_prompt(tools))
+        stats.tool_schema_tokens = estimate_tokens(tools_message.content)
+        return messages[:-1] + [tools_message, messages[-1]]
+
+    @staticmethod
+    def _summarize(turns: List[str], budget: int) -> str:
+        """extractive summary: just the user side of the dropped turns, cut to the remaining budget"""
+        questions = [turn.split(", Assistant:", 1)[0].removeprefix("User: ").strip() for turn in turns]
+        summary = f"({len(turns)} earlier turns omitted; they asked about: " + "; ".join(questions) + ")"
+        max_chars = max(0, budget * Config.CHARS_PER_TOKEN)
+        if max_chars < 40:
+            return ""
+        return summary if len(summary) <= max_chars else summary[:max_chars - 4] + "...)"
+
+    def add_tool_results(self, messages: List[Message], stats: PromptStats,
+                         tool_responses: List[ToolResponse]) -> None:
+        """append tool results for the second pass, truncating them to what is left of the budget"""
+        results = [r for r in tool_responses if r.error is None and r.result != "SKIP"]
+        for index, tool_response in enumerate(results):
+            content = str(tool_response.result)
+            # split what's left evenly between the remaining results
+            share = (self.budget - stats.total_tokens) // (len(results) - index)
+            max_chars = max(0, share * Config.CHARS_PER_TOKEN)
+            if len(content.encode("utf-8")) > max_chars:
+                max_chars = max(0, max_chars - len(TRUNCATED_MARKER))
+                content = content.encode("utf-8")[:max_chars].decode("utf-8", errors="ignore") + TRUNCATED_MARKER
+                stats.truncated_tool_results += 1
+            stats.tool_tokens += estimate_tokens(content)
+            messages.append(Message(role="function", name=tool_response.tool_name, content=content))
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from llm.config import Config
+from llm.shared_state import get_shared_state
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+_FILE_NAME = re.compile(r"[\w.-]+(?:" + "|".join(re.escape(ext) for ext in Config.TRACKED_FILE_EXTENSIONS) + r")\b")
+
+
+def normalize_input(text: str) -> str:
+    """case, whitespace and trailing punctuation don't change the question"""
+    return " ".join(text.lower().split()).rstrip(" ?!.")
+
+
+def referenced_files(text: str, manifest: Dict[str, Dict]) -> Dict[str, str]:
+    """{path: file_hash} of the tracked files whose name appears in text (tool calls, tool results, answer)"""
+    names = set(_FILE_NAME.findall(text))
+    if not names:
+        return {}
+    return {path: entry.get("file_hash") for path, entry in manifest.items() if path.rsplit("/", 1)[-1] in names}
+
+
+def is_stale(dependencies: Dict[str, Optional[str]], manifest: Optional[Dict[str, Dict]]) -> bool:
+    """whether a data file an answer was built on has changed (or is gone) since, going by the current manifest"""
+    if manifest is None:
+        return False
+    return any((manifest.get(path) or {}).get("file_hash") != file_hash for path, file_hash in dependencies.items())
+
+
+@dataclass
+class CacheEntry:
+    answer: str
+    normalized_input: str
+    created: float
+    dependencies: Dict[str, str] = field(default_factory=dict)  # file path -> file_hash the answer was built on
+    embedding: Optional[np.ndarray] = None
+
+
+class ResponseCache:
+    """
+    answers of earlier turns, keyed by the normalized input, the model and a hash of the system prompt.
+    the key has no session in it: LLMRunner only caches (and looks up) turns without conversation history that
+    called no session-scoped tool, so an answer never carries one session's context into another. that makes it
+    a cache of first questions: a session with history never hits it (in console mode, with its single
+    "default" session, only the very first turn can), its value is in many sessions opening with the same question.
+    each entry keeps the file_hash of every data file it was built on, and get compares them with the current
+    manifest: a changed or deleted file is a miss, whether or not an invalidation event reached this process.
+    an exact-match layer is always on; with RESPONSE_CACHE_SEMANTIC an input whose embedding is at least
+    RESPONSE_CACHE_SIMILARITY cosine-similar to a cached one is a hit as well.
+    entries expire after RESPONSE_CACHE_TTL, the least recently used are evicted beyond RESPONSE_CACHE_SIZE,
+    and an entry is dropped as soon as one of its data files changes (FileTracker listeners, or the check on get).
+    with SHARED_STATE_PATH set the entries live in the shared sqlite state, so all worker processes share them
+    """
+
+    def __init__(self, model_name: str, system_prompt: str, embed: Optional[Callable[[List[str]], List]] = None,
+                 max_size: int = Config.RESPONSE_CACHE_SIZE, ttl: float = Config.RESPONSE_CACHE_TTL):
+        self.model_name = model_name
+        self.system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        self.embed = embed if Config.RESPONSE_CACHE_SEMANTIC else None
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = get_shared_state()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+
+    def key(self, normalized_input: str) -> str:
+        return hashlib.sha256(
+            json.dumps([normalized_input, self.model_name, self.system_hash]).encode("utf-8")
+        ).hexdigest()
+
+    async def _embedding(self, normalized_input: str) -> np.ndarray:
+        vector = np.asarray((await asyncio.to_thread(self.embed, [normalized_input]))[0], dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    async def get(self, user_input: str, manifest: Optional[Dict[str, Dict]] = None) -> Optional[str]:
+        """the cached answer, if there is one whose data files still have the hashes in manifest"""
+        if self.shared is not None:
+            return await self._get_shared(user_input, manifest)
+        normalized = normalize_input(user_input)
+        key = self.key(normalized)
+        now = time.time()
+        with self._lock:
+            for expired in [k for k, e in self._entries.items()
+                            if now - e.created > self.ttl or is_stale(e.dependencies, manifest)]:
+                del self._entries[expired]
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits["exact"] += 1
+                return entry.answer
+            if self.embed is None or not self._entries:
+                self.misses += 1
+                return None
+
+        query = await self._embedding(normalized)
+        with self._lock:
+            candidates = [(k, e) for k, e in self._entries.items() if e.embedding is not None]
+            if candidates:
+                similarities = np.stack([e.embedding for _, e in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= Config.RESPONSE_CACHE_SIMILARITY:
+                    best_key, entry = candidates[best]
+                    self._entries.move_to_end(best_key)
+                    self.hits["semantic"] += 1
+                    logger.info(f"Semantic cache hit ({similarities[best]:.3f}): '{normalized}' ~ "
+                                f"'{entry.normalized_input}'")
+                    return entry.answer
+            self.misses += 1
+        return None
+
+    async def _valid_shared(self, key: str, manifest: Optional[Dict[str, Dict]]) -> bool:
+        if manifest is None or not is_stale(await asyncio.to_thread(self.shared.response_dependencies, key), manifest):
+            return True
+        await asyncio.to_thread(self.shared.response_delete, key)
+        return False
+
+    async def _get_shared(self, user_input: str, manifest: Optional[Dict[str, Dict]]) -> Optional[str]:
+        normalized = normalize_input(user_input)
+        key = self.key(normalized)
+        answer = await asyncio.to_thread(self.shared.response_get, key, self.ttl)
+        if answer is not None and await self._valid_shared(key, manifest):
+            self.hits["exact"] += 1
+            return answer
+        if self.embed is not None:
+            candidates = await asyncio.to_thread(self.shared.response_candidates, self.ttl)
+            if candidates:
+                query = await self._embedding(normalized)
+                similarities = np.stack([np.frombuffer(c[3], dtype=np.float32) for c in candidates]) @ query
+                best = int(np.argmax(similarities))
+                best_key, cached_input, answer, _ = candidates[best]
+                if similarities[best] >= Config.RESPONSE_CACHE_SIMILARITY and \
+                        await self._valid_shared(best_key, manifest):
+                    await asyncio.to_thread(self.shared.response_touch, best_key)
+                    self.hits["semantic"] += 1
+                    logger.info(f"Semantic cache hit ({similarities[best]:.3f}): '{normalized}' ~ '{cached_input}'")
+                    return answer
+        self.misses += 1
+        return None
+
+    async def put(self, user_input: str, answer: str, dependencies: Optional[Dict[str, str]] = None) -> None:
+        normalized = normalize_input(user_input)
+        embedding = await self._embedding(normalized) if self.embed is not None else None
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.response_put, self.key(normalized), answer, normalized,
+                                    dependencies or {}, embedding.tobytes() if embedding is not None else None,
+                                    self.max_size)
+            return
+        entry = CacheEntry(answer=answer, normalized_input=normalized, created=time.time(),
+                           dependencies=dependencies or {}, embedding=embedding)
+        with self._lock:
+            self._entries[self.key(normalized)] = entry
+            self._entries.move_to_end(self.key(normalized))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_files(self, file_paths: Iterable[str]) -> None:
+        """drop every entry built on one of these files (FileTracker calls this with changed/deleted paths)"""
+        file_paths = set(file_paths)
+        if not file_paths:
+            return
+        if self.shared is not None:
+            invalidated = self.shared.response_invalidate(file_paths)
+        else:
+            with self._lock:
+                stale = [k for k, e in self._entries.items() if file_paths.intersection(e.dependencies)]
+                for key in stale:
+                    del self._entries[key]
+            invalidated = len(stale)
+        if invalidated:
+            logger.info(f"Invalidated {invalidated} cached response(s) after data file changes")
+
+    def clear(self) -> None:
+        if self.shared is not None:
+            self.shared.response_clear()
+        with self._lock:
+            self._entries.clear()
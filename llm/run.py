@@ -3,85 +3,362 @@
 """imports"""
 import asyncio
 import os
-from typing import List, Optional
-from constants.llama_config import model, system, tools
+import time
+from typing import Any, AsyncIterator, List, Optional, Tuple
+from constants import llama_config
 from llm.chat_manager import ChatManager
 from llm.db_manager import DatabaseManager
 from llm.file_tracker import FileTracker
-from llm.models.message import Message
+from llm.models.message import ToolResponse
+from llm.models.tool_call import ToolCall, ToolCallParseError
+from llm.models.prompt_stats import PromptStats
+from llm.models.turn import PreparedTurn
 from llm.config import Config
 from llm.utils.logging_config import setup_logging
-from process_tool_calls import process_tool_calls
-from extract_content import extract_content
+
+try:
+    from llm.process_tool_calls import parse_tool_calls, run_tools, tool_call_stats
+    from llm.execute_tool import is_session_scoped
+    from llm.extract_content import extract_content, StreamingContentExtractor
+    from llm.prompt_builder import PromptBuilder
+    from llm.tool_registry import ToolRegistry, get_tool_registry, tool_call_schema
+    from llm.response_cache import ResponseCache, referenced_files
+    from llm.prefetch import SpeculativePrefetcher
+    from llm.tracing import Tracer, current_trace, span
+except ImportError:
+    from process_tool_calls import parse_tool_calls, run_tools, tool_call_stats
+    from execute_tool import is_session_scoped
+    from extract_content import extract_content, StreamingContentExtractor
+    from prompt_builder import PromptBuilder
+    from tool_registry import ToolRegistry, get_tool_registry, tool_call_schema
+    from response_cache import ResponseCache, referenced_files
+    from prefetch import SpeculativePrefetcher
+    from tracing import Tracer, current_trace, span
 
 logger = setup_logging()
 
 
 class LLMRunner:
-    def __init__(self):
+    def __init__(self, db_manager: Optional[DatabaseManager] = None, chat_manager: Optional[ChatManager] = None,
+                 file_tracker: Optional[FileTracker] = None, tool_registry: Optional[ToolRegistry] = None):
         os.environ["TOKENIZERS_PARALLELISM"] = Config.TOKENIZERS_PARALLELISM
-        self.db_manager = DatabaseManager()
-        self.chat_manager = ChatManager(model, system)
-        self.file_tracker = FileTracker(self.db_manager)
-
-    async def run(self, user_input: str) -> str:
-       try:
-           # Scan CSV files
-           self.file_tracker.scan_csv_files()
-
-           # Get conversation history
-           conversation_history = self.db_manager.get_recent_conversations(user_input)
-
-           # Prepare initial messages
-           messages = [
-               Message(role="system", content=system),
-               Message(role="system", content=f"Recent conversation history:\n{conversation_history}"),
-               Message(role="user", content=user_input)
-           ]
-
-           # Get initial response and process tool calls
-           initial_response = await self.chat_manager.get_initial_response(messages, tools)
-           print(f"init: {initial_response}\n")
-           tool_responses = await process_tool_calls(initial_response)
-           print(f"tool responses: {tool_responses}\n")
-
-           # Add successful tool responses to messages
-           for tool_response in tool_responses:
-               if "error" not in tool_response and "SKIP" not in tool_response:
-                   messages.append(Message(
-                       role="function",
-                       name=tool_response["tool_name"],
-                       content=tool_response["result"]
-                   ))
-               else:
-                   logger.warning(f"Skipping tool response due to error: {tool_response["error"]}")
-
-           # Get and process final response
-           final_response = await self.chat_manager.get_final_response(messages)
-           print(f"final response: {final_response}\n")
-           self.db_manager.store_conversation(user_input, final_response)
-
-           return extract_content(final_response)
-
-       except Exception as e:
-           logger.error(f"Error in the run function: {e}")
-           return f"Error in the run function: {str(e)}"
+        model, system = llama_config.model, llama_config.system
+        self.db_manager = db_manager or DatabaseManager()
+        self.chat_manager = chat_manager or ChatManager(model, system)
+        self.file_tracker = file_tracker or FileTracker(self.db_manager)
+        if Config.FILE_SCAN_MODE == "background":
+            self.file_tracker.start_watching()
+        self.path_counts = {"cache": 0, "fast_path": 0, "two_pass": 0}
+        self.prompt_builder = PromptBuilder(system)
+        self.tool_registry = tool_registry or get_tool_registry()
+        self.last_prompt_stats: Optional[PromptStats] = None
+        self.response_cache = None
+        if Config.RESPONSE_CACHE_ENABLED:
+            embed = getattr(self.db_manager, "embedding_cache", None)
+            self.response_cache = ResponseCache(model, system, embed=embed.embed if embed else None)
+            self.file_tracker.listeners.append(self.response_cache.invalidate_files)
+        self.prefetcher = SpeculativePrefetcher(self.tool_registry) if Config.PREFETCH_ENABLED else None
+        self.tracer = Tracer()
+        self.readiness = {}
+        self.warmed_up = False  # warm_up has run (or isn't wanted)
+        self.warm_up_task: Optional[asyncio.Task] = None  # set when warm_up runs in the background (server mode)
+
+    async def warm_up(self) -> None:
+        """
+        open, concurrently, what the first request would otherwise wait for: chroma and the embedding model,
+        the model on the backend (PRELOAD_MODEL) and the station index. readiness holds the state of each part,
+        ready turns true when it's done (and memory is open); whatever failed is retried on first use
+        """
+        parts = {}
+        if hasattr(self.db_manager, "warm_up"):
+            parts["memory"] = asyncio.to_thread(self.db_manager.warm_up)
+        if Config.PRELOAD_MODEL:
+            parts["model"] = self.chat_manager.preload()
+        if Config.WARM_UP_STATION_INDEX:
+            parts["stations"] = self._load_station_index()
+        self.readiness = {name: "pending" for name in parts}
+
+        async def warm(name, part):
+            try:
+                with span(f"warm_up_{name}"):
+                    await part
+                self.readiness[name] = "ready"
+            except Exception as e:
+                self.readiness[name] = f"failed: {e}"
+                logger.warning(f"Warm-up of {name} failed: {e}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(warm(name, part) for name, part in parts.items()))
+        self.warmed_up = True
+        logger.info(f"Warm-up took {time.perf_counter() - start:.2f} s: {self.readiness}")
+
+    @property
+    def ready(self) -> bool:
+        """
+        warm-up finished and memory open. checked live, so memory that failed to warm up but was opened by a
+        request later counts (and its readiness entry is updated)
+        """
+        if not self.warmed_up:
+            return False
+        if self.readiness.get("memory", "ready") != "ready":
+            if not getattr(self.db_manager, "is_open", False):
+                return False
+            self.readiness["memory"] = "ready"
+        return True
+
+    async def close(self) -> None:
+        """flush buffered conversation turns and pending traces, stop the file watcher and close connections"""
+        if self.warm_up_task is not None:
+            self.warm_up_task.cancel()
+        await asyncio.to_thread(self.file_tracker.stop_watching)
+        await self.db_manager.close()
+        await self.chat_manager.close()
+        self.tracer.close()
+
+    @staticmethod
+    async def _load_station_index() -> None:
+        # imports the sea level tools' dependencies (pandas, httpx) too
+        from functions.station_index import get_station_index
+        await get_station_index()
+
+    def _record_path(self, path: str) -> None:
+        self.path_counts[path] += 1
+        trace = current_trace()
+        if trace is not None:
+            trace.path = path
+        logger.info(f"Request served via {path} (counts: {self.path_counts})")
+
+    def _record_prompt_stats(self, stats: PromptStats) -> None:
+        self.last_prompt_stats = stats
+        logger.info(f"Prompt tokens: {stats.to_dict()}")
+
+    @staticmethod
+    def _fast_path_answer(initial_response, tool_responses: List[ToolResponse]) -> Optional[str]:
+        """
+        the first pass's own answer, if it can be returned without a second pass:
+        no tool other than the SKIP-style ones ran, and the content is actual text (not a tool call)
+        """
+        if not Config.FAST_PATH_ENABLED:
+            return None
+        for tool_response in tool_responses:
+            if tool_response.tool_name not in Config.FAST_PATH_SKIP_TOOLS and tool_response.result != "SKIP":
+                return None
+
+        answer = extract_content(initial_response)
+        if isinstance(answer, str) and answer.strip():
+            return answer
+        return None
+
+    async def _scan_files(self) -> None:
+        # Scan CSV files (in background mode the watcher keeps metadata current instead)
+        if Config.FILE_SCAN_MODE != "background":
+            with span("file_scan"):
+                await asyncio.to_thread(self.file_tracker.scan_csv_files)
+
+    async def _history(self, user_input: str, session_id: str) -> list:
+        with span("history") as attributes:
+            conversation_history = await self.db_manager.get_recent_turns(user_input, session_id)
+            attributes["turns"] = len(conversation_history)
+        return conversation_history
+
+    async def _prepare_messages(self, user_input: str, session_id: str, conversation_history: list) -> PreparedTurn:
+        """everything before the second pass: prompt, first pass and tool calls"""
+        # Fit the conversation history into the token budget
+        with span("prompt_build"):
+            messages, stats = self.prompt_builder.build(user_input, conversation_history)
+
+            # Get initial response (with only the tools relevant to this input) and run the tools it calls
+            selected_tools = self.tool_registry.select(user_input)
+            first_pass = self.prompt_builder.first_pass_messages(messages, stats, selected_tools)
+        tool_slots = asyncio.Semaphore(Config.MAX_CONCURRENT_TOOLS)
+        speculation = self.prefetcher.start(user_input, selected_tools, session_id, tool_slots) \
+            if self.prefetcher else None
+        prefetched = {}
+        try:
+            initial_response, calls, parsed = await self._first_pass(first_pass, selected_tools, stats)
+            if speculation is not None:
+                prefetched = await self.prefetcher.claim(speculation, calls)
+        finally:
+            if speculation is not None:
+                await self.prefetcher.cancel(speculation)
+        logger.debug(f"First pass: {initial_response['message']}")
+        pending = [i for i in range(len(calls)) if i not in prefetched]
+        with span("tools", calls=len(calls), prefetched=len(prefetched)):
+            results = await run_tools([(calls[i].name, calls[i].arguments) for i in pending], session_id, tool_slots)
+        tool_responses = [prefetched.get(i) for i in range(len(calls))]
+        for i, result in zip(pending, results):
+            tool_responses[i] = result
+        logger.debug(f"Tool responses: {tool_responses}")
+
+        turn = PreparedTurn(messages=messages, stats=stats, tool_calls=str(initial_response['message']),
+                            tool_errors=any(r.error is not None for r in tool_responses),
+                            cacheable=parsed and not conversation_history
+                            and not any(is_session_scoped(c.name) for c in calls))
+        if not parsed:
+            # the unusable first pass (e.g. a truncated call) must not reach the user: answer in a second pass
+            return turn
+        turn.fast_answer = self._fast_path_answer(initial_response, tool_responses)
+        if turn.fast_answer is not None:
+            return turn
+
+        # Add successful tool responses to messages, truncated to what's left of the budget
+        for tool_response in tool_responses:
+            if tool_response.error is not None:
+                logger.warning(f"Skipping {tool_response.tool_name} response due to error: {tool_response.error}")
+        self.prompt_builder.add_tool_results(messages, stats, tool_responses)
+
+        return turn
+
+    async def _first_pass(self, messages, selected_tools, stats: PromptStats) -> Tuple[Any, List[ToolCall], bool]:
+        """
+        first pass with its output constrained to a call of one of the selected tools (or a plain answer),
+        parsed strictly; output that still doesn't parse is retried up to TOOL_CALL_MAX_RETRIES times.
+        returns (response, calls, parsed), parsed is false when every attempt failed
+        """
+        native = Config.TOOL_SCHEMA_MODE == "native"
+        constrained = Config.TOOL_CALL_CONSTRAINED and not native
+        request_format = tool_call_schema(selected_tools) if constrained else "json"
+        for attempt in range(Config.TOOL_CALL_MAX_RETRIES + 1):
+            stats.first_pass_attempts += 1
+            initial_response = await self.chat_manager.get_initial_response(
+                messages, selected_tools if native else None, request_format
+            )
+            stats.first_pass_prompt_tokens = initial_response.get('prompt_eval_count')
+            try:
+                calls, _ = parse_tool_calls(initial_response, self.tool_registry.tools)
+                tool_call_stats["parsed"] += 1
+                return initial_response, calls, True
+            except (ToolCallParseError, KeyError, TypeError) as e:
+                tool_call_stats["parse_failures"] += 1
+                logger.warning(f"Unusable first pass (attempt {attempt + 1}): {e}")
+                if attempt < Config.TOOL_CALL_MAX_RETRIES:
+                    tool_call_stats["retries"] += 1
+        return initial_response, [], False
+
+    async def _cache_answer(self, user_input: str, turn: PreparedTurn, answer: str) -> None:
+        """remember the answer together with the hashes of the data files it was built on"""
+        if (self.response_cache is None or not turn.cacheable or turn.tool_errors or not isinstance(answer, str)
+                or not answer.strip()):
+            return
+        with span("cache_put"):
+            if turn.fast_answer is None:
+                # tools may have written data files, pick up their new hashes before recording the dependencies
+                await asyncio.to_thread(self.file_tracker.scan_csv_files)
+            text = "\n".join([turn.tool_calls, answer] + [m.content for m in turn.messages if m.role == "function"])
+            await self.response_cache.put(user_input, answer, referenced_files(text, self.file_tracker.manifest))
+
+    async def _finish(self, user_input: str, session_id: str, turn: PreparedTurn, answer: str) -> None:
+        self._record_prompt_stats(turn.stats)
+        with span("store"):
+            await self.db_manager.store_conversation(user_input, answer, session_id)
+        await self._cache_answer(user_input, turn, answer)
+
+    async def _cached_answer(self, user_input: str, session_id: str, conversation_history: list) -> Optional[str]:
+        """
+        a cached answer, only for a turn without history: answers are shared between sessions, so nothing
+        session-specific may go into them or decide whether they apply
+        """
+        await self._scan_files()
+        if self.response_cache is None or conversation_history:
+            return None
+        with span("cache_lookup") as attributes:
+            answer = await self.response_cache.get(user_input, self.file_tracker.manifest)
+            attributes["hit"] = answer is not None
+        if answer is not None:
+            self._record_path("cache")
+            with span("store"):
+                await self.db_manager.store_conversation(user_input, answer, session_id)
+        return answer
+
+    async def run(self, user_input: str, session_id: str = "default") -> str:
+        with self.tracer.trace(session_id) as trace:
+            try:
+                conversation_history = await self._history(user_input, session_id)
+                cached = await self._cached_answer(user_input, session_id, conversation_history)
+                if cached is not None:
+                    return cached
+
+                turn = await self._prepare_messages(user_input, session_id, conversation_history)
+                if turn.fast_answer is not None:
+                    self._record_path("fast_path")
+                    await self._finish(user_input, session_id, turn, turn.fast_answer)
+                    return turn.fast_answer
+
+                # Get and process final response
+                self._record_path("two_pass")
+                final_response = await self.chat_manager.get_final_response(turn.messages)
+                logger.debug(f"Second pass: {final_response['message']}")
+                turn.stats.second_pass_prompt_tokens = final_response.get('prompt_eval_count')
+                answer = extract_content(final_response)
+                await self._finish(user_input, session_id, turn, answer)
+
+                return answer
+
+            except Exception as e:
+                logger.error(f"Error in the run function: {e}")
+                trace.error = str(e)
+                return f"Error in the run function: {str(e)}"
+
+    async def run_stream(self, user_input: str, session_id: str = "default") -> AsyncIterator[str]:
+        """streaming variant of run: yields the answer text as the second pass generates it"""
+        extractor = StreamingContentExtractor()
+        with self.tracer.trace(session_id) as trace:
+            try:
+                conversation_history = await self._history(user_input, session_id)
+                cached = await self._cached_answer(user_input, session_id, conversation_history)
+                if cached is not None:
+                    yield cached
+                    return
+
+                turn = await self._prepare_messages(user_input, session_id, conversation_history)
+                if turn.fast_answer is not None:
+                    self._record_path("fast_path")
+                    await self._finish(user_input, session_id, turn, turn.fast_answer)
+                    yield turn.fast_answer
+                    return
+
+                self._record_path("two_pass")
+                usage = {}
+                async for chunk in self.chat_manager.stream_final_response(turn.messages, usage):
+                    text = extractor.feed(chunk)
+                    if text:
+                        yield text
+
+                text = extractor.finish()
+                if text:
+                    yield text
+                turn.stats.second_pass_prompt_tokens = usage.get("prompt_eval_count")
+                await self._finish(user_input, session_id, turn, extractor.text)
+
+            except Exception as e:
+                logger.error(f"Error in the run_stream function: {e}")
+                trace.error = str(e)
+                yield f"Error in the run function: {str(e)}"
 
 async def main():
     runner = LLMRunner()
+    if Config.WARM_UP_ENABLED:
+        await runner.warm_up()
     while True:
         try:
             user_input = input("> ")
             if user_input.lower() == "exit":
                 break
-            result = await runner.run(user_input)
-            print("Assistant:", result)
+            if Config.STREAM_CONSOLE_OUTPUT:
+                print("Assistant: ", end="", flush=True)
+                async for chunk in runner.run_stream(user_input):
+                    print(chunk, end="", flush=True)
+                print()
+            else:
+                result = await runner.run(user_input)
+                print("Assistant:", result)
         except KeyboardInterrupt:
             print("\nExiting...")
             break
         except Exception as e:
             logger.error(f"Error in main loop: {e}")
             print(f"An error occurred: {str(e)}")
+    await runner.close()
 
 if __name__ == "__main__":
     if os.name == 'nt':
@@ -0,0 +1,185 @@
+import asyncio
+import weakref
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, List
+
+from llm.config import Config
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+_DONE = object()
+_model_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def model_slots(model_name: str) -> asyncio.Semaphore:
+    """
+    per-model limit on in-flight ollama calls, sized to the server's OLLAMA_NUM_PARALLEL.
+    calls beyond it would only queue inside ollama, where they can't be prioritised or rejected
+    """
+    slots = _model_slots.setdefault(asyncio.get_running_loop(), {})
+    if model_name not in slots:
+        slots[model_name] = asyncio.Semaphore(Config.OLLAMA_NUM_PARALLEL)
+    return slots[model_name]
+
+
+class SchedulerFull(Exception):
+    """raised by submit when the queue (or the session's share of it) is full; maps to HTTP 429"""
+
+
+@dataclass
+class _Job:
+    user_input: str
+    session_id: str
+    stream: bool
+    output: asyncio.Queue = field(default_factory=asyncio.Queue)
+    cancelled: bool = False
+
+
+class RequestScheduler:
+    """
+    serves many sessions concurrently on one event loop.
+    requests wait in per-session FIFO queues and SCHEDULER_WORKERS workers take them round-robin across
+    sessions, so one chatty session can't starve the others. a session runs one request at a time: it leaves
+    the rotation while its request runs (turns are read and stored in order, its python namespace isn't
+    shared by two calls) and rejoins at the back when it's done. the ollama calls themselves are capped by
+    model_slots, so the workers' tool calls and history lookups overlap the model's work instead of
+    piling up in ollama. beyond SCHEDULER_MAX_QUEUE waiting requests (or SCHEDULER_MAX_PER_SESSION for one
+    session) submit raises SchedulerFull
+    """
+
+    def __init__(self, runner, workers: int = Config.SCHEDULER_WORKERS, max_queue: int = Config.SCHEDULER_MAX_QUEUE,
+                 max_per_session: int = Config.SCHEDULER_MAX_PER_SESSION):
+        self.runner = runner
+        self.max_queue = max_queue
+        self.max_per_session = max_per_session
+        self._sessions: "OrderedDict[str, Deque[_Job]]" = OrderedDict()  # sessions that can run, in turn order
+        self._running: Dict[str, Deque[_Job]] = {}  # sessions with a request in progress, and their queued ones
+        self._waiting = 0
+        self._ready = asyncio.Condition()
+        self._workers: List[asyncio.Task] = [
+            asyncio.create_task(self._work(), name=f"scheduler-worker-{i}") for i in range(workers)
+        ]
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.accepting = True
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def stats(self) -> Dict[str, int]:
+        return {"waiting": self._waiting, "active": self.active, "completed": self.completed,
+                "rejected": self.rejected,
+                "sessions_waiting": len(self._sessions) + sum(1 for queue in self._running.values() if queue)}
+
+    async def _enqueue(self, job: _Job) -> None:
+        async with self._ready:
+            if not self.accepting:
+                self.rejected += 1
+                raise SchedulerFull("shutting down, try again later")
+            queue = self._running.get(job.session_id, self._sessions.get(job.session_id))
+            if self._waiting >= self.max_queue or (queue is not None and len(queue) >= self.max_per_session):
+                self.rejected += 1
+                raise SchedulerFull(f"{self._waiting} requests waiting, try again later")
+            if queue is None:
+                queue = self._sessions[job.session_id] = deque()
+            queue.append(job)
+            self._waiting += 1
+            if job.session_id not in self._running:
+                self._ready.notify()
+
+    async def _next_job(self) -> _Job:
+        async with self._ready:
+            await self._ready.wait_for(lambda: bool(self._sessions))
+            # round robin: take the oldest job of the first session in line; the session sits out until it's done
+            session_id, queue = self._sessions.popitem(last=False)
+            job = queue.popleft()
+            self._waiting -= 1
+            self._running[session_id] = queue
+            return job
+
+    async def _release(self, session_id: str) -> None:
+        """the session's request finished: back to the end of the line if more of its requests are waiting"""
+        async with self._ready:
+            queue = self._running.pop(session_id)
+            if queue:
+                self._sessions[session_id] = queue
+                self._ready.notify()
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._next_job()
+            if job.cancelled:
+                await self._release(job.session_id)
+                continue
+            self.active += 1
+            try:
+                if job.stream:
+                    chunks = self.runner.run_stream(job.user_input, job.session_id)
+                    try:
+                        async for chunk in chunks:
+                            if job.cancelled:
+                                break
+                            job.output.put_nowait(chunk)
+                    finally:
+                        await chunks.aclose()
+                else:
+                    job.output.put_nowait(await self.runner.run(job.user_input, job.session_id))
+            except Exception as e:
+                logger.error(f"Scheduled request for session {job.session_id} failed: {e}")
+                job.output.put_nowait(f"Error in the run function: {str(e)}")
+            finally:
+                self.active -= 1
+                self.completed += 1
+                job.output.put_nowait(_DONE)
+                await self._release(job.session_id)
+
+    async def submit(self, user_input: str, session_id: str = "default") -> str:
+        """queue a request and wait for its answer"""
+        job = _Job(user_input, session_id, stream=False)
+        await self._enqueue(job)
+        try:
+            return await job.output.get()
+        finally:
+            job.cancelled = True
+
+    async def submit_stream(self, user_input: str, session_id: str = "default") -> AsyncIterator[str]:
+        """
+        queue a streaming request and return the iterator over its chunks (raises SchedulerFull right away).
+        closing the iterator early (client went away) drops the request or stops its generation
+        """
+        job = _Job(user_input, session_id, stream=True)
+        await self._enqueue(job)
+        return self._chunks(job)
+
+    @staticmethod
+    async def _chunks(job: _Job) -> AsyncIterator[str]:
+        try:
+            while True:
+                chunk = await job.output.get()
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            job.cancelled = True
+
+    async def drain(self, timeout: float = Config.SHUTDOWN_TIMEOUT) -> bool:
+        """stop taking requests and wait up to timeout for the queued and running ones; False if some are left"""
+        self.accepting = False
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self._waiting or self.active:
+            if asyncio.get_running_loop().time() >= deadline:
+                logger.warning(f"Shutting down with {self._waiting} waiting and {self.active} running request(s)")
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
@@ -0,0 +1,231 @@
+"""
+process-safe local state for serving with several worker processes (see asgi.py).
+one sqlite database in WAL mode, shared by every worker on the host, holds the recent turns of each session,
+the response cache, and leases that let exactly one worker do a piece of shared work (scanning the data
+directory, writing a station's sea level file). off unless Config.SHARED_STATE_PATH is set
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from llm.config import Config
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, timestamp REAL NOT NULL, document TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id);
+CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, has_older INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY, answer TEXT NOT NULL, normalized_input TEXT NOT NULL, created REAL NOT NULL,
+    last_used REAL NOT NULL, embedding BLOB
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE TABLE IF NOT EXISTS response_files (key TEXT NOT NULL, file_path TEXT NOT NULL, file_hash TEXT);
+CREATE INDEX IF NOT EXISTS response_files_path ON response_files (file_path);
+CREATE INDEX IF NOT EXISTS response_files_key ON response_files (key);
+CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+"""
+
+
+class SharedState:
+    """
+    every thread of every process gets its own connection (re-opened after a fork); writes take the database
+    lock up front (BEGIN IMMEDIATE) and wait up to SHARED_STATE_TIMEOUT for it
+    """
+
+    def __init__(self, path: str = Config.SHARED_STATE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+        # databases created before answers recorded their files' hashes (their entries then never validate)
+        if "file_hash" not in [row[1] for row in connection.execute("PRAGMA table_info(response_files)")]:
+            connection.execute("ALTER TABLE response_files ADD COLUMN file_hash TEXT")
+
+    @property
+    def owner(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            # autocommit; transaction() opens the transactions explicitly
+            connection = sqlite3.connect(self.path, timeout=Config.SHARED_STATE_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    # recent conversation turns (the shared counterpart of DatabaseManager's per-process ring buffers)
+
+    def session_turns(self, session_id: str) -> Tuple[List[Tuple[float, str]], bool]:
+        """the session's buffered turns, oldest first, and whether chroma may hold older ones"""
+        connection = self._connection()
+        turns = connection.execute("SELECT timestamp, document FROM turns WHERE session_id = ? ORDER BY id",
+                                   (session_id,)).fetchall()
+        row = connection.execute("SELECT has_older FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        # a session no worker has seen since the state was created may have history in chroma
+        return turns, row is None or bool(row[0])
+
+    def append_turn(self, session_id: str, timestamp: float, document: str, keep: int) -> None:
+        """add a turn, keeping the session's last `keep`; a turn pushed out means chroma now has older ones"""
+        with self.transaction() as connection:
+            connection.execute("INSERT OR IGNORE INTO sessions (session_id, has_older) VALUES (?, 1)", (session_id,))
+            connection.execute("INSERT INTO turns (session_id, timestamp, document) VALUES (?, ?, ?)",
+                               (session_id, timestamp, document))
+            dropped = connection.execute(
+                "DELETE FROM turns WHERE session_id = ? AND id NOT IN "
+                "(SELECT id FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, keep)
+            ).rowcount
+            if dropped:
+                connection.execute("UPDATE sessions SET has_older = 1 WHERE session_id = ?", (session_id,))
+
+    def set_has_older(self, session_id: str, has_older: bool) -> None:
+        with self.transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO sessions (session_id, has_older) VALUES (?, ?)",
+                               (session_id, int(has_older)))
+
+    def prune_turns(self, cutoff: float) -> None:
+        """drop turns older than cutoff, and sessions left without turns"""
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM turns WHERE timestamp < ?", (cutoff,))
+            connection.execute("DELETE FROM sessions WHERE session_id NOT IN (SELECT DISTINCT session_id FROM turns)")
+
+    # response cache entries (see ResponseCache)
+
+    def response_get(self, key: str, ttl: float) -> Optional[str]:
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute("SELECT answer, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > ttl:
+                self._delete_responses(connection, [key])
+                return None
+            connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def response_candidates(self, ttl: float) -> List[Tuple[str, str, str, bytes]]:
+        """(key, normalized_input, answer, embedding) of every unexpired entry that has an embedding"""
+        return self._connection().execute(
+            "SELECT key, normalized_input, answer, embedding FROM responses WHERE embedding IS NOT NULL "
+            "AND created >= ?", (time.time() - ttl,)
+        ).fetchall()
+
+    def response_touch(self, key: str) -> None:
+        with self.transaction() as connection:
+            connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+
+    def response_dependencies(self, key: str) -> Dict[str, Optional[str]]:
+        """{file path: file_hash} the entry was built on"""
+        return dict(self._connection().execute(
+            "SELECT file_path, file_hash FROM response_files WHERE key = ?", (key,)
+        ).fetchall())
+
+    def response_delete(self, key: str) -> None:
+        with self.transaction() as connection:
+            self._delete_responses(connection, [key])
+
+    def response_put(self, key: str, answer: str, normalized_input: str, dependencies: Dict[str, str],
+                     embedding: Optional[bytes], max_size: int) -> None:
+        now = time.time()
+        with self.transaction() as connection:
+            self._delete_responses(connection, [key])
+            connection.execute("INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, answer, normalized_input, now, now, embedding))
+            connection.executemany("INSERT INTO response_files VALUES (?, ?, ?)",
+                                   [(key, path, file_hash) for path, file_hash in dependencies.items()])
+            evicted = [row[0] for row in connection.execute(
+                "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?", (max_size,)
+            )]
+            self._delete_responses(connection, evicted)
+
+    def response_invalidate(self, file_paths: Iterable[str]) -> int:
+        """drop the entries built on any of these files, returns how many"""
+        file_paths = list(file_paths)
+        with self.transaction() as connection:
+            stale = [row[0] for row in connection.execute(
+                f"SELECT DISTINCT key FROM response_files WHERE file_path IN ({','.join('?' * len(file_paths))})",
+                file_paths
+            )]
+            self._delete_responses(connection, stale)
+        return len(stale)
+
+    def response_clear(self) -> None:
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM responses")
+            connection.execute("DELETE FROM response_files")
+
+    @staticmethod
+    def _delete_responses(connection: sqlite3.Connection, keys: List[str]) -> None:
+        if keys:
+            connection.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in keys])
+            connection.executemany("DELETE FROM response_files WHERE key = ?", [(key,) for key in keys])
+
+    # leases
+
+    def acquire(self, name: str, ttl: float) -> bool:
+        """take (or renew) the named lease unless another owner holds an unexpired one"""
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute("SELECT owner, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != self.owner and row[1] > now:
+                return False
+            connection.execute("INSERT OR REPLACE INTO leases (name, owner, expires) VALUES (?, ?, ?)",
+                               (name, self.owner, now + ttl))
+            return True
+
+    def release(self, name: str) -> None:
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+    @contextmanager
+    def lock(self, name: str, ttl: float = Config.SHARED_LOCK_TTL, poll: float = 0.05) -> Iterator[None]:
+        """
+        block until the lease is ours (held at most ttl seconds, should its holder die), release on exit.
+        this sleeps while another process holds the lease, so never call it on the event loop (use a thread)
+        """
+        while not self.acquire(name, ttl):
+            time.sleep(poll)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+
+_shared_state = None
+_shared_state_lock = threading.Lock()
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """the process's handle on the shared state, None when SHARED_STATE_PATH isn't set (single process)"""
+    global _shared_state
+    if not Config.SHARED_STATE_PATH:
+        return None
+    with _shared_state_lock:
+        if _shared_state is None or _shared_state.path != Path(Config.SHARED_STATE_PATH):
+            _shared_state = SharedState(Config.SHARED_STATE_PATH)
+            logger.info(f"Sharing recent turns, cached responses and leases through {Config.SHARED_STATE_PATH}")
+    return _shared_state
@@ -0,0 +1,272 @@
+import ast
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from llm.config import Config
+from llm.utils.file_utils import get_file_signature
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+FUNCTIONS_DIR = Path(__file__).parent.parent / "functions"
+
+# parameters filled in by execute_tool, never shown to the model
+INJECTED_PARAMETERS = {"self", "session_id"}
+
+JSON_TYPES = {
+    "str": "string", "int": "integer", "float": "number", "bool": "boolean",
+    "list": "array", "List": "array", "Sequence": "array", "tuple": "array", "Tuple": "array",
+    "dict": "object", "Dict": "object", "Mapping": "object",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and any are as at be but by can do doe don for from get give has have how if in into is it its me my "
+    "no not of on or please show so than that the then there these this those to use used using was we what "
+    "when where which who why will with you your".split()
+)
+_ARG_LINE = re.compile(r"^\s*(\w+)\s*(?:\(([^)]*)\))?\s*:\s*(.+)$")
+
+
+def tokenize(text: str) -> List[str]:
+    """lowercase words with a crude plural strip, shared by the tool documents and the query"""
+    words = []
+    for word in _WORD.findall(text.lower().replace("_", " ")):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        if len(word) > 1 and word not in _STOPWORDS:
+            words.append(word)
+    return words
+
+
+def _json_type(annotation: Optional[str]) -> str:
+    if not annotation:
+        return "string"
+    annotation = annotation.replace("typing.", "")
+    optional = re.fullmatch(r"Optional\[(.+)\]", annotation)
+    if optional:
+        annotation = optional.group(1)
+    return JSON_TYPES.get(annotation.split("[", 1)[0].split("|", 1)[0].strip(), "string")
+
+
+def _parse_docstring(docstring: str) -> Dict[str, Any]:
+    """description (everything before Args:) and per-argument type/description from a google-style docstring"""
+    description, args, section = [], {}, None
+    for line in docstring.splitlines():
+        stripped = line.strip()
+        if stripped in ("Args:", "Arguments:", "Parameters:", "Returns:", "Raises:", "Examples:"):
+            section = stripped
+            continue
+        if section is None:
+            description.append(stripped)
+        elif section != "Returns:" and section != "Raises:" and section != "Examples:":
+            match = _ARG_LINE.match(line)
+            if match:
+                args[match.group(1)] = {"type": match.group(2), "description": match.group(3).strip()}
+    return {"description": " ".join(part for part in description if part), "args": args}
+
+
+def _function_schema(node: ast.AST) -> Dict[str, Any]:
+    docstring = _parse_docstring(ast.get_docstring(node) or "")
+    arguments = node.args.posonlyargs + node.args.args + node.args.kwonlyargs
+    defaults = [None] * (len(node.args.posonlyargs + node.args.args) - len(node.args.defaults))
+    defaults += node.args.defaults + node.args.kw_defaults
+
+    properties, required = {}, []
+    for argument, default in zip(arguments, defaults):
+        name = argument.arg
+        if name in INJECTED_PARAMETERS:
+            continue
+        documented = docstring["args"].get(name, {})
+        annotation = ast.unparse(argument.annotation) if argument.annotation is not None else documented.get("type")
+        properties[name] = {"type": _json_type(annotation)}
+        if documented.get("description"):
+            properties[name]["description"] = documented["description"]
+        if default is None:
+            required.append(name)
+
+    parameters = {"type": "object", "properties": properties}
+    if required:
+        parameters["required"] = required
+    return {
+        "type": "function",
+        "function": {"name": node.name, "description": docstring["description"], "parameters": parameters}
+    }
+
+
+def module_tool_schemas(source: str, module_name: str) -> List[Dict[str, Any]]:
+    """
+    schemas for the tools a module exposes: the names listed in a module-level __tools__, or else the function
+    named after the module. helper modules (no such function) expose nothing
+    """
+    tree = ast.parse(source)
+    tool_names = [module_name]
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "__tools__" for t in node.targets):
+            tool_names = list(ast.literal_eval(node.value))
+    functions = {node.name: node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+    return [_function_schema(functions[name]) for name in tool_names if name in functions]
+
+
+def _merge_override(schema: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """hand-written descriptions/examples from tools.json win, but the parameters always follow the signature"""
+    function = {**schema["function"], **{k: v for k, v in override["function"].items() if k != "parameters"}}
+    properties = schema["function"]["parameters"]["properties"]
+    curated = (override["function"].get("parameters") or {}).get("properties", {})
+    function["parameters"] = {
+        **schema["function"]["parameters"],
+        "properties": {name: {**spec, **curated.get(name, {})} for name, spec in properties.items()}
+    }
+    return {**schema, "function": function}
+
+
+class ToolRegistry:
+    """
+    tool schemas generated from the signatures and docstrings in functions/ (parsed with ast, so nothing is
+    imported), with hand-written entries from constants/tools.json layered on top.
+    a module is only re-parsed when its size/mtime changes, so new or edited tools show up without a restart.
+    select() keeps the first pass small: a keyword ranker (tf-idf over each tool's name, description and
+    parameters) picks the top TOOL_TOP_K tools for the user input, plus the TOOL_ALWAYS_INCLUDE fallbacks
+    """
+
+    def __init__(self, functions_dir: Path = FUNCTIONS_DIR, overrides: Sequence[Dict[str, Any]] = ()):
+        self.functions_dir = Path(functions_dir)
+        self.overrides = {tool["function"]["name"]: tool for tool in overrides}
+        self._modules: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._tools: Dict[str, Dict[str, Any]] = {}
+        self._tool_modules: Dict[str, str] = {}
+        self._documents: Dict[str, Counter] = {}
+        self._idf: Dict[str, float] = {}
+
+    def refresh(self) -> bool:
+        """re-parse modules that changed since the last call; returns whether any tool schema changed"""
+        with self._lock:
+            seen, changed = set(), False
+            with os.scandir(self.functions_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".py") or entry.name.startswith("_") or not entry.is_file():
+                        continue
+                    module_name = entry.name[:-3]
+                    seen.add(module_name)
+                    signature = get_file_signature(entry.stat())
+                    cached = self._modules.get(module_name)
+                    if cached is not None and cached["signature"] == signature:
+                        continue
+                    try:
+                        with open(entry.path, "r", encoding="utf-8") as f:
+                            schemas = module_tool_schemas(f.read(), module_name)
+                    except (OSError, SyntaxError, ValueError) as e:
+                        logger.error(f"Could not build tool schemas for {entry.name}: {e}")
+                        schemas = cached["schemas"] if cached else []
+                    self._modules[module_name] = {"signature": signature, "schemas": schemas}
+                    changed = True
+            for module_name in set(self._modules) - seen:
+                del self._modules[module_name]
+                changed = True
+
+            if changed:
+                self._rebuild()
+            return changed
+
+    def _rebuild(self) -> None:
+        tools, self._tool_modules = {}, {}
+        for module_name, module in self._modules.items():
+            for schema in module["schemas"]:
+                name = schema["function"]["name"]
+                self._tool_modules[name] = module_name
+                override = self.overrides.get(name)
+                tools[name] = _merge_override(schema, override) if override else schema
+        self._tools = dict(sorted(tools.items()))
+
+        self._documents = {}
+        for name, tool in self._tools.items():
+            function = tool["function"]
+            parts = [name, function.get("description", "")]
+            for parameter, spec in function["parameters"].get("properties", {}).items():
+                parts += [parameter, spec.get("description", "")]
+            self._documents[name] = Counter(tokenize(" ".join(parts)))
+        document_count = Counter(word for document in self._documents.values() for word in document)
+        self._idf = {word: math.log(1 + len(self._documents) / count) for word, count in document_count.items()}
+        logger.info(f"Tool registry: {len(self._tools)} tool(s) ({', '.join(self._tools)})")
+
+    @property
+    def tools(self) -> List[Dict[str, Any]]:
+        self.refresh()
+        return list(self._tools.values())
+
+    def module_for(self, tool_name: str) -> str:
+        """module in functions/ that defines the tool (the tool's own name unless declared via __tools__)"""
+        self.refresh()
+        return self._tool_modules.get(tool_name, tool_name)
+
+    def rank(self, query: str) -> List[tuple]:
+        """(score, tool name) for every tool that shares a word with the query, best first"""
+        self.refresh()
+        words = set(tokenize(query))
+        scores = []
+        for name, document in self._documents.items():
+            score = sum(self._idf[word] * (1 + math.log(document[word])) for word in words if word in document)
+            if score > 0:
+                scores.append((score, name))
+        return sorted(scores, key=lambda item: (-item[0], item[1]))
+
+    def select(self, query: str, top_k: int = Config.TOOL_TOP_K) -> List[Dict[str, Any]]:
+        """schemas to send with the first pass for this query (in registry order, so the prompt stays stable)"""
+        selected = {name for _, name in self.rank(query)[:top_k]}
+        selected.update(name for name in Config.TOOL_ALWAYS_INCLUDE if name in self._tools)
+        return [tool for name, tool in self._tools.items() if name in selected]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_tool_registry() -> ToolRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            from constants.llama_config import tools
+            _registry = ToolRegistry(overrides=tools)
+    return _registry
+
+
+# what a plain answer (first pass without a tool, or the second pass) must look like
+ANSWER_SCHEMA = {"type": "object", "properties": {"message": {"type": "string"}}, "required": ["message"],
+                 "additionalProperties": False}
+
+
+def tool_call_schema(tools: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    json schema for the first pass: a call {"name": ..., "arguments": {...}} to one of the offered tools, with the
+    arguments following that tool's parameter schema, or a plain answer. passed as ollama's format, the server
+    turns it into a grammar, so the model can't produce anything the strict parser would reject: the same
+    required arguments as _check_arguments (in process_tool_calls) enforces, and no others (additionalProperties),
+    and an answer can't carry a "name" that would make it parse as a call
+    """
+    calls = []
+    for tool in tools:
+        function = tool["function"]
+        parameters = {key: value for key, value in function["parameters"].items() if key != "required"}
+        parameters["required"] = function["parameters"].get("required", [])
+        parameters["additionalProperties"] = False
+        parameters["properties"] = {name: {k: v for k, v in spec.items() if k in ("type", "description", "enum")}
+                                    for name, spec in parameters.get("properties", {}).items()}
+        calls.append({
+            "type": "object",
+            "properties": {"name": {"type": "string", "enum": [function["name"]]}, "arguments": parameters},
+            "required": ["name", "arguments"],
+            "additionalProperties": False
+        })
+    return {"anyOf": calls + [ANSWER_SCHEMA]}
+
+
+def tools_prompt(tools: List[Dict[str, Any]]) -> str:
+    """the selected tools as text, for models that read their tools from the prompt"""
+    return f"Here are the tools you have available: {json.dumps(tools, sort_keys=True, separators=(',', ':'))}"
@@ -0,0 +1,106 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from llm.config import Config
+from llm.metrics import metrics
+from llm.models.trace import Span, Trace
+from llm.utils.logging_config import setup_logging
+
+logger = setup_logging()
+
+# the trace of the request being served; tasks started from it (tool calls, prefetch) inherit it
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Dict[str, Any]]:
+    """
+    time one stage of the current request: observed in llm_stage_seconds and, inside a trace, kept as a span.
+    yields the span's attributes so the stage can add what it learns (token counts, tool name, ...)
+    """
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        metrics.observe("llm_stage_seconds", duration, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(Span(name, start - trace.start, duration, attributes))
+
+
+def record_llm_usage(pass_name: str, response: Dict[str, Any], attributes: Dict[str, Any]) -> None:
+    """copy the model server's own timings and token counts (ollama reports durations in ns) into metrics and a span"""
+    for key, metric in (("prompt_eval_duration", "llm_prompt_eval_seconds"), ("eval_duration", "llm_eval_seconds")):
+        if response.get(key) is not None:
+            seconds = response[key] / 1e9
+            metrics.observe(metric, seconds, llm_pass=pass_name)
+            attributes[f"{key}_ms"] = round(seconds * 1e3, 3)
+    for key, metric in (("prompt_eval_count", "llm_prompt_tokens_total"), ("eval_count", "llm_eval_tokens_total")):
+        if response.get(key) is not None:
+            metrics.inc(metric, response[key], llm_pass=pass_name)
+            attributes[key] = response[key]
+    if response.get("load_duration"):
+        attributes["load_duration_ms"] = round(response["load_duration"] / 1e6, 3)
+
+
+class Tracer:
+    """
+    opens a trace per request and, with TRACE_FILE set, appends every finished trace to it as one json line.
+    lines are written by a single background thread, so the event loop never waits on the file
+    """
+
+    def __init__(self, path: Optional[str] = Config.TRACE_FILE):
+        self.path = Path(path) if path else None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer") if self.path else None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, session_id: str) -> Iterator[Trace]:
+        trace = Trace(trace_id=uuid.uuid4().hex, session_id=session_id, started_at=time.time(),
+                      start=time.perf_counter())
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        except GeneratorExit:  # a streamed answer whose client went away
+            trace.error = "closed"
+            raise
+        except BaseException as e:
+            trace.error = type(e).__name__
+            raise
+        finally:
+            trace.duration = time.perf_counter() - trace.start
+            metrics.observe("llm_request_seconds", trace.duration, path=trace.path or "error")
+            try:
+                _current_trace.reset(token)
+            except ValueError:  # closed from another context (an async generator finalized elsewhere)
+                _current_trace.set(None)
+            logger.info(f"Request {trace.trace_id} ({trace.path}) took {trace.duration * 1e3:.1f} ms: "
+                        + ", ".join(f"{s.name} {s.duration * 1e3:.1f}" for s in trace.spans))
+            if self._writer is not None:
+                self._writer.submit(self._write, trace.to_dict())
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        try:
+            with self._lock, open(self.path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write trace to {self.path}: {e}")
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
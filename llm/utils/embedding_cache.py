@@ -0,0 +1,48 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Sequence
+
+
+class EmbeddingCache:
+    """
+    LRU cache in front of an embedding function, keyed by the sha256 of the text.
+    only texts that aren't cached are sent to the embedding function, in a single batch
+    """
+
+    def __init__(self, embedding_function: Callable[[List[str]], Sequence], max_size: int = 4096):
+        self.embedding_function = embedding_function
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        embeddings = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    embeddings[key] = self._cache[key]
+
+        missing = list({key: text for key, text in zip(keys, texts) if key not in embeddings}.items())
+        if missing:
+            computed = self.embedding_function([text for _, text in missing])
+            with self._lock:
+                for (key, _), embedding in zip(missing, computed):
+                    embedding = [float(x) for x in embedding]
+                    embeddings[key] = embedding
+                    self._cache[key] = embedding
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return [embeddings[key] for key in keys]
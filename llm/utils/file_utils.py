@@ -1,17 +1,27 @@
 import hashlib
+import os
 from pathlib import Path
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
 def calculate_file_hash(file_path: Path) -> str:
     sha256 = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
+        for byte_block in iter(lambda: f.read(1024 * 1024), b""):
             sha256.update(byte_block)
     return sha256.hexdigest()
 
-def get_file_metadata(file_path: Path) -> Dict:
-    file_stat = file_path.stat()
+def get_file_signature(file_stat: os.stat_result) -> Dict:
+    """cheap stat-based fingerprint used to decide whether a file needs re-hashing"""
+    return {
+        "file_size": file_stat.st_size,
+        "mtime_ns": file_stat.st_mtime_ns,
+        "inode": file_stat.st_ino,
+    }
+
+def get_file_metadata(file_path: Path, file_stat: Optional[os.stat_result] = None,
+                      file_hash: Optional[str] = None) -> Dict:
+    file_stat = file_stat or file_path.stat()
     return {
         "file_name": file_path.name,
         "file_path": str(file_path.absolute()),
@@ -19,6 +29,6 @@ def get_file_metadata(file_path: Path) -> Dict:
         "creation_time": file_stat.st_ctime,
         "modification_time": file_stat.st_mtime,
         "access_time": file_stat.st_atime,
-        "file_hash": calculate_file_hash(file_path),
+        "file_hash": file_hash or calculate_file_hash(file_path),
         "last_scanned": datetime.now().timestamp()
-    }
\ No newline at end of file
+    }
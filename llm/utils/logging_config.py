@@ -1,8 +1,23 @@
 import logging
+import threading
 
-def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s.%(msecs)03d %(levelname)s %(message)s',
-    )
-    return logging.getLogger(__name__)
\ No newline at end of file
+try:
+    from llm.config import Config
+except ImportError:
+    from config import Config
+
+_configured = False
+_lock = threading.Lock()
+
+
+def setup_logging(name: str = "llm") -> logging.Logger:
+    """configure the root logger once (every module calls this on import) and return the app's logger"""
+    global _configured
+    with _lock:
+        if not _configured:
+            logging.basicConfig(
+                level=getattr(logging, str(Config.LOG_LEVEL).upper(), logging.INFO),
+                format='%(asctime)s.%(msecs)03d %(levelname)s %(message)s',
+            )
+            _configured = True
+    return logging.getLogger(name)